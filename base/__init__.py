@@ -2,6 +2,8 @@ from flask import Flask, g, request
 from flask_login import current_user
 
 from base.extensions import mail, cache, db, login_manager
+from base.collector import collector
+from base.bootstrap import bootstrap
 
 from base.pages.login import bp as blueprint_login
 from base.pages.project import bp as blueprint_project
@@ -10,7 +12,10 @@ from base.pages.board import bp as blueprint_board
 from base.pages.admin import bp as blueprint_admin
 from base.pages.statistic import bp as blueprint_stat
 
-from base.database.schema import User, Project
+from base.pages.admin.magic import (
+    slurm_nodes_status, slurm_partition_info, space_info, system_info)
+from base.pages.user.magic import scratch_quota
+from base.database.schema import Project
 
 from base.utils import get_tmpdir_prefix
 from base.functions import project_config
@@ -33,6 +38,7 @@ def create_app(config_filename):
     register_extensions(app)
     register_blueprints(app)
     register_decor(app)
+    register_collector(app)
     configure_logger(app)
     cleanup(app)
     return app
@@ -75,6 +81,21 @@ def cleanup(app):
     return True
 
 
+def register_collector(app):
+    collector.register("nodes", slurm_nodes_status, "COLLECTOR_NODES", 60)
+    collector.register("partitions", slurm_partition_info,
+                       "COLLECTOR_PARTITIONS", 60)
+    collector.register("space", space_info, "COLLECTOR_SPACE", 300)
+    collector.register("system", system_info, "COLLECTOR_SYSTEM", 60)
+    collector.register("quota", scratch_quota, "COLLECTOR_QUOTA", 600)
+
+    @app.before_request
+    def start_collector():
+        collector.start(app)
+
+    return None
+
+
 def register_decor(app):
 
     @app.template_filter("menu_item")
@@ -84,35 +105,22 @@ def register_decor(app):
         line = line.replace(".html'>", "")
         return line
 
+    url_list = frozenset("%s" % rule for rule in app.url_map.iter_rules())
+
     @app.before_request
     def first_request():
         logging.debug("-"*80)
-        user_list = cache.get("user_list")
-        if not user_list:
-            users_obj = User.query.all()
-            users = map(lambda x: x.login, users_obj)
-            user_list = sorted(list(users))
-            cache.set("user_list", user_list, 600)
-        g.user_list = user_list
-
-        config = cache.get("project_config")
-        if not config:
-            config = project_config()
-            cache.set("project_config", config, 600)
-        g.project_config = config
+        g.user_list = bootstrap.user_list()
+
+        g.project_config = project_config()
 
         if current_user.is_authenticated:
-            g.permissions = current_user.permissions()
+            g.permissions = bootstrap.permissions(current_user)
         else:
             g.permissions = []
 
         tmp = "%s" % dt.now()
         g.timestamp = tmp.split(".")[0]
-
-        url_list = cache.get("url_list")
-        if not url_list:
-            url_list = ["%s" % rule for rule in app.url_map.iter_rules()]
-            cache.set("url_list", url_list, 600)
         g.url_list = url_list
 
     @app.errorhandler(Exception)
@@ -0,0 +1,257 @@
+from base.extensions import cache, db
+from base.database.schema import User, ACLDB, Project
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from threading import Lock
+from logging import debug
+from time import time
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+IDENTITIES = select(User.id, User.login, User.email, User.name, User.surname)
+
+
+class Logins:
+    """
+    Logins of all users. Iteration gives the logins in alphabetical order for
+    templates, membership test is a set lookup
+    """
+    __slots__ = ("order", "index")
+
+    def __init__(self, logins):
+        self.order = tuple(sorted(logins))
+        self.index = frozenset(self.order)
+
+    def __contains__(self, login):
+        return login in self.index
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+
+class Identities:
+    """
+    Index of logins, e-mails and name/surname pairs of all users used to
+    generate new logins and to look for already registered users. Values are
+    indexed as stored in the database, lookups are exact like the equality
+    in SQL
+    """
+    __slots__ = ("logins", "ids", "emails", "names")
+
+    def __init__(self, rows):
+        """
+        :param rows: Iterable. Tuples of id, login, e-mail, name and surname
+        """
+        self.ids, self.emails, self.names = {}, {}, {}
+        for uid, login, email, name, surname in rows:
+            if login:
+                self.ids[login] = uid
+            self.emails.setdefault(email, set()).add(uid)
+            self.names.setdefault((name, surname), set()).add(uid)
+        self.logins = Logins(self.ids)
+
+    def find(self, logins=(), emails=(), names=()):
+        """
+        :param logins: Iterable. Logins to look for
+        :param emails: Iterable. E-mails to look for
+        :param names: Iterable. Tuples of name and surname to look for
+        :return: Set of integers. Ids of users matching any of the values
+        """
+        result = set(self.ids[x] for x in logins if x in self.ids)
+        for email in emails:
+            result.update(self.emails.get(email, ()))
+        for name in names:
+            result.update(self.names.get(name, ()))
+        return result
+
+
+class Bootstrap:
+    """
+    Data needed by every request: logins of all users and permissions of the
+    current user, and the identities of users and the names of all projects
+    used by the forms. Entries have no expiration time, they are invalidated
+    by the session events below when User, ACLDB and Project records are
+    committed.
+
+    The cache holds a generation stamp which changes when a user is created
+    or deleted or when the login, e-mail or name of a user changes. Every
+    process keeps its own copy of the identities and rebuilds it when the
+    stamp in the cache differs from the stamp of the copy, so the cost of a
+    request is a lookup of the stamp and of the permissions of the user.
+    Permissions are cached per user id together with the generation they
+    belong to, so a new generation invalidates them without leaving stale
+    keys behind, and are dropped one by one when the ACL of a user changes
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.generation = None
+        self.index = None
+
+    def sync(self):
+        """
+        Current generation. Local copy of the identities is dropped if the
+        generation has changed
+        :return: Float. Generation stamp
+        """
+        generation = cache.get("bootstrap_generation")
+        if generation is None:
+            cache.add("bootstrap_generation", time(), timeout=0)
+            generation = cache.get("bootstrap_generation")
+        if generation != self.generation:
+            with self.lock:
+                self.generation = generation
+                self.index = None
+        return generation
+
+    def user_list(self):
+        """
+        :return: Object. Logins of all users
+        """
+        return self.identities().logins
+
+    def identities(self):
+        """
+        Identities of all users. If the current session has created, deleted
+        or modified users which are not committed yet, the index is built
+        from the database for the session alone, as the database is the only
+        one to see them
+        :return: Object. Identities
+        """
+        session = db.session
+        changes = session.info.get("bootstrap", None)
+        if (changes and changes["logins"]) or any(
+                isinstance(x, User) for x in session.new | session.dirty):
+            return Identities(session.execute(IDENTITIES).all())
+        self.sync()
+        index = self.index
+        if index is None:
+            debug("Loading the identities of users")
+            index = Identities(session.execute(IDENTITIES).all())
+            self.index = index
+        return index
+
+    def permissions(self, user):
+        """
+        :param user: Object. User object
+        :return: List of strings. Permissions of the user
+        """
+        generation = self.sync()
+        key = "permissions_%s" % user.id
+        cached = cache.get(key)
+        if cached and cached[0] == generation:
+            return cached[1]
+        permissions = user.permissions()
+        cache.set(key, (generation, permissions), timeout=0)
+        return permissions
+
+    @staticmethod
+    def project_names():
+        """
+        :return: List of strings. Sorted names of all projects, a new list on
+        every call
+        """
+        names = cache.get("bootstrap_projects")
+        if names is None:
+            debug("Loading the list of project names")
+            names = sorted(x for x in db.session.execute(
+                select(Project.name)).scalars() if x)
+            cache.set("bootstrap_projects", names, timeout=0)
+        return list(names)
+
+    def invalidate(self, logins=False, users=(), projects=False):
+        """
+        Invalidate the entries. New generation invalidates all of them except
+        the names of projects
+        :param logins: Boolean. Identities of users have changed
+        :param users: Iterable. Ids of users whose permissions have changed
+        :param projects: Boolean. The list of project names has changed
+        """
+        if projects:
+            cache.delete("bootstrap_projects")
+        if logins:
+            debug("Identities of users changed, starting new generation")
+            cache.set("bootstrap_generation", time(), timeout=0)
+            with self.lock:
+                self.index = None
+            return
+        if not users:
+            return
+        cache.delete_many(*["permissions_%s" % x for x in users])
+
+
+bootstrap = Bootstrap()
+
+
+def pending(session):
+    return session.info.setdefault("bootstrap", {"logins": False,
+                                                 "users": set(),
+                                                 "projects": False})
+
+
+@event.listens_for(Session, "after_flush")
+def bootstrap_flush(session, context):
+    """
+    Collect the changes which affect the bootstrap data. The entries are
+    invalidated only after commit, otherwise another request could cache the
+    data before the changes are visible to it
+    """
+    changes = pending(session)
+    acl = set()
+    for obj in session.new | session.deleted:
+        if isinstance(obj, User):
+            changes["logins"] = True
+        elif isinstance(obj, ACLDB) and obj in session.deleted:
+            acl.add(obj.id)
+        elif isinstance(obj, Project):
+            changes["projects"] = True
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj).attrs
+            if any(getattr(state, x).history.has_changes() for x in (
+                    "login", "email", "name", "surname")):
+                changes["logins"] = True
+            if (state.acl_id.history.has_changes() or
+                    state.acl.history.has_changes()):
+                changes["users"].add(obj.id)
+        elif isinstance(obj, ACLDB) and session.is_modified(obj):
+            acl.add(obj.id)
+        elif isinstance(obj, Project):
+            if inspect(obj).attrs.name.history.has_changes():
+                changes["projects"] = True
+    if acl and not changes["logins"]:
+        changes["users"].update(session.execute(select(User.id).where(
+            User.acl_id.in_(acl))).scalars())
+
+
+@event.listens_for(Session, "do_orm_execute")
+def bootstrap_bulk(state):
+    """
+    Bulk updates and deletes like Query.delete() bypass the flush
+    """
+    if not (state.is_update or state.is_delete):
+        return
+    mappers = [x.class_ for x in state.all_mappers]
+    if User in mappers or ACLDB in mappers:
+        pending(state.session)["logins"] = True
+    if Project in mappers:
+        pending(state.session)["projects"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def bootstrap_commit(session):
+    changes = session.info.pop("bootstrap", None)
+    if changes and any(changes.values()):
+        bootstrap.invalidate(changes["logins"], changes["users"],
+                             changes["projects"])
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def bootstrap_rollback(session, previous_transaction):
+    session.info.pop("bootstrap", None)
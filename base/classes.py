@@ -1,4 +1,4 @@
-from flask import g
+from flask import current_app, g
 from flask_login import current_user
 from base import db
 from base.pages import TaskQueue
@@ -8,8 +8,11 @@ from base.database.schema import (LogDB, User, ACLDB, Extend, Register, Project,
                                   Resources, ArticleDB, Tasks)
 from logging import debug
 from operator import attrgetter
-from datetime import datetime as dt
+from datetime import datetime as dt, timedelta
 from pathlib import Path
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from sqlalchemy import or_, select, tuple_
+from sqlalchemy.orm import joinedload
 
 
 __author__ = "Matvey Sapunov"
@@ -36,15 +39,16 @@ class Log:
         self.query = self.query.filter(LogDB.created >= date)
         return self.list()
 
-    def list(self):
-        query = self.query
+    def list(self, limit=None):
+        query = self.query.options(joinedload(LogDB.author))
         if self.log.project:
             query = query.filter_by(project=self.log.project)
         if self.log.register:
             query = query.filter_by(register=self.log.register)
         if self.log.user:
             query = query.filter_by(user=self.log.user)
-        return query.all()
+        query = query.order_by(LogDB.created.desc(), LogDB.id.desc())
+        return query.limit(limit).all() if limit else query.all()
 
     def commit(self, mail=None):
         db.session.add(self.log)
@@ -57,6 +61,161 @@ class Log:
             return self.log.event
 
 
+class LogQuery:
+    """
+    Log records in descending order of creation time split into pages. A page
+    is continued from the cursor of the previous one, so the cost of a request
+    doesn't depend on how deep in the history the page is
+    """
+
+    def __init__(self, project=None, register=None, user=None):
+        self.query = LogDB.query.options(
+            joinedload(LogDB.author),
+            joinedload(LogDB.project),
+            joinedload(LogDB.register),
+            joinedload(LogDB.user))
+        if project:
+            self.query = self.query.filter(LogDB.project_id == project.id)
+        if register:
+            self.query = self.query.filter(LogDB.register_id == register.id)
+        if user:
+            self.query = self.query.filter(LogDB.user_id == user.id)
+
+    def category(self, name):
+        """
+        Filter by category as returned by LogDB.to_web()
+        :param name: String. One of project, registration, user or unknown
+        :return: Object. LogQuery
+        """
+        no_project = LogDB.project_id.is_(None)
+        no_register = LogDB.register_id.is_(None)
+        if name == "project":
+            self.query = self.query.filter(LogDB.project_id.isnot(None))
+        elif name == "registration":
+            self.query = self.query.filter(
+                no_project, LogDB.register_id.isnot(None))
+        elif name == "user":
+            self.query = self.query.filter(
+                no_project, no_register, LogDB.user_id.isnot(None))
+        elif name == "unknown":
+            self.query = self.query.filter(
+                no_project, no_register, LogDB.user_id.is_(None))
+        else:
+            raise ValueError("Unknown log category: %s" % name)
+        return self
+
+    def entity(self, name):
+        """
+        Filter records related to a project with the given name or to a user
+        with the given login
+        :param name: String. Name of a project or login of a user
+        :return: Object. LogQuery
+        """
+        projects = select(Project.id).where(Project.name == name)
+        users = select(User.id).where(User.login == name)
+        self.query = self.query.filter(or_(LogDB.project_id.in_(projects),
+                                           LogDB.user_id.in_(users)))
+        return self
+
+    def author(self, login):
+        """
+        Filter records created by the user with the given login
+        :param login: String. Login of the author
+        :return: Object. LogQuery
+        """
+        authors = select(User.id).where(User.login == login)
+        self.query = self.query.filter(LogDB.author_id.in_(authors))
+        return self
+
+    def between(self, start=None, end=None):
+        """
+        Filter records created in the date range, both ends are included
+        :param start: Datetime. First day of the range. Default is None
+        :param end: Datetime. Last day of the range. Default is None
+        :return: Object. LogQuery
+        """
+        if start:
+            self.query = self.query.filter(LogDB.created >= start)
+        if end:
+            self.query = self.query.filter(
+                LogDB.created < end + timedelta(days=1))
+        return self
+
+    def filter(self, args):
+        """
+        Apply filters from request arguments: category, entity, author, start
+        and end. Dates are in format YYYY-MM-DD
+        :param args: Dictionary. Request arguments
+        :return: Object. LogQuery
+        """
+        if args.get("category", None):
+            self.category(args.get("category"))
+        if args.get("entity", None):
+            self.entity(args.get("entity"))
+        if args.get("author", None):
+            self.author(args.get("author"))
+        dates = []
+        for key in ["start", "end"]:
+            value = args.get(key, None)
+            try:
+                dates.append(dt.strptime(value, "%Y-%m-%d") if value else None)
+            except ValueError:
+                raise ValueError("Failed to parse %s date: %s" % (key, value))
+        return self.between(*dates)
+
+    def page(self, cursor=None, limit=100):
+        """
+        Select one page of log records
+        :param cursor: String. Cursor returned with the previous page. Default
+        is None, i.e. the first page
+        :param limit: Integer. Maximum number of records on the page
+        :return: Tuple. List of LogDB objects and cursor of the next page which
+        is None for the last page
+        """
+        query = self.query
+        if cursor:
+            created, rid = self.decode(cursor)
+            query = query.filter(
+                tuple_(LogDB.created, LogDB.id) < tuple_(created, rid))
+        records = query.order_by(
+            LogDB.created.desc(), LogDB.id.desc()).limit(limit + 1).all()
+        if len(records) <= limit:
+            return records, None
+        records = records[:limit]
+        return records, self.encode(records[-1])
+
+    @staticmethod
+    def limit(value=None):
+        """
+        Number of records on a page: LOG_PAGE by default, but not more then
+        LOG_PAGE_MAX
+        :param value: String. Requested number of records. Default is None
+        :return: Integer
+        """
+        default = current_app.config.get("LOG_PAGE", 100)
+        maximum = current_app.config.get("LOG_PAGE_MAX", 1000)
+        if not value:
+            return default
+        try:
+            limit = int(value)
+        except ValueError:
+            raise ValueError("Limit should be an integer: %s" % value)
+        return max(1, min(limit, maximum))
+
+    @staticmethod
+    def encode(record):
+        value = "%s|%s" % (record.created.isoformat(), record.id)
+        return urlsafe_b64encode(value.encode()).decode()
+
+    @staticmethod
+    def decode(cursor):
+        try:
+            created, rid = urlsafe_b64decode(cursor.encode()).decode().split("|")
+            return dt.fromisoformat(created), int(rid)
+        except ValueError:
+            raise ValueError("Invalid log cursor: %s" % cursor)
+
+
 class ProjectLog(Log):
 
     def __init__(self, project):
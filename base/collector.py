@@ -0,0 +1,171 @@
+from flask import current_app
+from base.extensions import cache
+from threading import Event, Lock, Thread
+from logging import error, debug
+from os import getpid
+from time import time
+import atexit
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+class Collector:
+    """
+    Periodically samples the state of the cluster and keeps parsed snapshots
+    in the application cache. With a cache backend shared between processes
+    (FileSystemCache, RedisCache, ...) all workers serve the same snapshots
+    and only one of them runs the remote commands for a source in a given
+    interval.
+
+    Every source has an interval in seconds taken from the configuration
+    option given at registration. A snapshot older than the interval is
+    sampled again either by the background thread or by the first request
+    which asks for it.
+
+    Collector options are taken from the configuration of the application:
+    COLLECTOR_ENABLED - run background thread, True by default
+    COLLECTOR_TICK - seconds between checks of the sources, 5 by default
+    """
+
+    def __init__(self):
+        self.sources = {}
+        self.local = {}
+        self.lock = Lock()
+        self.stop = Event()
+        self.thread = None
+        self.pid = None
+
+    def register(self, name, function, option, interval):
+        """
+        Register a source of data
+        :param name: String. Name of the source
+        :param function: Function. Function without arguments returning the
+        data which can be stored in the cache
+        :param option: String. Configuration option with sampling interval
+        :param interval: Integer. Default sampling interval in seconds
+        """
+        self.sources[name] = (function, option, interval)
+
+    def interval(self, name):
+        function, option, interval = self.sources[name]
+        return current_app.config.get(option, interval)
+
+    def snapshot(self, name, refresh=False):
+        """
+        Latest snapshot of the source. If there is no snapshot, it is older
+        than the sampling interval or refresh is requested, the source is
+        sampled right away
+        :param name: String. Name of the source
+        :param refresh: Boolean. Force sampling of the source
+        :return: Tuple. Data and age of the snapshot in seconds
+        """
+        if name not in self.sources:
+            raise ValueError("Unknown source of data: %s" % name)
+        record = self.latest(name)
+        if refresh or not record or (
+                time() - record["time"] >= self.interval(name)):
+            record = self.sample(name)
+        return record["data"], max(0, int(time() - record["time"]))
+
+    def sample(self, name):
+        function, option, interval = self.sources[name]
+        debug("Sampling %s" % name)
+        record = {"time": time(), "data": function()}
+        cache.set("collector_%s" % name, record, timeout=0)
+        cache.set("collector_%s_time" % name, record["time"], timeout=0)
+        self.local[name] = record
+        return record
+
+    def latest(self, name):
+        """
+        Latest snapshot from the cache. Large snapshots are expensive to
+        deserialize, so the process keeps its own copy and reads the snapshot
+        from the cache only when the time of the snapshot in the cache differs
+        from the time of the local copy
+        :param name: String. Name of the source
+        :return: Dictionary with time and data keys or None
+        """
+        stamp = cache.get("collector_%s_time" % name)
+        local = self.local.get(name, None)
+        if local and local["time"] == stamp:
+            return local
+        record = cache.get("collector_%s" % name)
+        if record:
+            self.local[name] = record
+        return record
+
+    def due(self):
+        """
+        Names of the sources with missing or outdated snapshot which are not
+        sampled by another process at the moment
+        :return: List of strings
+        """
+        result = []
+        now = time()
+        for name in self.sources.keys():
+            interval = self.interval(name)
+            stamp = cache.get("collector_%s_time" % name)
+            if stamp and now - stamp < interval:
+                continue
+            if not self.lease(name, interval):
+                continue
+            result.append(name)
+        return result
+
+    @staticmethod
+    def lease(name, interval):
+        """
+        Reserve sampling of the source for the current process. The lease is
+        taken with a single cache.add() which succeeds in one process only.
+        SimpleCache and FileSystemCache refuse to add a key over an expired
+        one and deleting it first would let two processes take the lease, so
+        every interval has a key of its own
+        :param name: String. Name of the source
+        :param interval: Integer. Duration of the lease in seconds
+        :return: Boolean. True if the lease is taken
+        """
+        key = "collector_%s_lease_%s" % (name, int(time() // max(interval,
+                                                                 1)))
+        return cache.add(key, getpid(), timeout=interval)
+
+    def start(self, app):
+        """
+        Start the background thread in the current process if it is not
+        running yet. Safe to call on every request, the thread is started
+        again in a forked worker
+        :param app: Object. Flask application
+        """
+        if self.pid == getpid() or not app.config.get("COLLECTOR_ENABLED",
+                                                      True):
+            return
+        with self.lock:
+            if self.pid == getpid():
+                return
+            self.pid = getpid()
+            self.stop.clear()
+            self.thread = Thread(target=self.run, args=(app,), daemon=True,
+                                 name="collector")
+            self.thread.start()
+
+    def run(self, app):
+        debug("Collector started in process %s" % getpid())
+        while not self.stop.is_set():
+            with app.app_context():
+                for name in self.due():
+                    try:
+                        self.sample(name)
+                    except Exception as e:
+                        error("Failed to sample %s: %s" % (name, e))
+                tick = app.config.get("COLLECTOR_TICK", 5)
+            self.stop.wait(tick)
+
+    def close(self):
+        if self.pid != getpid():
+            return
+        self.stop.set()
+
+
+collector = Collector()
+atexit.register(collector.close)
@@ -0,0 +1,225 @@
+from flask import current_app as app
+from collections import namedtuple
+from configparser import ConfigParser, ExtendedInterpolation
+from datetime import timezone
+from os import stat
+from os.path import join as join_dir
+from recurrent.event_parser import RecurringEvent
+from threading import Lock
+from time import monotonic
+from logging import debug, warning
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+MailServer = namedtuple("MailServer", ["host", "port", "use_tls", "use_ssl",
+                                       "username", "password"])
+
+
+class ConfigRegistry:
+    """
+    Configuration files of the application parsed once per process. Before a
+    parsed file is returned the modification time of the file is checked and
+    the file is parsed again if it has been modified, created or removed, so
+    the changes are taken into account without restart.
+
+    Project configuration contains dates like "in 1 year" which are relative
+    to the time of parsing. Such configuration is parsed again after
+    PROJECT_CONFIG_AGE seconds, 600 by default, even if the file hasn't been
+    modified.
+
+    Parsed values are shared between requests and threads and must not be
+    modified by the callers
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.files = {}
+
+    def load(self, option, default, parse, age=None):
+        """
+        Parsed content of the configuration file
+        :param option: String. Application option with the name of the file
+        :param default: String. Name of the file if the option is not set
+        :param parse: Function. Takes the path to the file or None if the
+        file doesn't exist and returns parsed content
+        :param age: Integer. Seconds after which the file is parsed again
+        :return: Parsed content of the file
+        """
+        cfg_file = app.config.get(option, default)
+        path = join_dir(app.instance_path, cfg_file)
+        try:
+            info = stat(path)
+            mtime = (info.st_mtime_ns, info.st_size)
+        except OSError:
+            mtime = None
+        cached = self.files.get(path, None)
+        if cached and cached[0] == mtime and not (
+                age and monotonic() - cached[1] > age):
+            return cached[2]
+        with self.lock:
+            if self.files.get(path, None) is not cached:
+                return self.files[path][2]
+            debug("Parsing configuration file %s" % path)
+            value = parse(path if mtime else None)
+            self.files[path] = (mtime, monotonic(), value)
+        return value
+
+    def projects(self):
+        """
+        :return: Dict. Project types as keys and their options as values, see
+        project_parse_cfg_options
+        """
+        age = app.config.get("PROJECT_CONFIG_AGE", 600)
+        return self.load("PROJECT_CONFIG", "project.cfg", project_parse_cfg,
+                         age)
+
+    def project(self, project_type):
+        """
+        :param project_type: String. Project type
+        :return: Dict. Options of the project type or None if the type is
+        not configured
+        """
+        return self.projects().get(project_type.lower(), None)
+
+    def mail(self):
+        """
+        :return: Object. ConfigParser with the content of the mail
+        configuration
+        """
+        return self.load("EMAIL_CONFIG", "mail.cfg", mail_parse_cfg)[0]
+
+    def mail_server(self):
+        """
+        :return: Object. MailServer with the options of SERVER section of the
+        mail configuration
+        """
+        return self.load("EMAIL_CONFIG", "mail.cfg", mail_parse_cfg)[1]
+
+
+def project_parse_cfg(path):
+    """
+    Parsing project configuration file. Each section of the file is a project
+    type
+    :param path: String. Path to the file or None if the file doesn't exist
+    :return: Dict. Each project type (i.e. subsection in config file) having
+    options returned by project_parse_cfg_options function
+    """
+    result = {}
+    if not path:
+        warning("Projects configuration file doesn't exists. Using defaults")
+        return result
+    cfg = ConfigParser()
+    cfg.read(path)
+    for project in cfg.sections():
+        result[project.lower()] = project_parse_cfg_options(cfg, project)
+    return result
+
+
+def mail_parse_cfg(path):
+    """
+    Parsing mail configuration file
+    :param path: String. Path to the file or None if the file doesn't exist
+    :return: Tuple. ConfigParser object and MailServer object
+    """
+    cfg = ConfigParser(interpolation=ExtendedInterpolation(),
+                       allow_no_value=True)
+    if path:
+        cfg.read(path, encoding="utf-8")
+    else:
+        warning("E-mail configuration file doesn't exists. Using defaults")
+    server = MailServer(
+        host=cfg.get("SERVER", "HOST", fallback="localhost"),
+        port=cfg.getint("SERVER", "PORT", fallback=25),
+        use_tls=cfg.getboolean("SERVER", "USE_TLS", fallback=False),
+        use_ssl=cfg.getboolean("SERVER", "USE_SSL", fallback=False),
+        username=cfg.get("SERVER", "USERNAME", fallback=None),
+        password=cfg.get("SERVER", "PASSWORD", fallback=None))
+    return cfg, server
+
+
+def project_parse_cfg_options(cfg, section):
+    """
+    Parse project configuration. Use of recurrent lib to parse fuzzy time values
+    :param cfg: Configuration object
+    :param section: Section in the configuration object, i.e. project type
+    :return: Dictionary. Keys are: "duration_text", "duration_dt", "extendable",
+            "finish_text", "finish_dt", "cpu", "finish_notice_text", "acl",
+            "finish_notice_dt", "transform", "description", "evaluation_text",
+            "evaluation_dt", "evaluation_notice_text", "evaluation_notice_dt",
+            "finish_report"
+    """
+    r = RecurringEvent()
+    cpu = cfg.getint(section, "cpu", fallback=None)
+    description = cfg.get(section, "description", fallback=None)
+    duration = cfg.get(section, "duration", fallback=None)
+    if duration:
+        duration_dt = r.parse(duration).replace(tzinfo=timezone.utc)
+    else:
+        duration_dt = None
+    end = cfg.get(section, "finish_date", fallback=None)
+    if end:
+        end_dt = r.parse(end).replace(tzinfo=timezone.utc)
+    else:
+        end_dt = None
+    end_notice = cfg.get(section, "finish_notice", fallback=None)
+    if end_notice and end_dt:
+        tmp = RecurringEvent(end_dt).parse(end_notice)
+        end_notice_dt = tmp.replace(tzinfo=timezone.utc)
+    else:
+        end_notice_dt = None
+    end_report = cfg.get(section, "finish_report", fallback=None)
+    if end_report and end_dt:
+        tmp = RecurringEvent(end_dt).parse(end_report)
+        end_report_dt = tmp.replace(tzinfo=timezone.utc)
+    else:
+        end_report_dt = None
+    trans = cfg.get(section, "transform", fallback=None)
+    if trans:
+        transform = list(map(lambda x: x.strip(), trans.split(",")))
+    else:
+        transform = []
+    acl = cfg.get(section, "acl", fallback=[])
+    if acl:
+        acl = list(map(lambda x: x.strip(), acl.split(",")))
+    acl.append("admin")
+
+    eva = cfg.get(section, "evaluation_date", fallback=None)
+    if eva:
+        evaluation = list(map(lambda x: x.strip(), eva.split(",")))
+    else:
+        evaluation = []
+    if evaluation:
+        tmp = list(map(lambda x: r.parse(x), evaluation))
+        eva_dt = list(map(lambda x: x.replace(tzinfo=timezone.utc), tmp))
+    else:
+        eva_dt = None
+
+    eva_notice = cfg.get(section, "evaluation_notice", fallback=None)
+    if eva_notice and eva_dt:
+        tmp = list(map(lambda x: RecurringEvent(x).parse(eva_notice), eva_dt))
+        eva_text_dt = list(map(lambda x: x.replace(tzinfo=timezone.utc), tmp))
+    else:
+        eva_text_dt = None
+    extendable = cfg.getboolean(section, "extendable", fallback=False)
+    suspend = cfg.getboolean(section, "suspend", fallback=True)
+    visa_names = cfg.get(section, "visa", fallback=None)
+    if visa_names:
+        visa = list(map(lambda x: x.strip(), visa_names.split(",")))
+    else:
+        visa = []
+    return {"duration_text": duration, "duration_dt": duration_dt, "acl": acl,
+            "finish_text": end, "finish_dt": end_dt, "cpu": cpu, "visa": visa,
+            "finish_notice_text": end_notice, "extendable": extendable,
+            "suspend": suspend,
+            "finish_notice_dt": end_notice_dt,
+            "finish_report_dt": end_report_dt,
+            "transform": transform, "description": description,
+            "evaluation_text": evaluation, "evaluation_dt": eva_dt,
+            "evaluation_notice_text": eva_notice,
+            "evaluation_notice_dt": eva_text_dt}
+
+
+registry = ConfigRegistry()
@@ -8,7 +8,8 @@ from textwrap import shorten
 from logging import error
 from pathlib import PurePath
 from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import func
+from sqlalchemy import event, func, text
+from sqlalchemy.orm.attributes import set_committed_value
 from re import split as re_split
 
 
@@ -16,8 +17,19 @@ __author__ = "Matvey Sapunov"
 __copyright__ = "Aix Marseille University"
 
 
+# Registration requests which are still waiting for a decision
+REGISTER_PENDING = ("status IS NULL OR status NOT IN "
+                    "('created', 'ignored', 'rejected')")
+
+
 class Accounting(db.Model):
     __tablename__ = "accounting"
+    __table_args__ = (
+        db.Index("ix_accounting_resources_user_date",
+                 "resources_id", "user_id", "date"),
+        db.Index("ix_accounting_project_user_date",
+                 "project_id", "user_id", "date"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     resources_id = db.Column(db.Integer, db.ForeignKey("project_resources.id"))
     resources = db.relationship("Resources", foreign_keys=resources_id)
@@ -32,6 +44,44 @@ class Accounting(db.Model):
         return '<Account ID {}>'.format(self.id)
 
 
+class AccountingRollup(db.Model):
+    __tablename__ = "accounting_rollup"
+    __table_args__ = (
+        db.Index("accounting_rollup_period_idx", "granularity", "period"),
+        db.Index("accounting_rollup_user_key", "granularity", "period",
+                 "resources_id", "user_id", unique=True,
+                 postgresql_where=text("user_id IS NOT NULL"),
+                 sqlite_where=text("user_id IS NOT NULL")),
+        db.Index("accounting_rollup_total_key", "granularity", "period",
+                 "resources_id", unique=True,
+                 postgresql_where=text("user_id IS NULL"),
+                 sqlite_where=text("user_id IS NULL")),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(5),
+                            db.CheckConstraint("granularity IN ('day', 'week',"
+                                               " 'month')"))
+    period = db.Column(db.DateTime(True))
+    resources_id = db.Column(db.Integer, db.ForeignKey("project_resources.id"))
+    project_id = db.Column(db.Integer, db.ForeignKey("projects.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    cpu = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return '<Rollup {} {}>'.format(self.granularity, self.period)
+
+
+class UserConsumption(db.Model):
+    __tablename__ = "user_consumption"
+
+    resources_id = db.Column(db.Integer, db.ForeignKey("project_resources.id"),
+                             primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    user = db.relationship("User", foreign_keys=user_id)
+    cpu = db.Column(db.Integer, default=0, nullable=False)
+
+
 class ACLDB(db.Model):
     __tablename__ = "acl"
 
@@ -84,6 +134,9 @@ class UserProjectLink(db.Model):
 
 class Project(db.Model):
     __tablename__ = "projects"
+    __table_args__ = (
+        db.Index("ux_projects_name", "name", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(256))
@@ -241,6 +294,20 @@ class Project(db.Model):
         return result
 
 
+@event.listens_for(Project, "after_insert")
+def project_default_name(mapper, connection, target):
+    """
+    Project created without a name gets the name made of its type and id, so
+    projects can always be found by the name column
+    """
+    if target.name:
+        return
+    name = target.get_name()
+    connection.execute(Project.__table__.update().where(
+        Project.__table__.c.id == target.id).values(name=name))
+    set_committed_value(target, "name", name)
+
+
 class Extend(db.Model):
     __tablename__ = "project_extension"
 
@@ -387,6 +454,7 @@ class Resources(db.Model):
     ttl = db.Column(db.DateTime(True))
     project = db.Column(db.String)
     treated = db.Column(db.Boolean, default=False)
+    consumed = db.Column(db.Integer, default=0, nullable=False)
 
     def to_dict(self):
         start = self.created.strftime("%Y-%m-%d %X %Z") if self.created else ""
@@ -406,25 +474,27 @@ class Resources(db.Model):
         }
 
     def consumption_by_user(self, daily=None):
-        query = (Accounting.query.join(User, Accounting.user_id == User.id)
-                 .filter(Accounting.resources_id == self.id))
         if daily:
+            query = (Accounting.query.join(User, Accounting.user_id == User.id)
+                     .filter(Accounting.resources_id == self.id))
             return query.group_by(
                 User.login, Accounting.date
             ).with_entities(
                 User.login, Accounting.date, func.sum(Accounting.cpu)
             ).all()
-        else:
-            return query.group_by(
-                User.login
-            ).with_entities(
-                User.login, func.sum(Accounting.cpu)
-            ).all()
+        return UserConsumption.query.join(
+            User, UserConsumption.user_id == User.id
+        ).filter(
+            UserConsumption.resources_id == self.id
+        ).with_entities(User.login, UserConsumption.cpu).all()
 
     def consumption(self):
-        return Accounting.query.filter_by(
-            resources=self, user=None
-        ).with_entities(func.sum(Accounting.cpu)).scalar()
+        """
+        Total consumption of the resources. The value is maintained during the
+        accounting upload and could be recalculated by consumption_rebuild()
+        :return: Integer
+        """
+        return self.consumed
 
     def usage(self):
         conso = self.consumption()
@@ -574,19 +644,30 @@ class User(UserMixin, db.Model):
         }
 
     def info_acl(self):
+        return self.acl_info(self, self.acl)
+
+    @staticmethod
+    def acl_info(user, acl):
+        """
+        Dictionary returned by info_acl method. Arguments could be records or
+        rows of a query selecting the same columns
+        :param user: Object. User record or row with user columns
+        :param acl: Object. ACLDB record or row with ACL columns
+        :return: Dictionary
+        """
         return {
-            "active": self.active,
-            "user": self.acl.is_user,
-            "responsible": self.acl.is_responsible,
-            "manager": self.acl.is_manager,
-            "tech": self.acl.is_tech,
-            "committee": self.acl.is_committee,
-            "admin": self.acl.is_admin,
-            "login": self.login,
-            "name": self.name,
-            "surname": self.surname,
-            "seen": self.seen.strftime("%Y-%m-%d %X %Z") if self.seen else "",
-            "email": self.email
+            "active": user.active,
+            "user": acl.is_user,
+            "responsible": acl.is_responsible,
+            "manager": acl.is_manager,
+            "tech": acl.is_tech,
+            "committee": acl.is_committee,
+            "admin": acl.is_admin,
+            "login": user.login,
+            "name": user.name,
+            "surname": user.surname,
+            "seen": user.seen.strftime("%Y-%m-%d %X %Z") if user.seen else "",
+            "email": user.email
         }
 
     def to_dict(self):
@@ -611,6 +692,12 @@ class User(UserMixin, db.Model):
 
 class Register(db.Model):
     __tablename__ = "register"
+    __table_args__ = (
+        db.Index("ix_register_status", "status"),
+        db.Index("ix_register_pending", "id",
+                 postgresql_where=text(REGISTER_PENDING),
+                 sqlite_where=text(REGISTER_PENDING)),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     ts = db.Column(db.DateTime(True))
@@ -700,8 +787,11 @@ class Register(db.Model):
             "mesocentre id: %s" % self.project_id()
         ]
 
-    def logs(self, obj=False):
-        logs = LogDB.query.filter_by(register=self).all()
+    def logs(self, obj=False, limit=None):
+        query = LogDB.query.filter_by(register=self).options(
+            db.joinedload(LogDB.author)).order_by(LogDB.created.desc(),
+                                                  LogDB.id.desc())
+        logs = query.limit(limit).all() if limit else query.all()
         if obj:
             return logs
         return list(map(lambda x: x.to_dict(), logs))
@@ -753,6 +843,10 @@ class Register(db.Model):
 
 class LogDB(db.Model):
     __tablename__ = "logs"
+    __table_args__ = (
+        db.Index("ix_logs_project_created", "project_id", "created"),
+        db.Index("ix_logs_register", "register_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -833,6 +927,12 @@ class LogDB(db.Model):
 
 class Tasks(db.Model):
     __tablename__ = "tasks"
+    __table_args__ = (
+        db.Index("ix_tasks_state", "processed", "done", "decision"),
+        db.Index("ix_tasks_action_open", "action",
+                 postgresql_where=text("NOT done"),
+                 sqlite_where=text("NOT done")),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     action = db.Column(db.Text, nullable=False)
@@ -876,8 +976,20 @@ class Tasks(db.Model):
         db.session.commit()
         return self
 
+    def parts(self):
+        """
+        Split the action into act, entity, login, project and task. The
+        result is kept until the action is changed
+        :return: Tuple of strings
+        """
+        cache = getattr(self, "_parts", None)
+        if not cache or cache[0] != self.action:
+            cache = (self.action, tuple(self.action.split("|")))
+            self._parts = cache
+        return cache[1]
+
     def brief(self):
-        act, entity, login, project, task = self.action.split("|")
+        act, entity, login, project, task = self.parts()
         if act in ["create", "add", "assign", "delete", "remove", "activate"]:
             if entity == "user":
                 act += " a user "
@@ -894,11 +1006,20 @@ class Tasks(db.Model):
             act += "by Automatic Service"
         return act
 
-    def short(self):
-        act, entity, login, project, task = self.action.split("|")
+    def short(self, users=None):
+        """
+        Short description of the task
+        :param users: Dictionary. User records by login. If set, users
+        referenced by the task are taken from it instead of the database
+        :return: String
+        """
+        act, entity, login, project, task = self.parts()
         if entity == "project":
             return self.brief()
-        if login:
+        user = None
+        if login and users is not None:
+            user = users.get(login, None)
+        elif login:
             user = User.query.filter_by(login=login).first()
         if act in ["create", "activate"]:
             task = task.split(" WITH ")[0]
@@ -920,7 +1041,7 @@ class Tasks(db.Model):
         return act
 
     def description(self):
-        act, entity, login, project, task = self.action.split("|")
+        act, entity, login, project, task = self.parts()
         if act in ["create", "activate"]:
             if "new project" in task:
                 return task
@@ -951,7 +1072,7 @@ class Tasks(db.Model):
             return ""
 
     def api(self):
-        act, entity, login, project, task = self.action.split("|")
+        act, entity, login, project, task = self.parts()
         return {
             "id": self.id,
             "notify": self.notify(),
@@ -964,7 +1085,7 @@ class Tasks(db.Model):
             "task": task
         }
 
-    def to_dict(self):
+    def to_dict(self, users=None):
         if self.done:
             status = "done"
         elif self.processed:
@@ -990,6 +1111,6 @@ class Tasks(db.Model):
             "status": status,
             "result": result,
             "comment": self.comment,
-            "short": self.short(),
+            "short": self.short(users),
             "modified": mod
         }
@@ -1,8 +1,7 @@
 from pathlib import Path
 from flask import current_app as app
-from logging import warning, debug
-from configparser import ConfigParser, ExtendedInterpolation
-from os.path import join as path_join, exists
+from logging import debug
+from base.config import registry
 from datetime import datetime as dt
 from parsedatetime import Calendar
 from threading import Thread
@@ -76,23 +75,18 @@ class Mail(Thread):
     def configure(self):
         """
         Configure Mail object with the values found in SERVER section of
-        configuration file
+        configuration file. The file is parsed once and shared by all Mail
+        objects until it is modified, see ConfigRegistry
         :return: Object. Instance of Mail object
         """
-        cfg_file = app.config.get("EMAIL_CONFIG", "mail.cfg")
-        cfg_path = path_join(app.instance_path, cfg_file)
-        self.cfg = ConfigParser(interpolation=ExtendedInterpolation(),
-                                allow_no_value=True)
-        if exists(cfg_path):
-            self.cfg.read(cfg_path, encoding="utf-8")
-        else:
-            warning("E-mail configuration file doesn't exists. Using defaults")
-        self.server = self.cfg.get("SERVER", "HOST", fallback="localhost")
-        self.port = self.cfg.getint("SERVER", "PORT", fallback=25)
-        self.use_tls = self.cfg.getboolean("SERVER", "USE_TLS", fallback=False)
-        self.use_ssl = self.cfg.getboolean("SERVER", "USE_SSL", fallback=False)
-        self.username = self.cfg.get("SERVER", "USERNAME", fallback=None)
-        self.password = self.cfg.get("SERVER", "PASSWORD", fallback=None)
+        self.cfg = registry.mail()
+        server = registry.mail_server()
+        self.server = server.host
+        self.port = server.port
+        self.use_tls = server.use_tls
+        self.use_ssl = server.use_ssl
+        self.username = server.username
+        self.password = server.password
         return self
 
     def run(self):
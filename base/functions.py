@@ -1,19 +1,18 @@
-from paramiko import SSHClient, AutoAddPolicy, AuthenticationException, RSAKey
-from paramiko import BadHostKeyException
+from base.ssh import ssh_pool, ssh_executor
+from base.parsers import parse_nodes, parse_sreport
+from base.config import registry
 from flask import current_app as app, flash, request, render_template
 from datetime import datetime as dt, timezone
 from tempfile import gettempdir, mkdtemp
 from os import walk
 from os.path import join as join_dir, exists
 from base64 import b64encode
-from recurrent.event_parser import RecurringEvent
 from configparser import ConfigParser
-from logging import error, debug, warning, critical
+from logging import error, debug, critical
 from pdfkit import from_string
 from pathlib import Path
 from string import ascii_letters, digits
 from struct import unpack
-from subprocess import check_output, STDOUT, CalledProcessError
 from os import urandom
 from re import split as re_split
 import locale
@@ -40,57 +39,55 @@ def process_register_user(user_as_string):
     return name, surname, email, login
 
 
-def ssh_public(key_file):
-    argz = ["ssh-keygen", "-l", "-f", key_file]
-    cmd = " ".join(argz)
-    debug("Executing command: %s" % cmd)
-    result = False
-    err = False
-    try:
-        result = check_output(argz, stderr=STDOUT, universal_newlines=True)
-    except CalledProcessError as e:
-        err = "Error while executing the command '%s': %s" % (cmd, e.output)
-    except Exception as e:
-        err = "Exception while executing command '%s': %s" % (cmd, e)
-    return result, err
-
-
 def ssh_wrapper(cmd, host=None):
+    """
+    Execute the command on the remote host using a pooled SSH connection
+    :param cmd: String. Command to execute
+    :param host: String. Remote host, SSH_SERVER by default
+    :return: Tuple. Lists of output and error lines
+    """
     debug("ssh_wrapper(%s)" % cmd)
-    if not host:
-        host = app.config["SSH_SERVER"]
-    login = app.config["SSH_USERNAME"]
-    key_file = app.config["SSH_KEY"]
-    key = RSAKey.from_private_key_file(key_file)
-    timeout = app.config.get("SSH_TIMEOUT", 60)
-    port = app.config.get("SSH_PORT", 22)
-    debug("Connecting to %s:%s with username %s and key %s" %
-          (host, port, login, key_file))
-    client = SSHClient()
-    client.set_missing_host_key_policy(AutoAddPolicy())
-    try:
-        client.connect(host, username=login, pkey=key, timeout=timeout,
-                       port=port)
-    except AuthenticationException:
-        error("Failed to connect to %s" % host)
-        client.close()
-        return [], []
-    except BadHostKeyException:
-        error("Host key given by %s did not match with expected" % host)
-        client.close()
-        return [], []
-    except Exception as e:
-        error("Failed to establish a connection to %s due following error: %s"
-              % (host, e))
-        client.close()
-        return [], []
-    stdin, stdout, stderr = client.exec_command(cmd)
-    output = stdout.readlines()
-    errors = stderr.readlines()
-    client.close()
-    debug("Out: %s" % output)
-    debug("Err: %s" % errors)
-    return output, errors
+    return ssh_pool.execute(cmd, host)
+
+
+def ssh_stream(cmd, host=None):
+    """
+    Execute the command on the remote host using a pooled SSH connection and
+    iterate over the output lines as they arrive. Error lines are available in
+    errors attribute of the result once the output is exhausted
+    :param cmd: String. Command to execute
+    :param host: String. Remote host, SSH_SERVER by default
+    :return: Object. Iterable RemoteStream
+    """
+    debug("ssh_stream(%s)" % cmd)
+    return ssh_pool.stream(cmd, host)
+
+
+async def ssh_async(cmd, host=None):
+    """
+    Awaitable version of ssh_wrapper for async views. Several commands can be
+    awaited concurrently with asyncio.gather, the number of commands running
+    at the same time is limited by REMOTE_WORKERS and REMOTE_HOST_WORKERS
+    options
+    :param cmd: String. Command to execute
+    :param host: String. Remote host, SSH_SERVER by default
+    :return: Tuple. Lists of output and error lines
+    """
+    debug("ssh_async(%s)" % cmd)
+    return await ssh_executor.execute(cmd, host)
+
+
+def ssh_gather(commands, timeout=None):
+    """
+    Execute the commands concurrently from synchronous code. Commands which
+    are not finished in timeout seconds are cancelled
+    :param commands: List of tuples. Command and host, None for SSH_SERVER
+    :param timeout: Integer. Timeout in seconds, no timeout if None
+    :return: List of futures in the order of commands. Result of a future is
+    a tuple of output and error lines, cancelled future means timeout
+    """
+    debug("ssh_gather(%s)" % commands)
+    return ssh_executor.wait(commands, timeout)
 
 
 def show_configuration():
@@ -236,109 +233,15 @@ def create_visa(record):
     return path
 
 
-def project_parse_cfg_options(cfg, section):
-    """
-    Parse project configuration. Use of recurrent lib to parse fuzzy time values
-    :param cfg: Configuration object
-    :param section: Section in the configuration object, i.e. project type
-    :return: Dictionary. Keys are: "duration_text", "duration_dt", "extendable",
-            "finish_text", "finish_dt", "cpu", "finish_notice_text", "acl",
-            "finish_notice_dt", "transform", "description", "evaluation_text",
-            "evaluation_dt", "evaluation_notice_text", "evaluation_notice_dt",
-            "finish_report"
-    """
-    r = RecurringEvent()
-    cpu = cfg.getint(section, "cpu", fallback=None)
-    description = cfg.get(section, "description", fallback=None)
-    duration = cfg.get(section, "duration", fallback=None)
-    if duration:
-        duration_dt = r.parse(duration).replace(tzinfo=timezone.utc)
-    else:
-        duration_dt = None
-    end = cfg.get(section, "finish_date", fallback=None)
-    if end:
-        end_dt = r.parse(end).replace(tzinfo=timezone.utc)
-    else:
-        end_dt = None
-    end_notice = cfg.get(section, "finish_notice", fallback=None)
-    if end_notice and end_dt:
-        tmp = RecurringEvent(end_dt).parse(end_notice)
-        end_notice_dt = tmp.replace(tzinfo=timezone.utc)
-    else:
-        end_notice_dt = None
-    end_report = cfg.get(section, "finish_report", fallback=None)
-    if end_report and end_dt:
-        tmp = RecurringEvent(end_dt).parse(end_report)
-        end_report_dt = tmp.replace(tzinfo=timezone.utc)
-    else:
-        end_report_dt = None
-    trans = cfg.get(section, "transform", fallback=None)
-    if trans:
-        transform = list(map(lambda x: x.strip(), trans.split(",")))
-    else:
-        transform = []
-    acl = cfg.get(section, "acl", fallback=[])
-    if acl:
-        acl = list(map(lambda x: x.strip(), acl.split(",")))
-    acl.append("admin")
-
-    eva = cfg.get(section, "evaluation_date", fallback=None)
-    if eva:
-        evaluation = list(map(lambda x: x.strip(), eva.split(",")))
-    else:
-        evaluation = []
-    if evaluation:
-        tmp = list(map(lambda x: r.parse(x), evaluation))
-        eva_dt = list(map(lambda x: x.replace(tzinfo=timezone.utc), tmp))
-    else:
-        eva_dt = None
-
-    eva_notice = cfg.get(section, "evaluation_notice", fallback=None)
-    if eva_notice and eva_dt:
-        tmp = list(map(lambda x: RecurringEvent(x).parse(eva_notice), eva_dt))
-        eva_text_dt = list(map(lambda x: x.replace(tzinfo=timezone.utc), tmp))
-    else:
-        eva_text_dt = None
-    extendable = cfg.getboolean(section, "extendable", fallback=False)
-    suspend = cfg.getboolean(section, "suspend", fallback=True)
-    visa_names = cfg.get(section, "visa", fallback=None)
-    if visa_names:
-        visa = list(map(lambda x: x.strip(), visa_names.split(",")))
-    else:
-        visa = []
-    return {"duration_text": duration, "duration_dt": duration_dt, "acl": acl,
-            "finish_text": end, "finish_dt": end_dt, "cpu": cpu, "visa": visa,
-            "finish_notice_text": end_notice, "extendable": extendable,
-            "suspend": suspend,
-            "finish_notice_dt": end_notice_dt,
-            "finish_report_dt": end_report_dt,
-            "transform": transform, "description": description,
-            "evaluation_text": evaluation, "evaluation_dt": eva_dt,
-            "evaluation_notice_text": eva_notice,
-            "evaluation_notice_dt": eva_text_dt}
-
-
 def project_config():
     """
-    Parsing file defined in PROJECT_CONFIG option of main application config.
-    Otherwise, trying to find project.cfg file
+    Parsed file defined in PROJECT_CONFIG option of main application config.
+    Otherwise, trying to find project.cfg file. The file is parsed again only
+    if it has been modified, see ConfigRegistry
     :return: Dict. Each project type (i.e. subsection in config file) having
     options returned by project_parse_cfg_options function
     """
-    result = {}
-    cfg_file = app.config.get("PROJECT_CONFIG", "project.cfg")
-    cfg_path = join_dir(app.instance_path, cfg_file)
-    if not exists(cfg_path):
-        warning("Projects configuration file doesn't exists. Using defaults")
-        return result
-    cfg = ConfigParser()
-    cfg.read(cfg_path)
-    projects = cfg.sections()
-    for project in projects:
-        name = project.lower()
-        result[name] = project_parse_cfg_options(cfg, project)
-    #debug("Project configuration: %s" % result)
-    return result
+    return registry.projects()
 
 
 def slurm_nodes_status():
@@ -351,33 +254,10 @@ def slurm_nodes_status():
     """
     cmd = ["sinfo", "-R", "--format='%100E|%19H|%30N|%t'"]
     run = " ".join(cmd)
-    data, err = ssh_wrapper(run)
-    if not data:
+    result = [x.to_dict() for x in parse_nodes(ssh_stream(run))]
+    if not result:
         debug("No data received, returning empty dictionary")
         return {}
-    result = []
-    for line in data:
-        if ("REASON" or "TIMESTAMP" or "NODELIST" or "STATE") in line:
-            debug("Skipping headline: %s" % line)
-            continue
-        info = line.split("|")
-        if len(info) != 4:
-            error("Wrong format: %s" % line)
-            continue
-        reason = info[0].strip()
-        try:
-            date = dt.strptime(info[1].strip(), "%Y-%m-%dT%H:%M:%S")
-        except ValueError as err:
-            error("Error parsing date '%s': %s" % (info[1].strip(), err))
-            date = None
-        node = info[2].strip()
-        stat = info[3].strip()
-        result.append({
-            "date": date.strftime("%Y-%m-%d %X %Z") if date else "Unknown",
-            "date_full": date.strftime("%c") if date else "Unknown",
-            "reason": reason,
-            "status": stat,
-            "node": node})
     return result
 
 
@@ -405,31 +285,17 @@ def slurm_parse(slurm_raw_output):
     output = {}
     if not slurm_raw_output:
         return output
-    meaningful = list(filter(lambda x: "|" in x, slurm_raw_output))
-    for item in meaningful:
-        debug("Parsing line: %s" % item)
-        if "||" not in item:  # user consumption
-            items = item.strip().split("|")
-        else:
-            items = item.strip().split("||")
-        name = items[0].strip()
-        if len(items) == 3:
-            login = items[1].strip()
-        else:
-            login = None
-        try:
-            conso = int(items[-1].strip())
-        except ValueError as err:
-            error("Exception converting '%s' to int: %s" % (items[-1], err))
-            continue
-        if name not in output:
-            output[name] = {}
-        if login:
-            output[name][login] = conso
-            debug("SLURM consumption for %s - %s: %s" % (name, login, conso))
+    for record in parse_sreport(slurm_raw_output):
+        if record.project not in output:
+            output[record.project] = {}
+        if record.login:
+            output[record.project][record.login] = record.cpu
+            debug("SLURM consumption for %s - %s: %s" % (
+                record.project, record.login, record.cpu))
         else:
-            output[name]["total consumption"] = conso
-            debug("SLURM consumption for %s: %s" % (name, conso))
+            output[record.project]["total consumption"] = record.cpu
+            debug("SLURM consumption for %s: %s" % (record.project,
+                                                     record.cpu))
     return output
 
 
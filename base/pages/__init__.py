@@ -6,6 +6,7 @@ from functools import wraps
 from base import db
 from base.email import Mail
 from base.database.schema import User, Tasks
+from base.bootstrap import bootstrap
 from base.utils import normalize_word
 from base.functions import generate_password, full_name
 from string import ascii_letters
@@ -50,21 +51,16 @@ def user_by_details(name, surname, email, login=None):
     email = email.lower()
     login1 = name[0] + surname
     login2 = surname[0] + name
-    result = [User.query.filter_by(login=login1).all(),
-              User.query.filter_by(login=login2).all(),
-              User.query.filter_by(email=email).all(),
-              User.query.filter_by(name=name, surname=surname).all(),
-              User.query.filter_by(name=surname, surname=name).all()]
-    if login:
-        result.append(User.query.filter_by(login=login).all())
-    not_empty = list(filter(lambda x: x != [], result))
-    every = [item for sublist in not_empty for item in sublist]
-    return list(set(every))
+    logins = [login1, login2, login] if login else [login1, login2]
+    ids = bootstrap.identities().find(logins=logins, emails=[email],
+                                      names=[(name, surname), (surname, name)])
+    if not ids:
+        return []
+    return User.query.filter(User.id.in_(ids)).all()
 
 
 def generate_login(name, surname):
-    users = User.query.all()
-    logins = list(map(lambda x: x.login, users))
+    logins = bootstrap.identities().logins
 
     name = normalize_word(name)
     name = "".join(filter(lambda x: x in ascii_letters, name)).lower()
@@ -295,7 +291,7 @@ class TaskQueue:
         ).first()
         if double:
             raise ValueError("Same previous task found ID: %s" % double.id)
-        if "admin" in current_user.permissions():
+        if "admin" in g.permissions:
             self.task.processed = True
         db.session.add(self.task)
         db.session.commit()
@@ -1,5 +1,6 @@
 from hashlib import md5
-from flask import g, render_template, url_for
+from heapq import nlargest
+from flask import current_app, g, render_template, url_for
 from flask_login import current_user
 from base import db
 from base.pages import check_str, TaskQueue
@@ -15,22 +16,34 @@ from base.pages.admin.form import (action_pending,
                                    edit_task,
                                    contact_user)
 from base.pages.admin.form import activate_user
-from base.pages.user.magic import user_by_id
+from base.pages.user.magic import user_by_id, scratch_info
 from base.pages.user.form import edit_info, set_password, PassForm
-from base.database.schema import (User, LogDB, Project, Tasks, ACLDB, Register,
-                                  Accounting)
+from base.database.schema import (User, Project, Tasks, ACLDB, Register,
+                                  Accounting, AccountingRollup, Resources,
+                                  UserConsumption)
 from base.email import Mail
-from base.classes import UserLog, RequestLog, TmpUser, ProjectLog, Task
-from base.functions import bytes2human
+from base.classes import (UserLog, RequestLog, TmpUser, ProjectLog, Task,
+                          LogQuery)
+from base.functions import bytes2human, slurm_parse, slurm_nodes_status
+from base.collector import collector
+from base.bootstrap import bootstrap
 from logging import error, debug
-from operator import attrgetter
 from datetime import timedelta, datetime as dt
-from base.functions import ssh_wrapper
+from sqlalchemy import and_, bindparam, func, literal, or_, select, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import joinedload
+from base.functions import ssh_stream, ssh_gather
+from base.parsers import parse_partitions, parse_space
 
 __author__ = "Matvey Sapunov"
 __copyright__ = "Aix Marseille University"
 
 
+ROLLUP = ("day", "week", "month")
+UPSERT = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
 def process_user_form(form):
     prenom = form.prenom.data
     surname = form.surname.data
@@ -62,26 +75,486 @@ def process_user_form(form):
     return user
 
 
-def account_days(days=30, project=None, user=None):
+def account_days(days=30, project=None, user=None, compact=False,
+                 granularity=None):
+    """
+    Daily consumption for the last days. Days without accounting records are
+    present in the result with zero consumption
+    :param days: Integer. Number of days including today
+    :param project: Object. Project record. Default is None
+    :param user: Object. User record. Default is None
+    :param compact: Boolean. Return dictionary with parallel lists of dates and
+    values instead of list of one key dictionaries
+    :param granularity: String. If set the consumption is taken from rollup
+    table. One of day, week, month or auto. Default is None
+    :return: List or Dictionary
+    """
+    if granularity:
+        end = dt.today().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = end - timedelta(days=days - 1) if days > 0 else end
+        if granularity == "auto":
+            granularity = rollup_granularity(start, end)
+        dates, values = rollup_series(granularity, start, end, project=project,
+                                      user=user)
+    else:
+        dates, values = account_series(days, project, user)
+    if compact:
+        return {"dates": dates, "values": values}
+    return [{date: value} for date, value in zip(dates, values)]
+
+
+def account_series(days=30, project=None, user=None):
+    """
+    Gap filled series of daily consumption produced by one query. On PostgreSQL
+    the days are generated by generate_series function, otherwise the missing
+    days are filled with zeros in place
+    :param days: Integer. Number of days including today
+    :param project: Object. Project record. Default is None
+    :param user: Object. User record. Default is None
+    :return: Tuple. List of dates in ascending order and list of consumption
+    """
     today = dt.today().replace(hour=0, minute=0, second=0, microsecond=0)
-    dates = [today - timedelta(days=i) for i in range(days)]
-    every = Accounting.query.filter(
-        Accounting.project == project,
-        Accounting.user == user
+    start = today - timedelta(days=days - 1) if days > 0 else today
+    table = Accounting.__table__
+    pid = project.id if project else None
+    uid = user.id if user else None
+    condition = and_(
+        table.c.project_id == pid if pid else table.c.project_id.is_(None),
+        table.c.user_id == uid if uid else table.c.user_id.is_(None))
+    day = timedelta(days=1)
+    if db.engine.dialect.name == "postgresql":
+        series = func.generate_series(
+            start, today, day).table_valued("day").render_derived()
+        join = series.outerjoin(table, and_(
+            condition, table.c.date >= series.c.day,
+            table.c.date < series.c.day + day))
+        rows = db.session.execute(select(
+            series.c.day, func.coalesce(func.sum(table.c.cpu), 0)
+        ).select_from(join).group_by(series.c.day).order_by(series.c.day))
+        dates, values = [], []
+        for date, cpu in rows:
+            dates.append(date.strftime("%Y-%m-%d 00:00"))
+            values.append(int(cpu))
+        return dates, values
+    rows = db.session.execute(select(
+        table.c.date, table.c.cpu
+    ).where(
+        condition, table.c.date >= start, table.c.date < today + day
+    ))
+    every = {}
+    for date, cpu in rows:
+        key = date.strftime("%Y-%m-%d 00:00")
+        every[key] = every.get(key, 0) + (cpu if cpu else 0)
+    dates = [(start + timedelta(days=i)).strftime("%Y-%m-%d 00:00")
+             for i in range((today - start).days + 1)]
+    return dates, [every.get(date, 0) for date in dates]
+
+
+def accounting_date(raw=None):
+    """
+    Convert date string in format YYYY-MM-DD to datetime object. If no date is
+    provided the day before today is used as sreport is collecting the
+    consumption for the previous day
+    :param raw: String. Date in format YYYY-MM-DD. Optional
+    :return: Datetime. Midnight of the given date
+    """
+    today = dt.today().replace(hour=0, minute=0, second=0, microsecond=0)
+    if not raw:
+        return today - timedelta(days=1)
+    try:
+        return dt.strptime(raw.strip(), "%Y-%m-%d")
+    except ValueError:
+        raise ValueError("Date '%s' is not in format YYYY-MM-DD" % raw)
+
+
+def accounting_upload(lines, date):
+    """
+    Parse output of sreport command with slurm_parse function and save the
+    consumption in accounting table in one transaction. Records are identified
+    by resources, user and date: new records are inserted, records with
+    different consumption are updated, identical records and records for unknown
+    projects or users are skipped
+    :param lines: Iterable. Lines of sreport output
+    :param date: Datetime. Date of the consumption
+    :return: Dictionary. Number of inserted, updated and skipped records
+    """
+    data = slurm_parse(lines)
+    result = {"inserted": 0, "updated": 0, "skipped": 0}
+    if not data:
+        return result
+    total = "total consumption"
+    projects = db.session.query(
+        Project.name, Project.id, Project.resources_id
+    ).filter(Project.name.in_(list(data.keys()))).all()
+    projects = {name: (pid, rid) for name, pid, rid in projects}
+    logins = set()
+    for value in data.values():
+        logins.update(filter(lambda x: x != total, value.keys()))
+    users = db.session.query(User.login, User.id).filter(
+        User.login.in_(list(logins))).all() if logins else []
+    users = dict(users)
+    resources = list(filter(None, map(lambda x: x[1], projects.values())))
+    existing = db.session.query(
+        Accounting.id, Accounting.resources_id, Accounting.user_id,
+        Accounting.cpu
+    ).filter(
+        Accounting.date == date, Accounting.resources_id.in_(resources)
+    ).all() if resources else []
+    existing = {(rid, uid): (aid, cpu) for aid, rid, uid, cpu in existing}
+
+    insert, update, delta = [], [], {}
+    for name, consumption in data.items():
+        pid, rid = projects.get(name, (None, None))
+        if not rid:
+            error("Project %s is not found or has no resources" % name)
+            result["skipped"] += len(consumption)
+            continue
+        for login, cpu in consumption.items():
+            uid = None if login == total else users.get(login, None)
+            if login != total and not uid:
+                error("User %s of project %s is not found" % (login, name))
+                result["skipped"] += 1
+                continue
+            if (rid, uid) not in existing:
+                insert.append({"resources_id": rid, "project_id": pid,
+                               "user_id": uid, "date": date, "cpu": cpu})
+                delta[(rid, uid)] = cpu
+                continue
+            aid, old = existing[(rid, uid)]
+            if old == cpu:
+                result["skipped"] += 1
+                continue
+            update.append({"id": aid, "cpu": cpu})
+            delta[(rid, uid)] = cpu - (old if old else 0)
+    try:
+        db.session.bulk_insert_mappings(Accounting, insert)
+        db.session.bulk_update_mappings(Accounting, update)
+        consumption_update(delta)
+        owners = {rid: pid for pid, rid in projects.values()}
+        rollup_update(delta, date, owners)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    result["inserted"] = len(insert)
+    result["updated"] = len(update)
+    debug("Accounting for %s: %s" % (date.strftime("%Y-%m-%d"), result))
+    return result
+
+
+def consumption_update(delta):
+    """
+    Add the difference in consumption to the total consumption of resources and
+    to the consumption of users. Changes are not committed, so they are saved
+    in the same transaction as accounting records. On PostgreSQL and SQLite the
+    records of users are upserted
+    :param delta: Dictionary. Keys are tuples of resources id and user id, user
+    id is None for total consumption. Values are the difference in consumption
+    :return: None
+    """
+    total = [{"rid": rid, "delta": cpu} for (rid, uid), cpu in delta.items()
+             if uid is None and cpu]
+    users = {key: cpu for key, cpu in delta.items()
+             if key[1] is not None and cpu}
+    if total:
+        table = Resources.__table__
+        db.session.execute(table.update().where(
+            table.c.id == bindparam("rid")
+        ).values(
+            consumed=func.coalesce(table.c.consumed, 0) + bindparam("delta")
+        ), total)
+    if not users:
+        return
+    table = UserConsumption.__table__
+    rows = [{"resources_id": rid, "user_id": uid, "cpu": cpu}
+            for (rid, uid), cpu in users.items()]
+    dialect = db.engine.dialect.name
+    if dialect not in UPSERT:
+        return consumption_update_rows(rows)
+    statement = UPSERT[dialect](table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.resources_id, table.c.user_id],
+        set_={"cpu": table.c.cpu + statement.excluded.cpu})
+    db.session.execute(statement, rows)
+
+
+def consumption_update_rows(rows):
+    """
+    Add consumption to existing records of users and insert the missing ones,
+    for databases without upsert
+    :param rows: List of dictionaries. User consumption records to add
+    :return: None
+    """
+    resources = list(set(map(lambda x: x["resources_id"], rows)))
+    existing = set(db.session.query(
+        UserConsumption.resources_id, UserConsumption.user_id
+    ).filter(UserConsumption.resources_id.in_(resources)).all())
+    table = UserConsumption.__table__
+    insert = [x for x in rows
+              if (x["resources_id"], x["user_id"]) not in existing]
+    update = [{"rid": x["resources_id"], "uid": x["user_id"],
+               "delta": x["cpu"]} for x in rows
+              if (x["resources_id"], x["user_id"]) in existing]
+    if insert:
+        db.session.execute(table.insert(), insert)
+    if update:
+        db.session.execute(table.update().where(
+            (table.c.resources_id == bindparam("rid"))
+            & (table.c.user_id == bindparam("uid"))
+        ).values(cpu=table.c.cpu + bindparam("delta")), update)
+
+def consumption_rebuild():
+    """
+    Recalculate total consumption of resources and consumption of users out of
+    accounting records. To be used if accounting table has been modified
+    without going through accounting_upload()
+    :return: Dictionary. Number of resources and user consumption records
+    """
+    resources = Resources.__table__
+    accounting = Accounting.__table__
+    users = UserConsumption.__table__
+    total = select(
+        func.coalesce(func.sum(accounting.c.cpu), 0)
+    ).where(
+        (accounting.c.resources_id == resources.c.id)
+        & accounting.c.user_id.is_(None)
+    ).scalar_subquery()
+    per_user = select(
+        accounting.c.resources_id, accounting.c.user_id,
+        func.sum(accounting.c.cpu)
+    ).where(
+        accounting.c.resources_id.isnot(None) & accounting.c.user_id.isnot(None)
+    ).group_by(accounting.c.resources_id, accounting.c.user_id)
+    try:
+        updated = db.session.execute(resources.update().values(consumed=total))
+        db.session.execute(users.delete())
+        inserted = db.session.execute(users.insert().from_select(
+            ["resources_id", "user_id", "cpu"], per_user))
+        rollup = rollup_rebuild()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    result = {"resources": updated.rowcount, "users": inserted.rowcount,
+              "rollup": rollup}
+    debug("Consumption summary rebuilt: %s" % result)
+    return result
+
+
+def rollup_period(date, granularity):
+    """
+    Beginning of the period the date belongs to. Weeks start on Monday
+    :param date: Datetime. Date to convert
+    :param granularity: String. One of day, week or month
+    :return: Datetime. Midnight of the first day of the period
+    """
+    day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def rollup_next(period, granularity):
+    """
+    Beginning of the period following the given one
+    :param period: Datetime. Beginning of a period
+    :param granularity: String. One of day, week or month
+    :return: Datetime
+    """
+    if granularity == "week":
+        return period + timedelta(days=7)
+    if granularity == "month":
+        if period.month == 12:
+            return period.replace(year=period.year + 1, month=1)
+        return period.replace(month=period.month + 1)
+    return period + timedelta(days=1)
+
+
+def rollup_granularity(start, end):
+    """
+    Select the finest granularity which gives not more then ROLLUP_POINTS
+    periods, 366 by default, for the given time interval
+    :param start: Datetime. Beginning of the interval
+    :param end: Datetime. End of the interval
+    :return: String. One of day, week or month
+    """
+    limit = current_app.config.get("ROLLUP_POINTS", 366)
+    days = (end - start).days + 1
+    if days <= limit:
+        return "day"
+    if days / 7 <= limit:
+        return "week"
+    return "month"
+
+
+def rollup_update(delta, date, owners):
+    """
+    Add the difference in consumption to daily, weekly and monthly rollup
+    records. Changes are not committed, so they are saved in the same
+    transaction as accounting records. On PostgreSQL and SQLite the records
+    are upserted, so concurrent uploads can't create two records for the same
+    period, resources and user
+    :param delta: Dictionary. Keys are tuples of resources id and user id, user
+    id is None for total consumption. Values are the difference in consumption
+    :param date: Datetime. Date of the consumption
+    :param owners: Dictionary. Project id for each resources id
+    :return: None
+    """
+    delta = {key: cpu for key, cpu in delta.items() if cpu}
+    if not delta:
+        return
+    periods = {x: rollup_period(date, x) for x in ROLLUP}
+    rows = [{"granularity": x, "period": period, "resources_id": rid,
+             "project_id": owners.get(rid), "user_id": uid, "cpu": cpu}
+            for (rid, uid), cpu in delta.items()
+            for x, period in periods.items()]
+    table = AccountingRollup.__table__
+    dialect = db.engine.dialect.name
+    if dialect not in UPSERT:
+        return rollup_update_rows(rows)
+    users = [x for x in rows if x["user_id"] is not None]
+    totals = [x for x in rows if x["user_id"] is None]
+    for records, key, where in [
+            (users, ["user_id"], table.c.user_id.isnot(None)),
+            (totals, [], table.c.user_id.is_(None))]:
+        if not records:
+            continue
+        statement = UPSERT[dialect](table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.granularity, table.c.period,
+                            table.c.resources_id] + [table.c[x] for x in key],
+            index_where=where,
+            set_={"cpu": table.c.cpu + statement.excluded.cpu})
+        db.session.execute(statement, records)
+
+
+def rollup_update_rows(rows):
+    """
+    Add consumption to existing rollup records and insert the missing ones,
+    for databases without upsert
+    :param rows: List of dictionaries. Rollup records to add
+    :return: None
+    """
+    resources = list(set(map(lambda x: x["resources_id"], rows)))
+    periods = set((x["granularity"], x["period"]) for x in rows)
+    existing = db.session.query(
+        AccountingRollup.id, AccountingRollup.granularity,
+        AccountingRollup.resources_id, AccountingRollup.user_id
+    ).filter(
+        AccountingRollup.resources_id.in_(resources),
+        or_(*[and_(AccountingRollup.granularity == x,
+                   AccountingRollup.period == period)
+              for x, period in periods])
+    ).all()
+    existing = {(x, rid, uid): rollup_id for rollup_id, x, rid, uid in existing}
+    insert, update = [], []
+    for row in rows:
+        key = (row["granularity"], row["resources_id"], row["user_id"])
+        if key in existing:
+            update.append({"rollup_id": existing[key], "delta": row["cpu"]})
+        else:
+            insert.append(row)
+    table = AccountingRollup.__table__
+    if insert:
+        db.session.execute(table.insert(), insert)
+    if update:
+        db.session.execute(table.update().where(
+            table.c.id == bindparam("rollup_id")
+        ).values(cpu=table.c.cpu + bindparam("delta")), update)
+
+
+def rollup_rebuild():
+    """
+    Recreate daily, weekly and monthly rollup records out of accounting table.
+    Changes are not committed
+    :return: Integer. Number of rollup records
+    """
+    table = AccountingRollup.__table__
+    accounting = Accounting.__table__
+    if db.engine.dialect.name == "postgresql":
+        # Uploads wait until the rebuild is committed, otherwise their
+        # changes could be counted twice or lost
+        db.session.execute(text("LOCK TABLE accounting_rollup IN EXCLUSIVE "
+                                "MODE"))
+    db.session.execute(table.delete())
+    if db.engine.dialect.name == "postgresql":
+        count = 0
+        for x in ROLLUP:
+            period = func.date_trunc(x, accounting.c.date)
+            query = select(
+                literal(x), period, accounting.c.resources_id,
+                func.min(accounting.c.project_id), accounting.c.user_id,
+                func.sum(accounting.c.cpu)
+            ).where(accounting.c.resources_id.isnot(None)).group_by(
+                period, accounting.c.resources_id, accounting.c.user_id)
+            result = db.session.execute(table.insert().from_select(
+                ["granularity", "period", "resources_id", "project_id",
+                 "user_id", "cpu"], query))
+            count += result.rowcount
+        return count
+    rollup, owners = {}, {}
+    query = select(
+        accounting.c.resources_id, accounting.c.project_id,
+        accounting.c.user_id, accounting.c.date, accounting.c.cpu
+    ).where(accounting.c.resources_id.isnot(None))
+    for rid, pid, uid, date, cpu in db.session.execute(query):
+        if pid is not None:
+            owners[rid] = min(pid, owners.get(rid, pid))
+        for x in ROLLUP:
+            key = (x, rollup_period(date, x), rid, uid)
+            rollup[key] = rollup.get(key, 0) + (cpu if cpu else 0)
+    insert = [{"granularity": x, "period": period, "resources_id": rid,
+               "project_id": owners.get(rid), "user_id": uid, "cpu": cpu}
+              for (x, period, rid, uid), cpu in rollup.items()]
+    if insert:
+        db.session.execute(table.insert(), insert)
+    return len(insert)
+
+
+def rollup_series(granularity, start, end, project=None, user=None,
+                  resources=None):
+    """
+    Gap filled series of consumption taken from rollup table. Without user the
+    total consumption is returned
+    :param granularity: String. One of day, week or month
+    :param start: Datetime. Beginning of the interval
+    :param end: Datetime. End of the interval
+    :param project: Object. Project record. Default is None
+    :param user: Object. User record. Default is None
+    :param resources: Object. Resources record. Default is None
+    :return: Tuple. List of period dates in ascending order and list of
+    consumption
+    """
+    if granularity not in ROLLUP:
+        raise ValueError("Granularity should be one of: %s" % ", ".join(ROLLUP))
+    first = rollup_period(start, granularity)
+    query = db.session.query(
+        AccountingRollup.period, func.sum(AccountingRollup.cpu)
+    ).filter(
+        AccountingRollup.granularity == granularity,
+        AccountingRollup.period >= first,
+        AccountingRollup.period <= end
     )
-    if len(dates) > 0:
-        every = every.filter(Accounting.date >= dates[-1])
+    if user:
+        query = query.filter(AccountingRollup.user_id == user.id)
     else:
-        every = every.filter(Accounting.date == today)
-    every = every.order_by(Accounting.date.desc()).limit(days).all()
-    every_data = list(map(lambda x: {x.date.strftime("%Y-%m-%d 00:00"): x.cpu}, every))
-    every_keys = list(map(lambda x: x.date.strftime("%Y-%m-%d 00:00"), every))
-
-    for date in dates:
-        date = date.strftime("%Y-%m-%d 00:00")
-        if date not in every_keys:
-            every_data.append({date: 0})
-    return every_data
+        query = query.filter(AccountingRollup.user_id.is_(None))
+    if project:
+        query = query.filter(AccountingRollup.project_id == project.id)
+    if resources:
+        query = query.filter(AccountingRollup.resources_id == resources.id)
+    every = {}
+    for period, cpu in query.group_by(AccountingRollup.period).all():
+        key = period.strftime("%Y-%m-%d 00:00")
+        every[key] = every.get(key, 0) + int(cpu)
+    dates = []
+    period = first
+    while period <= end:
+        dates.append(period.strftime("%Y-%m-%d 00:00"))
+        period = rollup_next(period, granularity)
+    return dates, [every.get(date, 0) for date in dates]
 
 
 def last_user(data):
@@ -181,9 +654,10 @@ def render_registry(user):
 
 def render_task(task):
     row = render_template("bits/task_expand_row.html", task=task)
-    row += render_template("modals/tasks_accept_task.html", task=task.to_dict())
-    row += render_template("modals/tasks_ignore_task.html", task=task.to_dict())
-    row += render_template("modals/tasks_reject_task.html", task=task.to_dict())
+    info = task.to_dict()
+    row += render_template("modals/tasks_accept_task.html", task=info)
+    row += render_template("modals/tasks_ignore_task.html", task=info)
+    row += render_template("modals/tasks_reject_task.html", task=info)
     form = edit_task(task)
     row += render_template("modals/tasks_edit_task.html", task=task, form=form)
     return row
@@ -228,7 +702,8 @@ def render_pending(rec):
     ignore = render_template("modals/admin_ignore_pending.html", rec=rec)
     form = contact_pending(rec)
     mail = render_template("modals/common_send_message.html", form=form)
-    logs = list(map(lambda x: x.brief(), RequestLog(rec).list()))
+    limit = current_app.config.get("LOG_PAGE", 100)
+    logs = list(map(lambda x: x.brief(), RequestLog(rec).list(limit)))
     row = render_template("bits/pending_expand_row.html",
                           pending=rec.to_dict(),
                           logs=logs)
@@ -237,22 +712,44 @@ def render_pending(rec):
 
 def all_users():
     """
-    Query all the users, check if there is a task associated with a user and
-    set a todo property to True for such user and then apply info_acl method
-    to all the users in a list.
+    Select columns of all the users together with their ACL in one query and
+    format them like User.info_acl method. Users with at least one accepted
+    task waiting to be executed get todo property set to True. Waiting tasks
+    are selected in one aggregated query
     :return: List. List of users info dicts
     """
-    dirty = list(filter(lambda x: x.user, Tasks().waiting()))
-    users = User.query.all()
-    for task in dirty:
-        idx = users.index(task.user)
-        if not hasattr(users[idx], "todo"):
-            users[idx].todo = True
-    return list(map(lambda x: x.info_acl(), User.query.all()))
+    waiting = db.session.query(Tasks.uid).filter(
+        Tasks.processed == True,
+        Tasks.done == False,
+        Tasks.decision == "accept",
+        Tasks.uid.isnot(None)
+    ).group_by(Tasks.uid)
+    todo = set(map(lambda x: x.uid, waiting))
+    users = db.session.query(
+        User.id, User.active, User.login, User.name, User.surname, User.seen,
+        User.email, ACLDB.is_user, ACLDB.is_responsible, ACLDB.is_manager,
+        ACLDB.is_tech, ACLDB.is_committee, ACLDB.is_admin
+    ).outerjoin(ACLDB, User.acl_id == ACLDB.id)
+    result = []
+    for row in users:
+        info = User.acl_info(row, row)
+        info["todo"] = row.id in todo
+        result.append(info)
+    return result
 
 
-def event_log():
-    return list(map(lambda x: x.to_web(), LogDB.query.all()))
+def event_log(args):
+    """
+    One page of the event log. Number of records on the page is set by limit
+    argument, LOG_PAGE records by default, but not more then LOG_PAGE_MAX. See
+    LogQuery.filter for the list of filter arguments
+    :param args: Dictionary. Request arguments
+    :return: Tuple. List of records dictionaries and cursor of the next page
+    """
+    limit = LogQuery.limit(args.get("limit", None))
+    records, cursor = LogQuery().filter(args).page(args.get("cursor", None),
+                                                   limit)
+    return list(map(lambda x: x.to_web(), records)), cursor
 
 
 def get_registration_record(pid):
@@ -625,12 +1122,35 @@ def process_task(tid, result):
     return task.done(result)  # TODO: result of task should be an argument for done methode
 
 
-def task_history(reverse=True):
-    # Returns a list of all tasks registered in the system. by default
+def task_history(reverse=True, limit=None, offset=0):
+    # Returns a list of tasks registered in the system. by default
     # the records are sorted by date in descending order
-    tasks = sorted(Tasks.query.all(), key=attrgetter("created"),
-                   reverse=reverse)
-    return list(map(lambda x: x.to_dict(), tasks)) if tasks else []
+    if reverse:
+        order = (Tasks.created.desc(), Tasks.id.desc())
+    else:
+        order = (Tasks.created, Tasks.id)
+    query = Tasks.query.order_by(*order).offset(offset)
+    if limit:
+        query = query.limit(limit)
+    return tasks_to_dict(query)
+
+
+def tasks_to_dict(query):
+    """
+    Serialize tasks by to_dict() method. Author and approve are loaded in the
+    same query and users referenced by login in the task actions are loaded
+    by one additional query
+    :param query: Query object. Query of Tasks records
+    :return: List. List of dictionaries returned by Tasks.to_dict()
+    """
+    tasks = query.options(joinedload(Tasks.author),
+                          joinedload(Tasks.approve)).all()
+    logins = set(filter(None, map(lambda x: x.parts()[2], tasks)))
+    users = {}
+    if logins:
+        users = {x.login: x for x in
+                 User.query.filter(User.login.in_(logins)).all()}
+    return list(map(lambda x: x.to_dict(users), tasks))
 
 
 class TaskManager:
@@ -655,18 +1175,67 @@ class TaskManager:
     def list(self):
         # Returns a list of unprocessed tasks, i.e. a task has been created by
         # a user but admins haven't had time yet to check it out
-        tasks = Tasks.query.filter(
+        query = Tasks.query.filter(
             Tasks.processed != True).filter(Tasks.done != True
-        ).all()
-        return list(map(lambda x: x.to_dict(), tasks)) if tasks else []
+        ).order_by(Tasks.created.desc(), Tasks.id.desc())
+        return tasks_to_dict(query)
+
+
+def system_info():
+    """
+    Information about the servers listed in ADMIN_SERVER option. The option
+    is either a list or a comma separated string
+    :return: List. Information about servers
+    """
+    servers = current_app.config["ADMIN_SERVER"]
+    if not isinstance(servers, list):
+        servers = servers.split(",")
+    return servers_info([x.strip() for x in servers if x.strip()])
+
+
+def servers_info(servers):
+    """
+    Query all servers concurrently. Commands are executed by the remote
+    executor, so not more then REMOTE_HOST_WORKERS commands run on a server
+    at the same time and not more then REMOTE_WORKERS in total. The result is
+    returned after SYS_INFO_TIMEOUT seconds, 15 by default, even if some
+    servers have not answered yet. Commands on such servers are cancelled and
+    the servers are reported with status "timeout", the servers which failed
+    to answer with status "error"
+    :param servers: List. Server names
+    :return: List. Information about servers in the same order
+    """
+    if not servers:
+        return []
+    timeout = current_app.config.get("SYS_INFO_TIMEOUT", 15)
+    futures = ssh_gather([(SERVER_INFO, x) for x in servers], timeout=timeout)
+    result = []
+    for server, future in zip(servers, futures):
+        if future.cancelled():
+            error("No answer from %s in %ss" % (server, timeout))
+            result.append(server_info_stub(server, "timeout"))
+        elif future.exception():
+            error("Failed to get information from %s: %s" % (
+                server, future.exception()))
+            result.append(server_info_stub(server, "error"))
+        else:
+            output, errors = future.result()
+            result.append(parse_server_info(server, output, errors))
+    return result
+
+
+def server_info_stub(server, status):
+    return {"server": server, "uptime": "", "memory": "", "load": "",
+            "swap": "", "status": status}
+
+
+SERVER_INFO = ("echo cores:`nproc` && uptime -p && free -b | grep -v total && "
+               "uptime| awk '/average/ {OFS=\":\"; print \"Load\",$(NF-2),"
+               "$(NF-1),$NF}'&& who | cut -d' ' -f1 | sort -u")
 
 
-def get_server_info(server):
-    out = {"server": server, "uptime": "", "memory": "", "load": "", "swap": ""}
-    cmd = "echo cores:`nproc` && uptime -p && free -b | grep -v total && uptime"
-    cmd += "| awk '/average/ {OFS=\":\"; print \"Load\",$(NF-2),$(NF-1),$NF}'"
-    cmd += "&& who | cut -d' ' -f1 | sort -u"
-    result, err = ssh_wrapper(cmd, host=server)
+def parse_server_info(server, result, err):
+    out = server_info_stub(server, "error")
     if not result:
         error("Error getting information from the remote server: %s" % err)
         return out
@@ -694,8 +1263,11 @@ def get_server_info(server):
     out["load"] = "{0:.1%}".format(float(uptime["load_1"]) / float(cores))
     out["memory"] = memory["usage"]
     out["swap"] = swap["usage"]
+    out["status"] = "ok"
+    # Rendered by the collector outside of a request, where g is empty
     out["html"] = render_template("bits/system_expand_row.html", users=users,
-                                  mem=memory, swap=swap, load=uptime, up=up)
+                                  known=bootstrap.user_list(), mem=memory,
+                                  swap=swap, load=uptime, up=up)
     return out
 
 
@@ -757,41 +1329,39 @@ def space_info():
         "mountpoint": ...}
     :return: List of dict
     """
-    result, err = ssh_wrapper("df -h")
-    if not result:
-        raise ValueError("Error getting disk space information: %s" % err)
-
-    space = []
-    for record in result:
-        if "Filesystem" in record:
-            continue
-        keywords = ["/home", "/save", "/trinity/shared", "/scratch",
-                    "/scratchfast", "/scratchw"]
-        filesystem, size, used, avail, use, mountpoint = record.split()
-        if mountpoint.strip() not in keywords:
-            continue
-        space.append({"filesystem": filesystem.strip(),
-                      "size": size.strip(),
-                      "used": used.strip(),
-                      "available": avail.strip(),
-                      "use": use.strip(),
-                      "mountpoint": mountpoint.strip()})
+    output = ssh_stream("df -h")
+    keywords = ["/home", "/save", "/trinity/shared", "/scratch",
+                "/scratchfast", "/scratchw"]
+    space = [x.to_dict() for x in parse_space(output)
+             if x.mountpoint in keywords]
+    if not output.lines:
+        raise ValueError("Error getting disk space information: %s" %
+                         output.errors)
     return space
 
 
-def slurm_partition_info():
-    result, err = ssh_wrapper("sinfo -s")
-    if not result:
-        raise ValueError("Error getting partition information: %s" % err)
+def quota_top(limit, refresh=False):
+    """
+    Users with the largest scratch space usage
+    :param limit: Integer. Number of users to return
+    :param refresh: Boolean. Collect the quota of all users right away
+    :return: Tuple. List of dictionaries and age of the quota snapshot
+    """
+    quota, age = collector.snapshot("quota", refresh=refresh)
+    top = nlargest(limit, quota.items(), key=lambda x: x[1][1])
+    result = []
+    for login, record in top:
+        try:
+            result.append(scratch_info(login, record))
+        except (ValueError, ZeroDivisionError) as err:
+            error("Wrong quota record of %s: %s" % (login, err))
+    return result, age
 
-    partition = []
-    for record in result:
-        if "PARTITION" in record:
-            continue
-        name, avail, time, nodes, nodelist = record.split()
-        name = name.strip()
-        nodes = nodes.strip()
-        allocated, idle, other, total = nodes.split("/")
-        partition.append({"name": name, "allocated": allocated, "idle": idle,
-                          "other": other, "total": int(total)})
+
+def slurm_partition_info():
+    output = ssh_stream("sinfo -s")
+    partition = [x.to_dict() for x in parse_partitions(output)]
+    if not partition:
+        raise ValueError("Error getting partition information: %s" %
+                         output.errors)
     return partition
@@ -9,16 +9,18 @@ from base.pages.admin import bp
 from base.pages.admin.magic import (
     process_user_form,
     account_days,
+    accounting_date,
+    accounting_upload,
+    consumption_rebuild,
     last_user,
     render_task,
     render_pending,
     render_registry,
     all_users,
     event_log,
-    get_server_info,
+    quota_top,
     get_ltm,
     TaskManager,
-    slurm_partition_info,
     process_task,
     unprocessed_dict,
     user_info_update,
@@ -32,9 +34,8 @@ from base.pages.admin.magic import (
     registration_user_update,
     registration_responsible_edit,
     registration_record_edit,
-    space_info,
     task_history)
-from base.functions import slurm_nodes_status, show_configuration, ssh_wrapper
+from base.functions import show_configuration, ssh_wrapper
 from base.pages.admin.form import (
     CreateForm,
     PendingActionForm,
@@ -49,6 +50,7 @@ from base.pages.admin.form import (
     NewUserEditForm)
 from base.pages.project.magic import process_extension
 from base.utils import form_error_string
+from base.collector import collector
 from base.database.schema import Project
 from datetime import datetime as dt, timezone as tz
 
@@ -421,7 +423,21 @@ def web_admin_tasks_info(tid):
 @login_required
 @grant_access("admin")
 def web_admin_tasks_history():
-    return jsonify(data=task_history())
+    """
+    Tasks sorted by creation date, newest first. Number of tasks is limited by
+    limit argument, or by TASK_PAGE option if set, and offset argument skips
+    the given number of tasks. All tasks are returned by default, as the
+    history page doesn't load the tasks page by page
+    :return: JSON
+    """
+    try:
+        limit = request.args.get("limit", current_app.config.get(
+            "TASK_PAGE", None))
+        limit = int(limit) if limit else None
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        raise ValueError("Limit and offset should be integers")
+    return jsonify(data=task_history(limit=limit, offset=offset))
 
 
 @bp.route("/admin/tasks/todo", methods=["POST"])
@@ -452,7 +468,9 @@ def admin_tasks_done(tid):
 @login_required
 @grant_access("admin")
 def web_admin_partition_info():
-    return jsonify(data=slurm_partition_info())
+    refresh = request.args.get("refresh", None) == "1"
+    data, age = collector.snapshot("partitions", refresh=refresh)
+    return jsonify(data=data, age=age)
 
 
 @bp.route("/admin/user/info", methods=["POST"])
@@ -510,47 +528,103 @@ def web_admin_pending_list():
     return jsonify(data=unprocessed_dict())
 
 
+@bp.route("/admin/accounting/upload", methods=["POST"])
+@login_required
+@grant_access("admin", "tech")
+def admin_accounting_upload():
+    """
+    Save the raw output of sreport command sent in the request body to the
+    accounting table. Date of the consumption could be set by date parameter in
+    format YYYY-MM-DD, otherwise the consumption is saved for yesterday
+    :return: JSON. Number of inserted, updated and skipped records
+    """
+    date = accounting_date(request.args.get("date", None))
+    lines = map(lambda x: x.decode("utf-8", errors="replace"), request.stream)
+    return jsonify(data=accounting_upload(lines, date))
+
+
+@bp.route("/admin/accounting/rebuild", methods=["POST"])
+@login_required
+@grant_access("admin", "tech")
+def admin_accounting_rebuild():
+    """
+    Recalculate consumption summary and rollup records of all resources out of
+    accounting table
+    :return: JSON. Number of updated resources, user consumption and rollup
+    records
+    """
+    return jsonify(data=consumption_rebuild())
+
+
 @bp.route("/admin/accounting/<string:name>", methods=["POST", "GET"])
 @login_required
 @grant_access("admin", "manager", "responsible", "user")
 def web_admin_accounting_project(name):
+    """
+    Daily consumption of the project since creation of its resources. With
+    format=compact parameter the data is returned as parallel lists of dates
+    and values. With granularity parameter (day, week, month or auto) the
+    consumption is taken from rollup table
+    :param name: String. Name of the project
+    :return: JSON
+    """
     project = Project.query.filter_by(name=name).one()
     days = (dt.now(tz=tz.utc) - project.resources.created).days
-    return jsonify(data=account_days(days, project=project))
+    compact = request.args.get("format", None) == "compact"
+    granularity = request.args.get("granularity", None)
+    return jsonify(data=account_days(days, project=project, compact=compact,
+                                     granularity=granularity))
 
 
 @bp.route("/admin/accounting/<int:last>", methods=["POST", "GET"])
 @login_required
 @grant_access("admin", "manager", "responsible", "user")
 def web_admin_accounting_days(last):
-    return jsonify(data=account_days(last))
+    compact = request.args.get("format", None) == "compact"
+    granularity = request.args.get("granularity", None)
+    return jsonify(data=account_days(last, compact=compact,
+                                     granularity=granularity))
 
 
 @bp.route("/admin/slurm/nodes/list", methods=["POST"])
 @login_required
 @grant_access("admin")
 def web_slurm_node_list():
-    return jsonify(data=slurm_nodes_status())
+    refresh = request.args.get("refresh", None) == "1"
+    data, age = collector.snapshot("nodes", refresh=refresh)
+    return jsonify(data=data, age=age)
 
 
 @bp.route("/admin/sys/info", methods=["POST"])
 @login_required
 @grant_access("admin")
 def web_admin_sys_info():
-    servers = current_app.config["ADMIN_SERVER"]
-    if not isinstance(servers, list):
-        servers = servers.split(",")
-    uptime = []
-    for server in servers:
-        uptime.append(get_server_info(server.strip()))
-    return jsonify(data=uptime)
+    refresh = request.args.get("refresh", None) == "1"
+    data, age = collector.snapshot("system", refresh=refresh)
+    return jsonify(data=data, age=age)
+
+
+@bp.route("/admin/quota/top", methods=["GET", "POST"])
+@login_required
+@grant_access("admin")
+def web_admin_quota_top():
+    try:
+        limit = int(request.args.get("limit", current_app.config.get(
+            "QUOTA_TOP", 20)))
+    except ValueError:
+        raise ValueError("Limit should be an integer")
+    refresh = request.args.get("refresh", None) == "1"
+    data, age = quota_top(limit, refresh=refresh)
+    return jsonify(data=data, age=age)
 
 
 @bp.route("/admin/space/info", methods=["POST"])
 @login_required
 @grant_access("admin")
 def web_admin_space_info():
-    return jsonify(data=space_info())
+    refresh = request.args.get("refresh", None) == "1"
+    data, age = collector.snapshot("space", refresh=refresh)
+    return jsonify(data=data, age=age)
 
 
 @bp.route("/users/<login>", methods=["GET", "POST"])
@@ -575,7 +649,21 @@ def web_registry():
 @login_required
 @grant_access("admin")
 def web_log():
-    return render_template("log.html", data=event_log())
+    return render_template("log.html")
+
+
+@bp.route("/log/page", methods=["GET", "POST"])
+@login_required
+@grant_access("admin")
+def web_log_page():
+    """
+    One page of the event log. Arguments are: cursor - value of next field
+    returned with the previous page, limit, category, entity, author, start
+    and end
+    :return: JSON. List of records and cursor of the next page
+    """
+    records, cursor = event_log(request.args)
+    return jsonify(data=records, next=cursor)
 
 
 @bp.route("/config", methods=["GET", "POST"])
@@ -593,7 +681,7 @@ def web_cfg():
 @login_required
 @grant_access("admin", "manager")
 def web_task():
-    return render_template("task.html", data=task_history())
+    return render_template("task.html")
 
 
 @bp.route("/admin", methods=["GET", "POST"])
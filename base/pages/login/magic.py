@@ -2,6 +2,10 @@ from paramiko import SSHClient, AutoAddPolicy, AuthenticationException
 from logging import warning, debug, error
 from flask import current_app
 from re import search
+from threading import Event
+from time import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from base.extensions import cache
 
 
 __author__ = "Matvey Sapunov"
@@ -37,9 +41,21 @@ def password_errors(password):
 
 
 def ssh_login(login, password):
-    auth = False
+    """
+    Verify the password by SSH authentication on the hosts of LOGIN_SERVER
+    option. Hosts are tried concurrently, the first successful authentication
+    wins and the connections to other hosts are closed. Each attempt is
+    limited by LOGIN_TIMEOUT seconds, 10 by default. After LOGIN_FAILURES
+    failed verifications, 5 by default, further attempts for the same login
+    are refused without contacting the hosts until LOGIN_THROTTLE seconds,
+    300 by default, have passed since the first failure
+    :param login: String. Login of the user
+    :param password: String. Password of the user
+    :return: Boolean. True if the password is accepted by any host
+    """
     login_servers = current_app.config.get("LOGIN_SERVER", None)
     port = current_app.config.get("SSH_PORT", 22)
+    timeout = current_app.config.get("LOGIN_TIMEOUT", 10)
     if not login_servers:
         error("Configuration has no LOGIN_SERVER option set")
         return False
@@ -47,24 +63,79 @@ def ssh_login(login, password):
         warning("Option LOGIN_SERVER has to be a list")
         debug("Converting string to list with comma as separator")
         login_servers = login_servers.split(",")
+    login_servers = [x.strip() for x in login_servers if x.strip()]
     debug("Resulting server list: %s" % login_servers)
-    for host in login_servers:
-        host = host.strip()
+    if not login_servers:
+        error("Configuration has no LOGIN_SERVER option set")
+        return False
+    if login_throttled(login):
+        warning("Too many failed logins for %s, SSH verification skipped" %
+                login)
+        return False
+
+    clients = []
+    done = Event()
+
+    def attempt(host):
         debug("Trying the host: %s" % host)
         client = SSHClient()
+        clients.append(client)
         try:
             client.set_missing_host_key_policy(AutoAddPolicy())
             client.connect(host, username=login, password=password, port=port,
-                           allow_agent=False, look_for_keys=False)
-            if client.get_transport().is_authenticated():
-                auth = True
+                           allow_agent=False, look_for_keys=False,
+                           timeout=timeout, banner_timeout=timeout,
+                           auth_timeout=timeout)
+            return client.get_transport().is_authenticated()
         except AuthenticationException:
             warning("Wrong password to server %s" % host)
-            continue
         except Exception as err:
-            error("Exception connecting to %s: %s" % (host, err))
-            continue
+            if done.is_set():
+                debug("Attempt on %s cancelled: %s" % (host, err))
+            else:
+                error("Exception connecting to %s: %s" % (host, err))
         finally:
             client.close()
+        return False
+
+    auth = False
+    pool = ThreadPoolExecutor(max_workers=len(login_servers))
+    futures = [pool.submit(attempt, x) for x in login_servers]
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            if future.result():
+                auth = True
+                break
+    except TimeoutError:
+        error("No answer from login servers in %ss" % timeout)
+    finally:
+        done.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        for client in list(clients):
+            client.close()
     debug("Authenticated: %s" % auth)
+    login_failure(login, auth)
     return auth
+
+
+def login_throttled(login):
+    failures = cache.get("login_failures_%s" % login)
+    limit = current_app.config.get("LOGIN_FAILURES", 5)
+    return bool(failures and failures[0] >= limit)
+
+
+def login_failure(login, auth):
+    """
+    Count failed verifications of the login. The counter is reset by a
+    successful verification and expires LOGIN_THROTTLE seconds after the
+    first failure
+    :param login: String. Login of the user
+    :param auth: Boolean. Result of the verification
+    """
+    key = "login_failures_%s" % login
+    if auth:
+        cache.delete(key)
+        return
+    window = current_app.config.get("LOGIN_THROTTLE", 300)
+    count, expire = cache.get(key) or (0, time() + window)
+    cache.set(key, (count + 1, expire), timeout=max(1, int(expire - time())))
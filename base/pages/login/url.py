@@ -1,10 +1,12 @@
 from flask import render_template, request, redirect, url_for, g, flash, abort, jsonify
 from flask_login import current_user, login_user, logout_user, login_required
 from base.pages.login.magic import ssh_login, password_errors
+from base.pages.user.magic import dashboard_prefetch
 from base.pages.login.form import LoginForm, ResetForm, MessageForm
 from base.pages.login import bp
 from base64 import b64decode
 from base.database.schema import User
+from sqlalchemy.orm import joinedload
 from base.extensions import login_manager
 from base.classes import Mail
 
@@ -22,7 +24,11 @@ login_manager.session_protection = "strong"
 
 @login_manager.user_loader
 def load_user(uid):
-    return User.query.filter_by(id=uid).first()
+    """
+    The user is loaded with ACL in a single query, as it is needed by every
+    request. Projects are loaded by the views which use them
+    """
+    return User.query.options(joinedload(User.acl)).filter_by(id=uid).first()
 
 
 @bp.route("/api/<path:urlpath>", methods=["POST"])
@@ -50,6 +56,8 @@ def load_user_from_request(urlpath):
             urlpath = "%s/%s" % (request.environ["SCRIPT_NAME"], urlpath)
         else:
             urlpath = "/%s" % urlpath
+        if request.query_string:
+            urlpath = "%s?%s" % (urlpath, request.query_string.decode())
         return redirect(urlpath, code=307)
     flash("API key is required")
     return redirect(url_for("login.login"))
@@ -120,6 +128,7 @@ def login():
         flash("Invalid password")
         return redirect(url_for("login.login"))
     login_user(user, True)
+    dashboard_prefetch(user)
     g.name = username
     if user.first_login:
         return redirect(url_for("login.reset"))
@@ -4,14 +4,16 @@ from pathlib import Path, PurePath
 
 from flask import current_app, render_template, g, request
 from flask_login import current_user
+from sqlalchemy.orm import joinedload, selectinload
 from owncloud import Client as OwnClient
 from pdfkit import from_string
 
 from base import db
 from base.classes import TmpUser, ProjectLog, Task
 from base.functions import ssh_wrapper, calculate_ttl
-from base.database.schema import Extend, File, Project, Tasks, User
+from base.database.schema import Extend, File, Project, Resources, Tasks, User
 from base.pages import generate_login, TaskQueue
+from base.bootstrap import bootstrap
 from base.pages.user.magic import user_by_id
 from base.pages.board.magic import create_resource
 from base.utils import save_file, get_tmpdir, form_error_string
@@ -150,7 +152,7 @@ def project_attach_user(name, form):
         task = TaskQueue().project(project).user_assign(user).task
     else:
         task = TaskQueue().project(project).user_activate(user).task
-    if "admin" in current_user.permissions():
+    if "admin" in g.permissions:
         Task(task).accept()
     if user.active:
         return ProjectLog(project).user_assign(task)
@@ -179,7 +181,7 @@ def project_create_user(name, form):
     user.surname = surname
     user.email = email
     task = TaskQueue().project(project).user_create(user).task
-    if current_user.login and "admin" in current_user.permissions():
+    if current_user.login and "admin" in g.permissions:
         Task(task).accept()
     return ProjectLog(project).user_create(task)
 
@@ -246,14 +248,14 @@ def assign_responsible(name, form):
     uid = form.login.data
     send = form.send.data
     user = user_by_id(uid)
-    if "admin" in current_user.permissions():
+    if "admin" in g.permissions:
         project = get_project_by_name(name)
     else:
         project = check_responsible(name)
     if user == project.responsible:
         raise ValueError("User %s is already responsible for the project %s" %
                          (user.full_name(), project.get_name()))
-    if "admin" in current_user.permissions():
+    if "admin" in g.permissions:
         task = TaskQueue().project(project).responsible_assign(user).task
         Task(task).accept()
         return ProjectLog(project).send_message(send).responsible_assign(task)
@@ -470,13 +472,44 @@ def get_future_users(projects):
     return projects
 
 
+def projects_eager(query=None):
+    """
+    Add loading of all relationships used by Project.to_dict() and
+    Project.pretty_dict() to the query, so the number of SQL queries doesn't
+    depend on number of projects
+    :param query: Query object. Query of Project records. Default all projects
+    :return: Query object
+    """
+    if query is None:
+        query = Project.query
+    return query.options(
+        joinedload(Project.responsible),
+        joinedload(Project.approve),
+        joinedload(Project.ref),
+        joinedload(Project.resources).joinedload(Resources.approve),
+        joinedload(Project.resources).joinedload(Resources.file),
+        selectinload(Project.users),
+        selectinload(Project.files),
+        selectinload(Project.articles)
+    )
+
+
+def projects_to_dict(query=None):
+    """
+    Serialize projects by to_dict() method. All relationships used by to_dict()
+    are loaded in bulk
+    :param query: Query object. Query of Project records. Default all projects
+    :return: List. List of dictionaries returned by Project.to_dict()
+    """
+    projects = projects_eager(query).all()
+    return list(map(lambda x: x.to_dict(), projects))
+
+
 def get_project_by_name(name):
-    projects = Project.query.all()
-    for project in projects:
-        if project.get_name() != name:
-            continue
-        return project
-    raise ValueError("Failed to find a project with name '%s'" % name)
+    project = Project.query.filter_by(name=name).first()
+    if not project:
+        raise ValueError("Failed to find a project with name '%s'" % name)
+    return project
 
 
 def get_project_record(pid):
@@ -584,8 +617,7 @@ def is_activity_report(project):
 
 
 def list_of_projects():
-    projects = map(lambda x: x.get_name(), Project.query.all())
-    return sorted(list(projects))
+    return bootstrap.project_names()
 
 
 def set_state(pid, state):
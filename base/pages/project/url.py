@@ -1,7 +1,7 @@
-from flask import render_template, request, jsonify, flash, url_for
+from flask import render_template, request, jsonify, flash, url_for, g
 from flask_login import login_required, current_user
-from base.classes import ProjectLog
-from base.database.schema import LogDB, Project
+from base.classes import ProjectLog, LogQuery
+from base.database.schema import Project
 from base.pages import (
     TaskQueue,
     grant_access)
@@ -36,6 +36,7 @@ from base.pages.project.magic import (
     get_project_record,
     project_extend,
     project_renew,
+    projects_to_dict,
     get_future_users)
 from logging import debug
 
@@ -94,10 +95,10 @@ def project_activity(project_name):
 @login_required
 @grant_access("admin", "responsible", "tech")
 def project_info(name=None):
-    projects = Project.query.all()
+    query = Project.query
     if name:
-        projects = [project for project in projects if project.name == name]
-    return jsonify(data=list(map(lambda x: x.to_dict(), projects)))
+        query = query.filter_by(name=name)
+    return jsonify(data=projects_to_dict(query))
 
 
 @bp.route("/project/<string:project_name>/add/user", methods=["POST"])
@@ -186,9 +187,17 @@ def web_project_extend(project_name):
 @login_required
 @grant_access("admin", "responsible")
 def web_project_history(project_name):
+    """
+    Latest events of the project. Older events are available with the cursor
+    returned in next field, see LogQuery for the list of arguments
+    :param project_name: String. Name of the project
+    :return: JSON
+    """
     project = get_project_by_name(project_name)
-    recs = LogDB().query.filter_by(project_id=project.id).all()
-    return jsonify(data=list(map(lambda x: x.to_dict(), recs)))
+    limit = LogQuery.limit(request.args.get("limit", None))
+    recs, cursor = LogQuery(project=project).filter(request.args).page(
+        request.args.get("cursor", None), limit)
+    return jsonify(data=list(map(lambda x: x.to_dict(), recs)), next=cursor)
 
 
 @bp.route("/project/modal/assign/responsible/<int:pid>", methods=["POST"])
@@ -196,7 +205,7 @@ def web_project_history(project_name):
 @grant_access("admin", "responsible")
 def web_modal_responsible(pid):
     project = get_project_record(pid)
-    if "admin" in current_user.permissions():
+    if "admin" in g.permissions:
         form = new_responsible(project, True)
     else:
         form = new_responsible(project, False)
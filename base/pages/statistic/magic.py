@@ -1,13 +1,24 @@
+import csv
+import pyexcel
 from logging import debug
-import flask_excel as excel
-from flask import current_app, render_template, url_for
+from io import StringIO
+from tempfile import TemporaryFile
+from datetime import timedelta
+from flask import (current_app, render_template, url_for, Response, send_file,
+                   stream_with_context)
 from base import db
-from base.database.schema import Project
+from base.database.schema import Project, User
+from base.pages.project.magic import projects_eager
+from base.pages.admin.magic import (
+    accounting_date,
+    rollup_granularity,
+    rollup_series)
 
 
 def render_project(name):
     project = Project.query.filter_by(name=name).first()
-    acc_url = url_for("admin.web_admin_accounting_project", name=name)
+    acc_url = url_for("admin.web_admin_accounting_project", name=name,
+                      format="compact")
     user_url = url_for("admin.web_login_registry", login="")
     history_url = url_for("project.web_project_history", project_name=project.name)
     history = render_template("modals/common_show_history.html", rec=project,
@@ -21,32 +32,81 @@ def dump_projects_database(extension_type, request):
     """
     Select all available projects in the database excluding the projects
     without responsible or registration reference and return the data in a
-    file formatted according to extension_type parameter
+    file formatted according to extension_type parameter. Projects are read
+    from the database in chunks of EXPORT_CHUNK records, 500 by default. CSV
+    is streamed to the client row by row, spreadsheets are written to a
+    temporary file which is removed once the response is closed
     :param extension_type: String. File format to store the data. Could be
     one of following: csv, ods, xls, xlsx
     :return: HTTP response
     """
     if extension_type not in ["csv", "ods", "xls", "xlsx"]:
         raise ValueError("Unsupported format: %s" % extension_type)
+    query = Project.query.filter(Project.responsible_id.isnot(None),
+                                 Project.ref_id.isnot(None))
     select = request.args.get("projects", None)
-    if not select:
-        dirty_projects = Project.query.all()
-    else:
-        names = select.split(",")
-        dirty_projects = Project.query.filter(Project.name.in_(names)).all()
-    projects = []
-    for project in dirty_projects:
-        if not project.responsible:
-            continue
-        if not project.ref:
-            continue
-        projects.append(project)
-    output = sorted(list(map(lambda x: x.pretty_dict(), projects)),
-                    key=lambda x: x["id"])
-    excel.init_excel(current_app)
+    if select:
+        query = query.filter(Project.name.in_(select.split(",")))
+    chunk = current_app.config.get("EXPORT_CHUNK", 500)
+    query = projects_eager(query).order_by(Project.id).yield_per(chunk)
     filename = "projects." + extension_type
-    return excel.make_response_from_records(output, file_type=extension_type,
-                                            file_name=filename)
+    rows = export_rows(map(lambda x: x.pretty_dict(), query))
+    if extension_type == "csv":
+        response = Response(stream_with_context(export_csv(rows)),
+                            mimetype="text/csv")
+        response.headers["Content-Disposition"] = (
+            "attachment; filename=%s" % filename)
+        return response
+    tmp = TemporaryFile()
+    try:
+        pyexcel.isave_as(array=rows, dest_file_type=extension_type,
+                         dest_file_stream=tmp)
+    except Exception:
+        tmp.close()
+        raise
+    finally:
+        pyexcel.free_resources()
+    tmp.seek(0)
+    return send_file(tmp, as_attachment=True, download_name=filename)
+
+
+def export_rows(records):
+    """
+    Convert dictionaries to the rows of a table. The first row is the header
+    made of sorted keys of the first record. None becomes an empty string and
+    lists are converted to strings
+    :param records: Iterable. Dictionaries with the same keys
+    :return: Generator of lists
+    """
+    header = None
+    for record in records:
+        if header is None:
+            header = sorted(record.keys())
+            yield header
+        row = []
+        for key in header:
+            value = record.get(key, None)
+            if value is None:
+                value = ""
+            elif isinstance(value, list):
+                value = str(value)
+            row.append(value)
+        yield row
+
+
+def export_csv(rows):
+    """
+    Format rows as CSV text one line at a time
+    :param rows: Iterable. Lists of values
+    :return: Generator of strings
+    """
+    line = StringIO()
+    writer = csv.writer(line)
+    for row in rows:
+        writer.writerow(row)
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate(0)
 
 
 def project_types():
@@ -62,3 +122,37 @@ def project_types():
         types.append(tmp)
     debug("Got project types: %s" % types)
     return types
+
+
+def consumption_series(args):
+    """
+    Consumption series out of rollup tables. Parameters are: granularity - one
+    of day, week, month or auto (default), start and end - dates in format
+    YYYY-MM-DD, by default last year till yesterday, project - name of the
+    project and user - login of the user. Without user the total consumption
+    is returned
+    :param args: Dictionary. Request arguments
+    :return: Dictionary with granularity, list of dates and list of values
+    """
+    end = accounting_date(args.get("end", None))
+    start = args.get("start", None)
+    start = accounting_date(start) if start else end - timedelta(days=365)
+    if start > end:
+        raise ValueError("Start date %s is after end date %s" % (
+            start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")))
+    project = args.get("project", None)
+    if project:
+        project = Project.query.filter_by(name=project).first()
+        if not project:
+            raise ValueError("Project %s not found" % args.get("project"))
+    user = args.get("user", None)
+    if user:
+        user = User.query.filter_by(login=user).first()
+        if not user:
+            raise ValueError("User %s not found" % args.get("user"))
+    granularity = args.get("granularity", "auto")
+    if granularity == "auto":
+        granularity = rollup_granularity(start, end)
+    dates, values = rollup_series(granularity, start, end, project=project,
+                                  user=user)
+    return {"granularity": granularity, "dates": dates, "values": values}
@@ -4,9 +4,10 @@ from base.pages import grant_access
 from base.pages.user import bp
 from base.pages.statistic.magic import (
     render_project,
+    consumption_series,
     dump_projects_database,
     project_types)
-from base.pages.project.magic import set_state
+from base.pages.project.magic import set_state, projects_to_dict
 from base.database.schema import Project, Accounting
 
 
@@ -32,6 +33,18 @@ def project_info(name=None):
     return jsonify(data=data)
 
 
+@bp.route("/statistic/consumption", methods=["GET", "POST"])
+@login_required
+@grant_access("admin", "tech")
+def web_statistic_consumption():
+    """
+    Consumption aggregated by day, week or month. See consumption_series for
+    the list of accepted parameters
+    :return: JSON
+    """
+    return jsonify(data=consumption_series(request.args))
+
+
 @bp.route("/projects.csv", methods=["GET"])
 @login_required
 @grant_access("admin")
@@ -81,7 +94,7 @@ def web_statistic_all():
 @login_required
 @grant_access("admin")
 def web_statistic_list():
-    return jsonify(data=list(map(lambda x: x.to_dict(), Project.query.all())))
+    return jsonify(data=projects_to_dict())
 
 
 @bp.route("/statistic/expand/<string:name>", methods=["POST"])
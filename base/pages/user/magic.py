@@ -1,11 +1,16 @@
+from flask import current_app, g
 from flask_login import current_user
+from base.extensions import cache
+from base.collector import collector
 from base.utils import form_error_string
-from base.functions import bytes2human, ssh_wrapper, ssh_public
+from base.functions import bytes2human, ssh_stream
+from base.sshkey import key_fingerprints
+from base.parsers import parse_jobs
 from base.pages import TaskQueue
 from base.database.schema import User
 from base.classes import UserLog, Task
-from tempfile import mkstemp
-from os import path, remove
+from threading import Thread
+from datetime import datetime as dt, timezone
 from logging import debug, error
 
 
@@ -25,16 +30,9 @@ def sanitize_key(key):
 
 
 def ssh_check(key_text):
-    fd, key_path = mkstemp(text=True)
-    with open(key_path, "w") as writer:
-        writer.write(key_text)
-    stdout, stderr = ssh_public(key_path)
-    if path.exists(key_path):
-        remove(key_path)
-    debug(stdout)
-    if stderr:
-        return False
-    return True
+    fingerprints = key_fingerprints(key_text)
+    debug(fingerprints)
+    return bool(fingerprints)
 
 
 def ssh_key(form):
@@ -49,7 +47,7 @@ def ssh_key(form):
         Task(task).accept()
         UserLog(current_user).key_upload(k)
         return "You will be notified when your public key is installed"
-    raise ValueError("Provided public key failed to pass ssh-keygen check. " 
+    raise ValueError("Provided public key failed validation. "
                      "Please make sure that you've inserted the content of "
                      "the public key file which should looks like this key "
                      "for example: \n521 SHA256:dm7lPKaRcwGfa66ZFQ3LSD70BSPOyX1"
@@ -78,48 +76,162 @@ def get_user_record(login=None):
     return user
 
 
-def get_scratch():
-    cmd = "beegfs-ctl --getquota --csv --uid %s" % current_user.login
-    result, err = ssh_wrapper(cmd)
-    if not result:
+def get_scratch(login=None):
+    """
+    Scratch space usage of the user taken from the latest quota snapshot
+    :param login: String. Login of the user, current user by default
+    :return: Dictionary
+    """
+    if not login:
+        login = current_user.login
+    quota, age = collector.snapshot("quota")
+    if login not in quota:
         raise ValueError("No scratch space info found")
+    return scratch_info(login, quota[login])
 
-    info = list(filter(lambda x: current_user.login in x, result))
-    if not info:
-        raise ValueError("Error parsing scratch space info")
-    name, uid, used, total, files, hard = info[0].split(",")
+
+def scratch_info(login, record):
+    """
+    Human readable scratch space usage
+    :param login: String. Login of the user
+    :param record: Tuple. Uid, used bytes, size limit, files and files limit
+    :return: Dictionary
+    """
+    uid, used, total, files, hard = record
     usage = "{0:.1%}".format(float(used) / float(total))
     free = float(total) - float(used)
-    return {"usage": usage, "total": total, "used": used, "free": free,
-            "used_label": bytes2human(used), "free_label": bytes2human(free)}
+    return {"login": login, "usage": usage, "total": total, "used": used,
+            "free": free, "files": files, "used_label": bytes2human(used),
+            "free_label": bytes2human(free)}
+
 
+def scratch_quota():
+    """
+    Scratch quota of all users collected with a single beegfs-ctl call
+    :return: Dictionary. Login: tuple of uid, used bytes, size limit, files
+    and files limit
+    """
+    output = ssh_stream("beegfs-ctl --getquota --csv --uid --all")
+    quota = dict(scratch_parse(output))
+    if not quota:
+        raise ValueError("No scratch space info found: %s" % output.errors)
+    return quota
 
-def get_jobs(start, end, last=10):
+
+def scratch_parse(lines):
+    """
+    Parse CSV output of beegfs-ctl --getquota skipping the header and lines
+    which are not quota records, i.e. lines with values which are not integer
+    numbers like "-" or numbers with unit suffix
+    :param lines: Iterable. Lines of the output
+    :return: Generator of tuples. Login and quota record, the record is a
+    tuple of integers: uid, used bytes, size limit, files and files limit
+    """
+    for line in lines:
+        fields = line.strip().split(",")
+        if len(fields) != 6:
+            continue
+        try:
+            record = tuple(int(x) for x in fields[1:])
+        except ValueError:
+            debug("Not a quota record: %s" % line.strip())
+            continue
+        yield fields[0], record
+
+
+def get_jobs(start, end, last=10, login=None):
+    if not login:
+        login = current_user.login
     cmd = ["sacct", "-nPX",
            "--format=JobID,State,Start,Account,JobName,CPUTime,Partition",
-           "--start=%s" % start, "--end=%s" % end, "-u", current_user.login,
+           "--start=%s" % start, "--end=%s" % end, "-u", login,
            "|", "sort", "-n", "-r", "|", "head", "-%s" % last]
     run = " ".join(cmd)
 
-    result, err = ssh_wrapper(run)
-
-    if not result:
+    jobs = [x.to_dict() for x in parse_jobs(ssh_stream(run))]
+    if not jobs:
         raise ValueError("No jobs found from %s to %s" % (start, end))
-    jobs = []
-    for job in result:
-        tmp = {}
-        job = job.strip().split("|")
-        tmp["id"] = job[0]
-        tmp["project"] = job[3]
-        tmp["state"] = job[1]
-        tmp["partition"] = job[6]
-        tmp["date"] = job[2]
-        tmp["name"] = job[4]
-        tmp["duration"] = job[5]
-        jobs.append(tmp)
     return jobs
 
 
+def user_jobs(user):
+    """
+    Last jobs of the user since the earliest allocation of resources among
+    the projects of the user
+    :param user: Object. User object
+    :return: List of dictionaries
+    """
+    start = dt.now(timezone.utc)
+    for project in user.project:
+        if project.resources.created < start:
+            start = project.resources.created
+    begin = start.strftime("%m/%d/%y-%H:%M")
+    finish = dt.now().strftime("%m/%d/%y-%H:%M")
+    return get_jobs(begin, finish, login=user.login)
+
+
+DASHBOARD = {"jobs": user_jobs,
+             "scratch": lambda user: get_scratch(user.login)}
+
+
+def dashboard_cached(name, user):
+    """
+    Cached dashboard data of the user without running remote commands
+    :param name: String. Either jobs or scratch
+    :param user: Object. User object
+    :return: Dictionary with data and error keys or None if nothing is cached
+    """
+    return cache.get("dashboard_%s_%s" % (name, user.login))
+
+
+def dashboard_data(name, user, refresh=False):
+    """
+    Dashboard data of the user. The data is taken from the cache and it is
+    fetched from the cluster only if the cache is empty or refresh is
+    requested. Errors are cached as well, so a user without jobs does not
+    trigger sacct on every visit. Records expire after USER_CACHE_TTL seconds,
+    120 by default
+    :param name: String. Either jobs or scratch
+    :param user: Object. User object
+    :param refresh: Boolean. Fetch the data from the cluster
+    :return: Dictionary with data and error keys
+    """
+    if name not in DASHBOARD:
+        raise ValueError("Unknown dashboard data: %s" % name)
+    record = None if refresh else dashboard_cached(name, user)
+    if record is not None:
+        return record
+    try:
+        record = {"data": DASHBOARD[name](user), "error": None}
+    except ValueError as err:
+        record = {"data": None, "error": str(err)}
+    cache.set("dashboard_%s_%s" % (name, user.login), record,
+              timeout=current_app.config.get("USER_CACHE_TTL", 120))
+    return record
+
+
+def dashboard_prefetch(user):
+    """
+    Fill the dashboard cache of the user in a background thread, so the data
+    is ready when the user lands on the dashboard after login
+    :param user: Object. User object
+    """
+    app = current_app._get_current_object()
+    login = user.login
+
+    def prefetch():
+        with app.app_context():
+            record = User.query.filter_by(login=login).first()
+            for name in DASHBOARD.keys():
+                try:
+                    dashboard_data(name, record, refresh=True)
+                except Exception as err:
+                    error("Failed to prefetch %s of %s: %s" % (name, login,
+                                                                err))
+
+    Thread(target=prefetch, daemon=True).start()
+
+
 def user_edit(login, form):
     if not form.validate_on_submit():
         raise ValueError(form_error_string(form.errors))
@@ -140,7 +252,7 @@ def user_edit(login, form):
     if not c_dict:
         raise ValueError("No changes in submitted user information found")
     task = TaskQueue().user(user).user_update(c_dict).task
-    if "admin" in current_user.permissions():
+    if "admin" in g.permissions:
         Task(task).accept()
         user_log = UserLog(user)
         user_log.senf = False
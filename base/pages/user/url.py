@@ -1,13 +1,13 @@
 from flask import render_template, request, jsonify, flash
 from flask_login import login_required, current_user
-from base.database.schema import User
+from base.database.schema import User, Project
 from base.pages.user import bp
-from base.pages.user.magic import get_user_record, get_jobs
-from base.pages.user.magic import get_scratch, user_edit, ssh_key
+from base.pages.user.magic import get_user_record, dashboard_cached
+from base.pages.user.magic import dashboard_data, user_edit, ssh_key
 from base.pages.user.form import edit_info, InfoForm, KeyForm
 from base.utils import form_error_string
-from datetime import datetime as dt, timezone
 from operator import attrgetter
+from sqlalchemy.orm import joinedload
 import logging as log
 
 
@@ -81,32 +81,36 @@ def web_user_edit(login):
     return jsonify(message=user_edit(login, form))
 
 
+@bp.route("/user/jobs", methods=["POST"])
+@login_required
+def web_user_jobs():
+    refresh = request.args.get("refresh", None) == "1"
+    record = dashboard_data("jobs", current_user, refresh=refresh)
+    html = render_template("bits/user_jobs.html", jobs=record["data"])
+    return jsonify(data=record["data"], message=record["error"], html=html)
+
+
+@bp.route("/user/scratch", methods=["POST"])
+@login_required
+def web_user_scratch():
+    refresh = request.args.get("refresh", None) == "1"
+    record = dashboard_data("scratch", current_user, refresh=refresh)
+    html = render_template("bits/user_scratch.html", scratch=record["data"])
+    return jsonify(data=record["data"], message=record["error"], html=html)
+
+
 @bp.route("/", methods=["GET"])
 @bp.route("/index", methods=["GET"])
 @bp.route("/user.html", methods=["GET"])
 @login_required
 def user_index():
-    if not current_user.project:
-        current_user.project = []
+    projects = Project.query.with_parent(current_user, User.project).options(
+        joinedload(Project.resources)).all()
+    if not projects:
         flash("No projects found for user '%s'" % current_user.full())
-    start = dt.now(timezone.utc)
-    for project in current_user.project:
-        if project.resources.created < start:
-            start = project.resources.created
-    begin = start.strftime("%m/%d/%y-%H:%M")
-    finish = dt.now().strftime("%m/%d/%y-%H:%M")
-    try:
-        jobs = get_jobs(begin, finish)
-    except ValueError as err:
-        jobs = None
-        flash(str(err))
-    try:
-        scratch = get_scratch()
-    except ValueError as err:
-        scratch = None
-        flash(str(err))
-
-    for project in current_user.project:
+    jobs = dashboard_cached("jobs", current_user) or {"data": None}
+    scratch = dashboard_cached("scratch", current_user) or {"data": None}
+    for project in projects:
         every = project.account_by_user()
         if current_user.login in every:
             project.private = every[current_user.login]
@@ -116,6 +120,6 @@ def user_index():
             float(project.private) / float(project.resources.cpu))
 
     return render_template("user.html", data={"user": current_user,
-                                              "jobs": jobs,
-                                              "scratch": scratch,
-                                              "projects": current_user.project})
+                                              "jobs": jobs["data"],
+                                              "scratch": scratch["data"],
+                                              "projects": projects})
@@ -0,0 +1,159 @@
+"""
+Parsers of the output of remote commands. Every parser accepts any iterable
+of lines, a list as well as RemoteStream, and yields records one by one, so
+the output can be processed while the command is still running
+"""
+from datetime import datetime as dt
+from logging import error, debug
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+class Record:
+    """
+    Compact record of a parsed line. Fields are listed in __slots__ of
+    subclasses
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, ", ".join(
+            "%s=%r" % (x, getattr(self, x)) for x in self.__slots__))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def values(self):
+        return tuple(getattr(self, x) for x in self.__slots__)
+
+    def to_dict(self):
+        return dict(zip(self.__slots__, self.values()))
+
+
+class Job(Record):
+    __slots__ = ("id", "state", "date", "project", "name", "duration",
+                 "partition")
+
+
+class NodeState(Record):
+    __slots__ = ("reason", "date", "node", "status")
+
+    def to_dict(self):
+        return {
+            "date": self.date.strftime("%Y-%m-%d %X %Z") if self.date
+            else "Unknown",
+            "date_full": self.date.strftime("%c") if self.date else "Unknown",
+            "reason": self.reason,
+            "status": self.status,
+            "node": self.node}
+
+
+class Partition(Record):
+    __slots__ = ("name", "allocated", "idle", "other", "total")
+
+
+class Filesystem(Record):
+    __slots__ = ("filesystem", "size", "used", "available", "use",
+                 "mountpoint")
+
+
+class Consumption(Record):
+    __slots__ = ("project", "login", "cpu")
+
+
+def parse_jobs(lines):
+    """
+    Parse output of sacct -nP with the following format:
+    JobID,State,Start,Account,JobName,CPUTime,Partition
+    :param lines: Iterable. Lines of the output
+    :return: Generator of Job records
+    """
+    for line in lines:
+        job = line.strip().split("|")
+        if len(job) < 7:
+            continue
+        yield Job(job[0], job[1], job[2], job[3], job[4], job[5], job[6])
+
+
+def parse_nodes(lines):
+    """
+    Parse output of sinfo -R --format='%100E|%19H|%30N|%t' like:
+    Not responding |2020-07-25T22:39:23|skylake106|down*
+    :param lines: Iterable. Lines of the output
+    :return: Generator of NodeState records
+    """
+    for line in lines:
+        if "REASON" in line:
+            debug("Skipping headline: %s" % line)
+            continue
+        info = line.split("|")
+        if len(info) != 4:
+            error("Wrong format: %s" % line)
+            continue
+        try:
+            date = dt.strptime(info[1].strip(), "%Y-%m-%dT%H:%M:%S")
+        except ValueError as err:
+            error("Error parsing date '%s': %s" % (info[1].strip(), err))
+            date = None
+        yield NodeState(info[0].strip(), date, info[2].strip(),
+                        info[3].strip())
+
+
+def parse_partitions(lines):
+    """
+    Parse output of sinfo -s
+    :param lines: Iterable. Lines of the output
+    :return: Generator of Partition records
+    """
+    for line in lines:
+        if "PARTITION" in line:
+            continue
+        name, avail, time, nodes, nodelist = line.split()
+        allocated, idle, other, total = nodes.strip().split("/")
+        yield Partition(name.strip(), allocated, idle, other, int(total))
+
+
+def parse_space(lines):
+    """
+    Parse output of df -h
+    :param lines: Iterable. Lines of the output
+    :return: Generator of Filesystem records
+    """
+    for line in lines:
+        if "Filesystem" in line:
+            continue
+        fields = line.split()
+        if len(fields) != 6:
+            continue
+        yield Filesystem(*[x.strip() for x in fields])
+
+
+def parse_sreport(lines):
+    """
+    Parse the output of sreport command with the consumption of projects
+    "project||cpu" and the consumption of users "project|login|cpu"
+    :param lines: Iterable. Lines of the output
+    :return: Generator of Consumption records, login is None for the total
+    consumption of a project
+    """
+    for line in lines:
+        if "|" not in line:
+            continue
+        debug("Parsing line: %s" % line)
+        if "||" not in line:
+            items = line.strip().split("|")
+        else:
+            items = line.strip().split("||")
+        login = items[1].strip() if len(items) == 3 else None
+        try:
+            cpu = int(items[-1].strip())
+        except ValueError as err:
+            error("Exception converting '%s' to int: %s" % (items[-1], err))
+            continue
+        yield Consumption(items[0].strip(), login, cpu)
@@ -0,0 +1,442 @@
+from paramiko import (SSHClient, AutoAddPolicy, AuthenticationException,
+                      BadHostKeyException, RSAKey, SSHException)
+from flask import current_app as app
+from threading import Condition, Lock, Thread
+from concurrent.futures import ThreadPoolExecutor, wait
+from logging import error, debug
+from os import getpid, stat
+from socket import IPPROTO_TCP, TCP_NODELAY
+from time import monotonic
+import asyncio
+import atexit
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+class SSHPool:
+    """
+    Pool of authenticated SSH connections. Connections are kept open between
+    commands and every command is executed in a new channel of a connection,
+    so the cost of a command is the cost of opening a channel instead of the
+    full SSH handshake.
+
+    Pool options are taken from the configuration of the current application:
+    SSH_POOL_SIZE - maximum number of connections per host, 4 by default
+    SSH_POOL_IDLE - seconds after which unused connection is closed, 300 by
+    default
+    SSH_KEEPALIVE - interval of keepalive packets in seconds, 30 by default
+    """
+
+    def __init__(self):
+        self.lock = Condition()
+        self.pid = getpid()
+        self.idle = {}
+        self.busy = {}
+        self.keys = {}
+
+    def execute(self, cmd, host=None):
+        """
+        Execute the command on the remote host and wait for the complete
+        output
+        :param cmd: String. Command to execute
+        :param host: String. Remote host, SSH_SERVER by default
+        :return: Tuple. Lists of output and error lines
+        """
+        target = self.target(host)
+        timeout = app.config.get("SSH_TIMEOUT", 60)
+        client, channel = self.channel(target, timeout)
+        if not client:
+            return [], []
+        try:
+            output, errors = self.run(channel, cmd, timeout)
+        except (SSHException, EOFError, OSError) as e:
+            error("Failed to execute command on %s: %s" % (target[0], e))
+            self.release(target, client, broken=True)
+            return [], []
+        self.release(target, client)
+        debug("Out: %s" % output)
+        debug("Err: %s" % errors)
+        return output, errors
+
+    def stream(self, cmd, host=None):
+        """
+        Execute the command on the remote host and read the output line by
+        line as it arrives
+        :param cmd: String. Command to execute
+        :param host: String. Remote host, SSH_SERVER by default
+        :return: Object. RemoteStream
+        """
+        return RemoteStream(self, cmd, host)
+
+    def channel(self, target, timeout):
+        """
+        Open a channel on a pooled connection. If a channel can't be opened
+        all idle connections to the host are considered broken and the
+        channel is opened once again over a new connection
+        :param target: Tuple. Host, port, login and key file
+        :param timeout: Integer. Timeout in seconds
+        :return: Tuple. SSHClient and channel or None and None on failure
+        """
+        for attempt in range(2):
+            client = self.acquire(target)
+            if not client:
+                return None, None
+            try:
+                channel = client.get_transport().open_session(timeout=timeout)
+            except (SSHException, EOFError, OSError) as e:
+                debug("Failed to open channel to %s: %s" % (target[0], e))
+                self.release(target, client, broken=True)
+                self.discard(target)
+                continue
+            return client, channel
+        error("Failed to open channel to %s" % target[0])
+        return None, None
+
+    @staticmethod
+    def target(host=None):
+        if not host:
+            host = app.config["SSH_SERVER"]
+        login = app.config["SSH_USERNAME"]
+        key_file = app.config["SSH_KEY"]
+        port = app.config.get("SSH_PORT", 22)
+        return host, port, login, key_file
+
+    @staticmethod
+    def run(channel, cmd, timeout):
+        try:
+            channel.settimeout(timeout)
+            channel.exec_command(cmd)
+            output = channel.makefile("r").readlines()
+            errors = channel.makefile_stderr("r").readlines()
+        finally:
+            channel.close()
+        return output, errors
+
+    def acquire(self, target):
+        """
+        Take an idle healthy connection to the target or open a new one. If
+        SSH_POOL_SIZE connections to the target are in use, wait until one
+        of them is released
+        :param target: Tuple. Host, port, login and key file
+        :return: Object. SSHClient or None if connection failed
+        """
+        size = app.config.get("SSH_POOL_SIZE", 4)
+        timeout = app.config.get("SSH_TIMEOUT", 60)
+        deadline = monotonic() + timeout
+        with self.lock:
+            self.forked()
+            self.evict()
+            while True:
+                idle = self.idle.setdefault(target, [])
+                while idle:
+                    client, used = idle.pop()
+                    if self.healthy(client):
+                        self.busy[target] = self.busy.get(target, 0) + 1
+                        return client
+                    client.close()
+                if self.busy.get(target, 0) < size:
+                    self.busy[target] = self.busy.get(target, 0) + 1
+                    break
+                left = deadline - monotonic()
+                if left <= 0:
+                    error("No free connection to %s in %ss" % (target[0],
+                                                                timeout))
+                    return None
+                self.lock.wait(left)
+        client = self.connect(target)
+        if not client:
+            with self.lock:
+                self.busy[target] -= 1
+                self.lock.notify()
+        return client
+
+    def release(self, target, client, broken=False):
+        with self.lock:
+            if self.pid != getpid():
+                return
+            self.busy[target] = max(0, self.busy.get(target, 0) - 1)
+            if broken or not self.healthy(client):
+                client.close()
+            else:
+                self.idle.setdefault(target, []).append((client, monotonic()))
+            self.lock.notify()
+
+    def connect(self, target):
+        host, port, login, key_file = target
+        timeout = app.config.get("SSH_TIMEOUT", 60)
+        debug("Connecting to %s:%s with username %s and key %s" %
+              (host, port, login, key_file))
+        client = SSHClient()
+        client.set_missing_host_key_policy(AutoAddPolicy())
+        try:
+            client.connect(host, username=login, pkey=self.key(key_file),
+                           timeout=timeout, port=port)
+        except AuthenticationException:
+            error("Failed to connect to %s" % host)
+            client.close()
+            return None
+        except BadHostKeyException:
+            error("Host key given by %s did not match with expected" % host)
+            client.close()
+            return None
+        except Exception as e:
+            error("Failed to establish a connection to %s due following error:"
+                  " %s" % (host, e))
+            client.close()
+            return None
+        transport = client.get_transport()
+        transport.set_keepalive(app.config.get("SSH_KEEPALIVE", 30))
+        # Closing a channel and opening the next one are two small writes in
+        # a row, with Nagle's algorithm the second one waits for the delayed
+        # ACK of the server, about 40ms on Linux
+        transport.sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        return client
+
+    def key(self, key_file):
+        """
+        Private key is parsed once and parsed again only if the file has been
+        modified
+        :param key_file: String. Path to the private key
+        :return: Object. RSAKey
+        """
+        mtime = stat(key_file).st_mtime
+        cached = self.keys.get(key_file, None)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        key = RSAKey.from_private_key_file(key_file)
+        self.keys[key_file] = (mtime, key)
+        return key
+
+    @staticmethod
+    def healthy(client):
+        transport = client.get_transport()
+        return bool(transport and transport.is_active()
+                    and transport.is_authenticated())
+
+    def evict(self):
+        """
+        Close connections which have been idle longer then SSH_POOL_IDLE. Has
+        to be called with the lock held
+        """
+        limit = monotonic() - app.config.get("SSH_POOL_IDLE", 300)
+        for target, idle in self.idle.items():
+            fresh = []
+            for client, used in idle:
+                if used < limit:
+                    debug("Closing idle connection to %s" % target[0])
+                    client.close()
+                else:
+                    fresh.append((client, used))
+            self.idle[target] = fresh
+
+    def discard(self, target):
+        with self.lock:
+            for client, used in self.idle.pop(target, []):
+                client.close()
+
+    def forked(self):
+        """
+        Connections inherited from the parent process share sockets with it
+        and have no transport threads, so they are dropped without closing.
+        Has to be called with the lock held
+        """
+        if self.pid == getpid():
+            return
+        debug("Process forked, dropping inherited SSH connections")
+        self.pid = getpid()
+        self.idle = {}
+        self.busy = {}
+
+    def close(self):
+        with self.lock:
+            if self.pid != getpid():
+                return
+            for idle in self.idle.values():
+                for client, used in idle:
+                    client.close()
+            self.idle = {}
+
+
+class RemoteStream:
+    """
+    Output of a remote command which is read line by line while the command
+    is running, so the lines can be processed before the command finishes
+    and the complete output is never kept in memory. Number of received lines
+    and lines of the error output are available in lines and errors
+    attributes once the output is exhausted.
+    If the iteration is stopped early the channel is closed and the
+    connection goes back to the pool. Another thread can stop the command
+    with close()
+    """
+
+    def __init__(self, pool, cmd, host=None):
+        self.pool = pool
+        self.cmd = cmd
+        self.host = host
+        self.lines = 0
+        self.errors = []
+        self.channel = None
+        self.closed = False
+
+    def __iter__(self):
+        target = self.pool.target(self.host)
+        timeout = app.config.get("SSH_TIMEOUT", 60)
+        client, channel = self.pool.channel(target, timeout)
+        if not client:
+            return
+        self.channel = channel
+        broken = False
+        try:
+            if self.closed:
+                return
+            channel.settimeout(timeout)
+            channel.exec_command(self.cmd)
+            for line in channel.makefile("r"):
+                self.lines += 1
+                yield line
+            self.errors = channel.makefile_stderr("r").readlines()
+        except (SSHException, EOFError, OSError) as e:
+            error("Failed to execute command on %s: %s" % (target[0], e))
+            broken = True
+        finally:
+            channel.close()
+            self.pool.release(target, client, broken=broken)
+        debug("Err: %s" % self.errors)
+
+    def close(self):
+        """
+        Stop the command. Closed channel ends the iteration, so the thread
+        reading the output finishes and returns the connection to the pool
+        """
+        self.closed = True
+        if self.channel:
+            self.channel.close()
+
+
+class RemoteExecutor:
+    """
+    Execution of remote commands for asyncio code. Commands are awaited from
+    any event loop, e.g. from Flask async views, while the blocking SSH calls
+    are made by the pool in the worker threads of the executor. The executor
+    has its own event loop running in a background thread, it queues the
+    commands and limits their concurrency.
+
+    Options are taken from the configuration of the current application:
+    REMOTE_WORKERS - maximum number of commands running at the same time, 16
+    by default
+    REMOTE_HOST_WORKERS - maximum number of commands running on the same host
+    at the same time, SSH_POOL_SIZE by default, so a worker never waits for
+    a pooled connection
+    Commands above the limits wait in the order of submission. Cancelled
+    command is removed from the queue or, if it is running already, its
+    channel is closed
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.pid = None
+        self.loop = None
+        self.workers = None
+        self.limit = None
+        self.hosts = {}
+
+    async def execute(self, cmd, host=None):
+        """
+        Execute the command on the remote host and wait for the complete
+        output. Can be awaited from any event loop
+        :param cmd: String. Command to execute
+        :param host: String. Remote host, SSH_SERVER by default
+        :return: Tuple. Lists of output and error lines
+        """
+        future = self.submit(cmd, host)
+        return await asyncio.wrap_future(future)
+
+    def submit(self, cmd, host=None):
+        """
+        Queue the command for execution
+        :param cmd: String. Command to execute
+        :param host: String. Remote host, SSH_SERVER by default
+        :return: Object. concurrent.futures.Future with the tuple of output
+        and error lines, cancelling the future cancels the command
+        """
+        current = app._get_current_object()
+        self.start(current)
+        return asyncio.run_coroutine_threadsafe(
+            self.run(current, cmd, host), self.loop)
+
+    def wait(self, commands, timeout=None):
+        """
+        Execute the commands concurrently and wait for them not longer than
+        timeout seconds. Commands which are not finished in time are
+        cancelled
+        :param commands: List of tuples. Command and host
+        :param timeout: Integer. Timeout in seconds, no timeout if None
+        :return: List of futures in the order of commands
+        """
+        futures = [self.submit(cmd, host) for cmd, host in commands]
+        done, pending = wait(futures, timeout=timeout)
+        for future in pending:
+            future.cancel()
+        return futures
+
+    async def run(self, current, cmd, host):
+        if not host:
+            host = current.config["SSH_SERVER"]
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(current.config.get(
+                "REMOTE_HOST_WORKERS", current.config.get("SSH_POOL_SIZE", 4)))
+        # Commands waiting for a busy host don't hold global slots
+        async with self.hosts[host], self.limit:
+            stream = ssh_pool.stream(cmd, host)
+            future = self.loop.run_in_executor(self.workers, self.read,
+                                               current, stream)
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                debug("Command '%s' on %s cancelled" % (cmd, host))
+                stream.close()
+                await asyncio.wait([future])
+                raise
+
+    @staticmethod
+    def read(current, stream):
+        with current.app_context():
+            output = list(stream)
+        debug("Out: %s" % output)
+        return output, stream.errors
+
+    def start(self, current):
+        """
+        Start the event loop thread and the workers. The loop does not
+        survive fork, so a forked process starts its own one
+        :param current: Object. Flask application
+        """
+        with self.lock:
+            if self.loop and self.pid == getpid():
+                return
+            self.pid = getpid()
+            self.hosts = {}
+            self.loop = asyncio.new_event_loop()
+            self.workers = ThreadPoolExecutor(
+                max_workers=current.config.get("REMOTE_WORKERS", 16),
+                thread_name_prefix="remote")
+            self.limit = asyncio.Semaphore(current.config.get(
+                "REMOTE_WORKERS", 16))
+            Thread(target=self.loop.run_forever, name="remote_loop",
+                   daemon=True).start()
+
+    def close(self):
+        with self.lock:
+            if not self.loop or self.pid != getpid():
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.workers.shutdown(wait=False, cancel_futures=True)
+            self.loop = None
+
+
+ssh_pool = SSHPool()
+atexit.register(ssh_pool.close)
+ssh_executor = RemoteExecutor()
+atexit.register(ssh_executor.close)
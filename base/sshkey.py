@@ -0,0 +1,306 @@
+"""
+Parsing and fingerprinting of OpenSSH public keys without ssh-keygen. The
+rules follow ssh-keygen -l: a key may be prefixed with authorized_keys
+options, lines which are not keys are ignored and one good key is enough
+"""
+from base64 import b64decode, b64encode
+from hashlib import sha256
+from re import compile as re_compile
+from struct import pack, unpack_from
+from cryptography.hazmat.primitives.asymmetric import ec
+from logging import debug
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+RSA_MINIMUM_BITS = 1024
+BIGNUM_MAX_BYTES = 2048
+
+BASE64 = re_compile(r"^[A-Za-z0-9+/]*={0,2}$")
+WHITESPACE = " \t\n\v\f\r"
+
+CURVES = {"nistp256": (ec.SECP256R1(), 256),
+          "nistp384": (ec.SECP384R1(), 384),
+          "nistp521": (ec.SECP521R1(), 521)}
+
+KEY_TYPES = {
+    "ssh-rsa": "RSA",
+    "rsa-sha2-256": "RSA",
+    "rsa-sha2-512": "RSA",
+    "ssh-dss": "DSA",
+    "ssh-ed25519": "ED25519",
+    "sk-ssh-ed25519@openssh.com": "ED25519-SK",
+    "ecdsa-sha2-nistp256": "ECDSA",
+    "ecdsa-sha2-nistp384": "ECDSA",
+    "ecdsa-sha2-nistp521": "ECDSA",
+    "sk-ecdsa-sha2-nistp256@openssh.com": "ECDSA-SK"}
+
+NAMES = {"RSA": "ssh-rsa", "DSA": "ssh-dss", "ED25519": "ssh-ed25519",
+         "ED25519-SK": "sk-ssh-ed25519@openssh.com",
+         "ECDSA-SK": "sk-ecdsa-sha2-nistp256@openssh.com"}
+
+
+class Blob:
+    """
+    Reader of SSH wire format values
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def left(self):
+        return len(self.data) - self.offset
+
+    def string(self):
+        if self.left() < 4:
+            raise ValueError("Truncated key blob")
+        size, = unpack_from(">I", self.data, self.offset)
+        if self.left() < 4 + size:
+            raise ValueError("Truncated key blob")
+        value = self.data[self.offset + 4:self.offset + 4 + size]
+        self.offset += 4 + size
+        return value
+
+    def cstring(self):
+        value = self.string()
+        if b"\0" in value:
+            raise ValueError("String contains NUL character")
+        return value.decode("latin-1")
+
+    def bignum(self):
+        value = self.string()
+        if value and value[0] & 0x80:
+            raise ValueError("Negative number")
+        if len(value) > BIGNUM_MAX_BYTES + 1 or (
+                len(value) == BIGNUM_MAX_BYTES + 1 and value[0] != 0):
+            raise ValueError("Number is too large")
+        return int.from_bytes(value, "big")
+
+
+def encode_string(value):
+    if isinstance(value, str):
+        value = value.encode("latin-1")
+    return pack(">I", len(value)) + value
+
+
+def encode_bignum(value):
+    data = value.to_bytes((value.bit_length() + 8) // 8, "big")
+    if value == 0:
+        data = b""
+    elif data[0] == 0 and not data[1] & 0x80:
+        data = data[1:]
+    return encode_string(data)
+
+
+def key_type(name):
+    """
+    Type of the key by its name. Like OpenSSH, short names like RSA are
+    accepted in any case inside the blob, but not in front of it
+    :param name: String. Name of the key type
+    :return: String. Short name of the type or None if type is unknown
+    """
+    if name in KEY_TYPES:
+        return KEY_TYPES[name]
+    if name.upper() in NAMES or name.upper() == "ECDSA":
+        return name.upper()
+    return None
+
+
+def parse_blob(name, data):
+    """
+    Parse and validate the public key blob
+    :param name: String. Name of the key type preceding the blob
+    :param data: Bytes. Decoded blob
+    :return: Tuple. Short type name, key size in bits and canonical blob
+    """
+    blob = Blob(data)
+    blob_name = blob.cstring()
+    kind = key_type(blob_name)
+    if kind is None or kind != key_type(name):
+        raise ValueError("Key type mismatch")
+    if kind in ("ECDSA", "ECDSA-SK"):
+        if blob_name not in KEY_TYPES:
+            raise ValueError("Unknown curve")
+        curve = "nistp256"
+        if kind == "ECDSA":
+            curve = blob_name.replace("ecdsa-sha2-", "")
+            if name != blob_name:
+                raise ValueError("Curve mismatch")
+        if blob.cstring() != curve:
+            raise ValueError("Curve mismatch")
+        point = blob.string()
+        ec_point(curve, point)
+        canonical = encode_string(blob_name) + encode_string(
+            curve) + encode_string(point)
+        if kind == "ECDSA-SK":
+            canonical += encode_string(blob.cstring())
+        bits = CURVES[curve][1]
+    elif kind in ("ED25519", "ED25519-SK"):
+        point = blob.string()
+        if len(point) != 32:
+            raise ValueError("Wrong size of ED25519 key")
+        canonical = encode_string(NAMES[kind]) + encode_string(point)
+        if kind == "ED25519-SK":
+            canonical += encode_string(blob.cstring())
+        bits = 256
+    elif kind == "RSA":
+        e, n = blob.bignum(), blob.bignum()
+        bits = n.bit_length()
+        if bits < RSA_MINIMUM_BITS:
+            raise ValueError("RSA key is too short")
+        canonical = encode_string(NAMES[kind]) + encode_bignum(
+            e) + encode_bignum(n)
+    else:
+        numbers = [blob.bignum() for i in range(4)]
+        bits = numbers[0].bit_length()
+        canonical = encode_string(NAMES[kind]) + b"".join(
+            map(encode_bignum, numbers))
+    if blob.left():
+        raise ValueError("Unexpected data after the key")
+    return kind, bits, canonical
+
+
+def ec_point(curve, point):
+    """
+    Check that the point is an uncompressed point on the curve and that its
+    coordinates are not suspiciously small
+    :param curve: String. Name of the curve
+    :param point: Bytes. Encoded point
+    """
+    if not point or point[0] != 4:
+        raise ValueError("Only uncompressed points are supported")
+    algorithm, bits = CURVES[curve]
+    key = ec.EllipticCurvePublicKey.from_encoded_point(algorithm, point)
+    numbers = key.public_numbers()
+    if numbers.x.bit_length() <= bits // 2 or (
+            numbers.y.bit_length() <= bits // 2):
+        raise ValueError("Invalid EC point")
+
+
+def decode(text):
+    """
+    Strict base64 decoding: whitespace is ignored, padding is required and
+    unused bits have to be zero
+    :param text: String. Base64 text
+    :return: Bytes
+    """
+    text = "".join(x for x in text if x not in WHITESPACE)
+    if len(text) % 4 or not BASE64.match(text):
+        raise ValueError("Wrong base64 encoding")
+    data = b64decode(text)
+    if b64encode(data).decode("ascii") != text:
+        raise ValueError("Wrong base64 encoding")
+    return data
+
+
+def read_key(text):
+    """
+    Read the key in format "type base64 [comment]"
+    :param text: String. Text starting with the key
+    :return: Tuple. Short type name, size in bits, fingerprint and the text
+    after the key or None if the text does not start with a valid key
+    """
+    fields = split_blank(text)
+    if fields is None:
+        return None
+    name, rest = fields
+    if name not in KEY_TYPES:
+        return None
+    rest = rest.lstrip(" \t")
+    if not rest:
+        return None
+    end = len(rest)
+    for i, char in enumerate(rest):
+        if char in " \t":
+            end = i
+            break
+    try:
+        kind, bits, canonical = parse_blob(name, decode(rest[:end]))
+    except ValueError as err:
+        debug("Not a public key: %s" % err)
+        return None
+    digest = b64encode(sha256(canonical).digest()).decode("ascii")
+    return kind, bits, "SHA256:%s" % digest.rstrip("="), rest[end:]
+
+
+def split_blank(text):
+    for i, char in enumerate(text):
+        if char in " \t":
+            return text[:i], text[i:]
+    return None
+
+
+def skip_options(text):
+    """
+    Skip authorized_keys options or host names preceding the key. Blanks
+    inside double quotes do not end the options
+    :param text: String. Line of the file
+    :return: Tuple. Options and the text after them or None
+    """
+    quoted = False
+    i = 0
+    while i < len(text) and (quoted or text[i] not in " \t"):
+        if text[i] == "\\" and text[i + 1:i + 2] == '"':
+            i += 1
+        elif text[i] == '"':
+            quoted = not quoted
+        i += 1
+    if i >= len(text):
+        return None
+    return text[:i], text[i + 1:]
+
+
+def key_fingerprints(text):
+    """
+    Fingerprints of all public keys found in the text in the same format as
+    ssh-keygen -l prints them: size, SHA256 fingerprint, comment and type.
+    Private keys are refused
+    :param text: String. Content of a public key or authorized_keys file
+    :return: List of strings. Empty list if no valid key is found
+    """
+    result = []
+    for number, line in enumerate(text.split("\n"), 1):
+        line = line.lstrip(" \t")
+        if not line or line[0] == "#":
+            continue
+        if number == 1 and "PRIVATE KEY" in line:
+            debug("Private key is not accepted")
+            return []
+        comment = None
+        key = read_key(line)
+        if key is None:
+            if not options_allowed(line):
+                continue
+            options = skip_options(line)
+            if options is None:
+                continue
+            comment, line = options
+            key = read_key(line)
+            if key is None:
+                continue
+        kind, bits, fingerprint, rest = key
+        rest = rest.lstrip(" \t")
+        if rest and rest[0] != "#":
+            comment = rest
+        result.append("%s %s %s (%s)" % (bits, fingerprint,
+                                         comment or "no comment", kind))
+    return result
+
+
+def options_allowed(line):
+    """
+    ssh-keygen does not look for options when the line starts with a non
+    zero number followed by a blank, which is the format of SSH1 keys
+    :param line: String. Line of the file
+    :return: Boolean
+    """
+    digits = line
+    if digits[:1] in "+-":
+        digits = digits[1:]
+    count = len(digits) - len(digits.lstrip("0123456789"))
+    if not count or int(digits[:count]) == 0:
+        return True
+    return digits[count:count + 1] not in (" ", "\t")
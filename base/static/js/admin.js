@@ -11,7 +11,7 @@
         space: "admin/space/info",
         system: "admin/sys/info",
         pending: "admin/pending/list",
-        accounting: "admin/accounting/365",
+        accounting: "admin/accounting/365?format=compact",
         tasks: "admin/tasks/list",
         tasks_accept: "admin/tasks/accept",
         tasks_history: "admin/tasks/history",
@@ -88,8 +88,10 @@
                 $(node).removeClass("dt-button")
             },
             action: function( e, dt, node, config ){
+                let url = dt.ajax.url();
                 dt.clear().draw();
-                dt.ajax.reload();
+                dt.ajax.url(url + "?refresh=1").load();
+                dt.ajax.url(url);
             }
         };
         $("#system").DataTable({
@@ -104,7 +106,11 @@
             columns: [{
                 data: "server",
                 render: function(data, type, row) {
-                    return '<div title="' + data + '" style="white-space: nowrap;">' + data + '</div>';
+                    let status = "";
+                    if(row.status && row.status !== "ok"){
+                        status = ' <span class="uk-badge uk-badge-danger">' + row.status + '</span>';
+                    }
+                    return '<div title="' + data + '" style="white-space: nowrap;">' + data + status + '</div>';
                 }
             },{
                 data: "memory"
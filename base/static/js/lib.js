@@ -188,14 +188,22 @@ trigger_modal = function(e){
 };
 
 accounting = function (canvas_id, data, vert) {
-    const sortedData = data.data.map(item => {
-        const dateStr = Object.keys(item)[0];
-        const date = moment(dateStr, 'YYYY-MM-DD HH:mm').toDate();
-        const value = Object.values(item)[0];
-        return {date, value};
-    }).sort((a, b) => a.date - b.date);
-    const dates = sortedData.map(item => moment(item.date).format('YYYY-MM-DD HH:mm'));
-    const values = sortedData.map(item => item.value);
+    let dates = [];
+    let values = [];
+    if (data.data.dates !== undefined) {
+        // Compact format: dates are already sorted
+        dates = data.data.dates;
+        values = data.data.values;
+    } else {
+        const sortedData = data.data.map(item => {
+            const dateStr = Object.keys(item)[0];
+            const date = moment(dateStr, 'YYYY-MM-DD HH:mm').toDate();
+            const value = Object.values(item)[0];
+            return {date, value};
+        }).sort((a, b) => a.date - b.date);
+        dates = sortedData.map(item => moment(item.date).format('YYYY-MM-DD HH:mm'));
+        values = sortedData.map(item => item.value);
+    }
     const canvas = document.getElementById(canvas_id);
     canvas.style.width = '100%';
     const parentWidth = canvas.parentElement.clientWidth;
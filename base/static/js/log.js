@@ -1,6 +1,8 @@
 (function(window, document, $, undefined){
     "use strict";
     window.log = {};
+    window.log.url = "log/page";
+    window.log.next = null;
     window.log.items = function project_state(btn, table){
         if(!$(btn).hasClass("uk-active")){
             return;
@@ -8,6 +10,24 @@
         let items = $.trim( $(btn).data("items") );
         table.page.len( items ).draw();
     };
+    window.log.load = function(table, reset){
+        let filter = $("#log_filter").serializeArray().filter(function(item){
+            return $.trim(item.value).length > 0;
+        });
+        if(!reset && window.log.next){
+            filter.push({name: "cursor", value: window.log.next});
+        }
+        let url = "{0}?{1}".f(window.log.url, $.param(filter));
+        $("#events_more").prop("disabled", true);
+        return ajax(url).done(function(reply){
+            if(reset){
+                table.clear();
+            }
+            window.log.next = reply.next;
+            table.rows.add(reply.data).draw(false);
+            $("#events_more").prop("disabled", !reply.next);
+        });
+    };
     $(document).on("ready", function(){
         var table = $("#events").DataTable({
             dom: "tip",
@@ -46,5 +66,12 @@
             table.search( this.value ).draw();
         });
         $(document).on("click", ".items", function(){ window.log.items(this, table) });
+        $(document).on("click", "#events_more", function(){ window.log.load(table, false) });
+        $("#log_filter").on("change", function(){ window.log.load(table, true) });
+        $("#log_filter").on("submit", function(e){
+            e.preventDefault();
+            window.log.load(table, true);
+        });
+        window.log.load(table, true);
     });
-})(window, document, jQuery);
\ No newline at end of file
+})(window, document, jQuery);
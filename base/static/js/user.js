@@ -8,8 +8,25 @@
         var login = $.trim( $("#user_login").data("login") );
         modal("{0}/{1}".f(url, login), "edit");
         modal(ssh, "ssh");
+        $("#user_jobs[data-url], #user_scratch[data-url]").each(dashboard);
     });
 
+    function dashboard() {
+        let el = $(this);
+        $.ajax({
+            timeout: 60000,
+            type: "POST",
+            url: el.data("url")
+        }).done(function(reply){
+            el.replaceWith(reply.html);
+            if(reply.message){
+                UIkit.notify(reply.message, {timeout: 3000, status: "warning"});
+            }
+        }).fail(function(request){
+            show_error(request);
+        });
+    }
+
     function reset() {
         window.location.href = pass;
     }
@@ -0,0 +1,207 @@
+"""
+Equivalence of base/sshkey.py with ssh-keygen -l and the cost of both.
+
+The script generates keys of every supported type, derives valid and broken
+variants of them (options, comments, line endings, wrong types, corrupted
+base64 and blobs, ...) and checks that key_fingerprints() accepts exactly
+the texts accepted by ssh-keygen and prints the same fingerprint lines.
+Private keys are accepted by ssh-keygen but deliberately refused by
+key_fingerprints(), such differences are reported as expected.
+
+Usage: python benchmarks/sshkeys.py
+"""
+import sys
+from base64 import b64decode, b64encode
+from os import remove, urandom
+from pathlib import Path
+from struct import pack
+from subprocess import run, DEVNULL, PIPE
+from tempfile import mkstemp, TemporaryDirectory
+from time import perf_counter
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import serialization
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from base.sshkey import key_fingerprints  # noqa: E402
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+GENERATE = [("rsa", "1024"), ("rsa", "2048"), ("rsa", "3072"), ("dsa", None),
+            ("ecdsa", "256"), ("ecdsa", "384"), ("ecdsa", "521"),
+            ("ed25519", None)]
+REPEAT = 200
+
+
+def string(value):
+    if isinstance(value, str):
+        value = value.encode()
+    return pack(">I", len(value)) + value
+
+
+def split_blob(line):
+    name, data = line.split()[:2]
+    return name, b64decode(data)
+
+
+def blob_line(name, blob, comment="user@host"):
+    return "%s %s %s" % (name, b64encode(blob).decode(), comment)
+
+
+def generate(directory):
+    """
+    Public keys generated by ssh-keygen and a few synthesized ones which
+    ssh-keygen can't generate: security keys and a short RSA key
+    :param directory: String. Directory for the generated files
+    :return: List of strings. Public keys
+    """
+    keys = []
+    for kind, bits in GENERATE:
+        path = Path(directory) / ("%s%s" % (kind, bits or ""))
+        cmd = ["ssh-keygen", "-q", "-t", kind, "-N", "", "-C", "user@host",
+               "-f", str(path)]
+        if bits:
+            cmd += ["-b", bits]
+        run(cmd, check=True, stdout=DEVNULL, stderr=DEVNULL)
+        keys.append(path.with_suffix(".pub").read_text().strip())
+    point = ec.generate_private_key(ec.SECP256R1()).public_key().public_bytes(
+        serialization.Encoding.X962,
+        serialization.PublicFormat.UncompressedPoint)
+    keys.append(blob_line("sk-ecdsa-sha2-nistp256@openssh.com", string(
+        "sk-ecdsa-sha2-nistp256@openssh.com") + string("nistp256") +
+        string(point) + string("ssh:")))
+    name, ed = split_blob(keys[GENERATE.index(("ed25519", None))])
+    keys.append(blob_line("sk-ssh-ed25519@openssh.com", string(
+        "sk-ssh-ed25519@openssh.com") + ed[len(string(name)):] +
+        string("ssh:")))
+    modulus = int.from_bytes(urandom(96), "big") | (1 << 767) | 1
+    keys.append(blob_line("ssh-rsa", string("ssh-rsa") + string(
+        b"\1\0\1") + string(b"\0" + modulus.to_bytes(96, "big")),
+        "short@host"))
+    return keys
+
+
+def variants(key, private):
+    """
+    Texts derived from the key
+    :param key: String. Public key line "type base64 comment"
+    :param private: String. Private key text
+    :return: List of strings
+    """
+    name, blob = split_blob(key)
+    data = key.split()[1]
+    texts = [
+        key, "%s %s" % (name, data), "  %s" % key, "%s\r\n" % key,
+        "%s\t%s\tcomment" % (name, data), "%s %s  # comment" % (name, data),
+        "# comment\n\n%s\n" % key, "junk line\n%s\nmore junk" % key,
+        'command="echo hello world",no-pty %s' % key,
+        "restrict %s %s" % (name, data),
+        "host.example.com,10.0.0.1 %s" % key, "2048 %s" % key,
+        "0 %s" % key, '"unterminated %s' % key,
+        "%s %s" % (name.upper(), data), "%s %s" % (name.lower(), data),
+        "%s" % name, "%s %s" % (name, data[:-4]),
+        "%s %s" % (name, data.rstrip("=")),
+        "%s %s%s" % (name, data[:10], data[11:]),
+        "%s %s" % (name, data[:20] + "!" + data[21:]),
+        "%s %s" % (name, data[:20] + " " + data[20:]),
+        blob_line(name, blob + b"\0\0\0\0"), blob_line(name, blob[:-1]),
+        blob_line("ssh-ed25519" if "ed25519" not in name else "ssh-rsa",
+                  blob),
+        "", "\n\n", "# only comment", private,
+        "%s\n%s" % (key, private),
+    ]
+    if name == "ssh-rsa":
+        texts += ["rsa-sha2-256 %s" % data, "rsa-sha2-512 %s" % data]
+        e_size = int.from_bytes(blob[11:15], "big")
+        e = blob[15:15 + e_size]
+        n = blob[15 + e_size + 4:]
+        texts.append(blob_line(name, string(name) + string(b"\0" + e) +
+                               string(n)))
+        texts.append(blob_line(name, string(name) + string(e) +
+                               string(b"\x80" + n[1:])))
+        texts.append(blob_line(name, string("RSA") + blob[11:]))
+        texts.append(blob_line("RSA", blob))
+    if name.startswith("ecdsa-sha2-"):
+        curve = name.replace("ecdsa-sha2-", "")
+        point = blob[len(string(name)) + len(string(curve)) + 4:]
+        compressed = bytes([2 + (point[-1] & 1)]) + point[1:1 + (
+            len(point) - 1) // 2]
+        texts.append(blob_line(name, string(name) + string(curve) +
+                               string(compressed)))
+        broken = point[:-1] + bytes([point[-1] ^ 1])
+        texts.append(blob_line(name, string(name) + string(curve) +
+                               string(broken)))
+        other = "nistp384" if curve == "nistp256" else "nistp256"
+        texts.append(blob_line(name, string(name) + string(other) +
+                               string(point)))
+        texts.append(blob_line("ecdsa-sha2-" + other, blob))
+        texts.append("ECDSA %s" % data)
+    if name == "ssh-ed25519":
+        texts.append(blob_line(name, blob[:-1] + b"\0" + b"x"))
+        texts.append(blob_line(name, string(name) + string(b"\1" * 31)))
+        texts.append(blob_line("ED25519", string("ED25519") +
+                               blob[len(string(name)):]))
+        texts.append(blob_line(name, string("ed25519") +
+                               blob[len(string(name)):]))
+    return texts
+
+
+def keygen(text):
+    """
+    Run ssh-keygen -l on the text the same way as the old ssh_check did
+    :param text: String. Key text
+    :return: List of strings. Fingerprint lines or empty list on failure
+    """
+    fd, path = mkstemp(text=True)
+    with open(path, "w") as writer:
+        writer.write(text)
+    result = run(["ssh-keygen", "-l", "-f", path], stdout=PIPE,
+                 stderr=DEVNULL, universal_newlines=True)
+    remove(path)
+    if result.returncode:
+        return []
+    return result.stdout.splitlines()
+
+
+def main():
+    with TemporaryDirectory() as directory:
+        keys = generate(directory)
+        private = (Path(directory) / "ed25519").read_text()
+    texts = []
+    for key in keys:
+        texts += variants(key, private)
+    differences = expected = accepted = 0
+    for text in texts:
+        reference = keygen(text)
+        # ssh-keygen prints the comment with a trailing carriage return
+        result = "\n".join(key_fingerprints(text)).splitlines()
+        accepted += bool(result)
+        if reference == result:
+            continue
+        if "PRIVATE KEY" in text.lstrip().split("\n")[0]:
+            expected += 1
+            continue
+        differences += 1
+        print("Difference for %r:\n  ssh-keygen: %s\n  in-process: %s" % (
+            text, reference, result))
+    print("%s texts, %s accepted, %s differences, %s expected (private "
+          "keys)" % (len(texts), accepted, differences, expected))
+
+    sample = keys[1]
+    start = perf_counter()
+    for i in range(REPEAT):
+        keygen(sample)
+    spawn = (perf_counter() - start) / REPEAT * 1000
+    start = perf_counter()
+    for i in range(REPEAT):
+        key_fingerprints(sample)
+    inline = (perf_counter() - start) / REPEAT * 1000
+    print("ssh-keygen: %.3fms per key, in-process: %.3fms per key" % (
+        spawn, inline))
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Local stand-in for the cluster: an SSH server answering the commands sent by
+ssh_wrapper, ssh_stream and ssh_login with generated output of configurable
+size and latency, so the cluster facing code can be run and measured without
+a real cluster.
+
+Recognized commands and the size options of their output:
+    sinfo -R ...              nodes lines, 1/10 of them are down or drained
+    sinfo -s                  partitions lines
+    sacct ... | head -N       jobs lines in decreasing order of job id, the
+                              number of lines is limited by head if present
+    df -h                     filesystems lines
+    beegfs-ctl --getquota     users lines, logins are "u0", "u1", ...
+    echo cores:`nproc` ...    system information of get_server_info
+    ... w -s -h               sessions lines
+Any other command fails with exit status 127.
+
+Public key authentication is accepted for any key, password authentication
+only for the configured password. Every command and every password check
+waits for latency seconds before answering. Recent OpenSSH clients need an
+ED25519 or ECDSA key, as the server doesn't offer SHA-2 signatures for RSA.
+
+Usage: python benchmarks/standin.py [--port 2222] [--nodes 5000] ...
+"""
+import argparse
+import socket
+from datetime import datetime as dt, timedelta
+from logging import debug, error
+from re import search
+from threading import Event, Lock, Thread
+from time import sleep
+from paramiko import (RSAKey, ServerInterface, Transport, AUTH_FAILED,
+                      AUTH_SUCCESSFUL, OPEN_SUCCEEDED)
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+CHUNK = 65536
+STATES = ["COMPLETED", "FAILED", "TIMEOUT", "CANCELLED", "RUNNING"]
+REASONS = ["Not responding", "Kill task failed", "Node unexpectedly rebooted",
+           "Maintenance", "batch job complete failure"]
+
+
+class Cluster:
+    """
+    Generator of command outputs. Outputs are deterministic: the same options
+    always produce the same lines
+    """
+
+    def __init__(self, nodes=1000, partitions=8, jobs=10000, users=1000,
+                 filesystems=10, sessions=50, latency=0.0,
+                 password="secret"):
+        self.nodes = nodes
+        self.partitions = partitions
+        self.jobs = jobs
+        self.users = users
+        self.filesystems = filesystems
+        self.sessions = sessions
+        self.latency = latency
+        self.password = password
+        self.epoch = dt(2024, 1, 1)
+
+    def output(self, cmd):
+        """
+        Output of the command
+        :param cmd: String. Command line
+        :return: Generator of lines or None if the command is unknown
+        """
+        if "sinfo -R" in cmd:
+            return self.sinfo_reasons()
+        if "sinfo -s" in cmd:
+            return self.sinfo_summary()
+        if cmd.startswith("sacct"):
+            limit = search(r"\|\s*head -(\d+)", cmd)
+            return self.sacct(int(limit.group(1)) if limit else None)
+        if cmd.startswith("df -h"):
+            return self.df()
+        if cmd.startswith("beegfs-ctl --getquota"):
+            return self.quota()
+        if "cores:`nproc`" in cmd:
+            return self.server_info()
+        if "w -s -h" in cmd:
+            return self.who()
+        return None
+
+    def sinfo_reasons(self):
+        yield "%-100s|%-19s|%-30s|%s" % ("REASON", "TIMESTAMP", "NODELIST",
+                                        "STATE")
+        for i in range(self.nodes):
+            if i % 10:
+                continue
+            date = self.epoch + timedelta(minutes=i)
+            state = "down*" if i % 20 else "drain"
+            yield "%-100s|%s|%-30s|%s" % (
+                REASONS[i % len(REASONS)], date.strftime("%Y-%m-%dT%H:%M:%S"),
+                "node%05d" % i, state)
+
+    def sinfo_summary(self):
+        yield "PARTITION AVAIL  TIMELIMIT   NODES(A/I/O/T) NODELIST"
+        size = max(self.nodes // max(self.partitions, 1), 1)
+        for i in range(self.partitions):
+            allocated, idle = size * 7 // 10, size * 2 // 10
+            other = size - allocated - idle
+            yield "part%02d%s up 7-00:00:00 %s/%s/%s/%s node[%05d-%05d]" % (
+                i, "*" if i == 0 else "", allocated, idle, other, size,
+                i * size, (i + 1) * size - 1)
+
+    def sacct(self, limit=None):
+        count = self.jobs if limit is None else min(limit, self.jobs)
+        for i in range(count):
+            job = self.jobs - i
+            start = self.epoch + timedelta(seconds=job * 37)
+            yield "%s|%s|%s|a%03d|job%s|%02d:%02d:%02d|part%02d" % (
+                job, STATES[job % len(STATES)], start.strftime(
+                    "%Y-%m-%dT%H:%M:%S"), job % 500, job, job % 100,
+                job % 60, job % 60, job % max(self.partitions, 1))
+
+    def df(self):
+        yield "Filesystem      Size  Used Avail Use% Mounted on"
+        for i in range(self.filesystems):
+            yield "/dev/sd%s%s  %sT  %sT  %sT  %s%% /fs%s" % (
+                chr(97 + i % 26), i // 26 + 1, 100 + i, 50 + i, 50, 50 - i % 50,
+                i)
+
+    def quota(self):
+        yield "name,id,size,hard,files,hard"
+        for i in range(self.users):
+            yield "u%s,%s,%s,%s,%s,%s" % (i, 10000 + i, (i + 1) * 1048576,
+                                          1099511627776, i * 10, 1000000)
+
+    def server_info(self):
+        yield "cores:64"
+        yield "up 3 weeks, 2 days, 4 hours, 5 minutes"
+        yield ("Mem:    540000000000 200000000000 100000000000 1000000000 "
+               "240000000000 330000000000")
+        yield "Swap:   8000000000 1000000000 7000000000"
+        yield "Load:12.50,:10.25,:9.75"
+        for i in range(min(self.sessions, self.users)):
+            yield "u%s" % i
+
+    def who(self):
+        for i in range(self.sessions):
+            yield "u%s pts/%s 10.0.%s.%s 10:%02d bash -l" % (
+                i % max(self.users, 1), i, i // 256, i % 256, i % 60)
+
+
+class Handler(ServerInterface):
+    """
+    SSH server side of one connection
+    """
+
+    def __init__(self, server):
+        self.server = server
+
+    def get_allowed_auths(self, username):
+        return "publickey,password"
+
+    def check_auth_publickey(self, username, key):
+        return AUTH_SUCCESSFUL
+
+    def check_auth_password(self, username, password):
+        sleep(self.server.cluster.latency)
+        if password == self.server.cluster.password:
+            return AUTH_SUCCESSFUL
+        return AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        return OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        Thread(target=self.server.execute, args=(channel, command.decode()),
+               daemon=True).start()
+        return True
+
+
+class StandIn:
+    """
+    SSH server listening on localhost. Port 0 picks a free port, the actual
+    port is available in port attribute after start()
+    """
+
+    def __init__(self, cluster, port=0):
+        self.cluster = cluster
+        self.port = port
+        self.key = RSAKey.generate(2048)
+        self.socket = None
+        self.stopped = Event()
+        self.lock = Lock()
+        self.connections = 0
+        self.commands = []
+
+    def start(self):
+        self.socket = socket.socket()
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(("127.0.0.1", self.port))
+        self.socket.listen(128)
+        self.port = self.socket.getsockname()[1]
+        Thread(target=self.serve, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.socket.close()
+
+    def serve(self):
+        while not self.stopped.is_set():
+            try:
+                sock, address = self.socket.accept()
+            except OSError:
+                break
+            Thread(target=self.handle, args=(sock,), daemon=True).start()
+
+    def handle(self, sock):
+        with self.lock:
+            self.connections += 1
+        # Small answers would otherwise wait for the delayed ACK of the client
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transport = Transport(sock)
+        transport.add_server_key(self.key)
+        try:
+            transport.start_server(server=Handler(self))
+        except Exception as err:
+            debug("Handshake failed: %s" % err)
+            return
+        # Paramiko closes channels which are garbage collected
+        channels = []
+        while transport.is_active() and not self.stopped.is_set():
+            channel = transport.accept(1)
+            channels = [x for x in channels if not x.closed]
+            if channel is not None:
+                channels.append(channel)
+
+    def execute(self, channel, cmd):
+        """
+        Send the output of the command in chunks of CHUNK bytes
+        :param channel: Object. Paramiko channel
+        :param cmd: String. Command line
+        """
+        with self.lock:
+            self.commands.append(cmd)
+        sleep(self.cluster.latency)
+        lines = self.cluster.output(cmd)
+        status = 0
+        try:
+            if lines is None:
+                channel.sendall_stderr("%s: command not found\n" % cmd)
+                lines = []
+                status = 127
+            buffer = []
+            size = 0
+            for line in lines:
+                buffer.append(line)
+                size += len(line) + 1
+                if size >= CHUNK:
+                    channel.sendall("\n".join(buffer) + "\n")
+                    buffer = []
+                    size = 0
+            if buffer:
+                channel.sendall("\n".join(buffer) + "\n")
+            channel.send_exit_status(status)
+            # The reply to the exec request is sent after this thread is
+            # started, closing the channel right away may overtake it. The
+            # client closes the channel once it has read the output
+            channel.shutdown_write()
+            channel.settimeout(60)
+            channel.recv(1)
+        except (EOFError, OSError) as err:
+            error("Client went away during '%s': %s" % (cmd, err))
+        finally:
+            channel.close()
+
+
+def arguments(parser=None):
+    """
+    Command line options of the stand-in, shared with the benchmarks
+    :param parser: Object. ArgumentParser to extend, a new one if None
+    :return: Object. ArgumentParser
+    """
+    if parser is None:
+        parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--partitions", type=int, default=8)
+    parser.add_argument("--jobs", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--filesystems", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds before every answer")
+    parser.add_argument("--password", default="secret")
+    return parser
+
+
+def cluster(args):
+    return Cluster(nodes=args.nodes, partitions=args.partitions,
+                   jobs=args.jobs, users=args.users,
+                   filesystems=args.filesystems, sessions=args.sessions,
+                   latency=args.latency, password=args.password)
+
+
+def main():
+    parser = arguments()
+    parser.add_argument("--port", type=int, default=2222)
+    args = parser.parse_args()
+    server = StandIn(cluster(args), port=args.port).start()
+    print("Listening on 127.0.0.1:%s, press Ctrl+C to stop" % server.port)
+    try:
+        server.stopped.wait()
+    except KeyboardInterrupt:
+        server.stop()
+    print("%s connections, %s commands" % (server.connections,
+                                           len(server.commands)))
+
+
+if __name__ == "__main__":
+    main()
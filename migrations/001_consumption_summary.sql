@@ -0,0 +1,26 @@
+-- Consumption summary maintained by accounting upload.
+-- Total consumption is stored in project_resources.consumed, consumption of
+-- each user in user_consumption table. Both are filled from accounting table.
+
+BEGIN;
+
+ALTER TABLE project_resources ADD COLUMN consumed INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE user_consumption (
+    resources_id INTEGER NOT NULL REFERENCES project_resources (id),
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    cpu INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (resources_id, user_id)
+);
+
+UPDATE project_resources SET consumed = COALESCE((
+    SELECT SUM(accounting.cpu) FROM accounting
+    WHERE accounting.resources_id = project_resources.id
+    AND accounting.user_id IS NULL), 0);
+
+INSERT INTO user_consumption (resources_id, user_id, cpu)
+    SELECT resources_id, user_id, SUM(cpu) FROM accounting
+    WHERE resources_id IS NOT NULL AND user_id IS NOT NULL
+    GROUP BY resources_id, user_id;
+
+COMMIT;
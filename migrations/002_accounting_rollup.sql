@@ -0,0 +1,29 @@
+-- Accounting aggregated by day, week and month maintained by accounting
+-- upload. Records with NULL user_id hold the total consumption of resources.
+
+BEGIN;
+
+CREATE TABLE accounting_rollup (
+    id SERIAL PRIMARY KEY,
+    granularity VARCHAR(5) CHECK (granularity IN ('day', 'week', 'month')),
+    period TIMESTAMP WITH TIME ZONE,
+    resources_id INTEGER REFERENCES project_resources (id),
+    project_id INTEGER REFERENCES projects (id),
+    user_id INTEGER REFERENCES users (id),
+    cpu INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX accounting_rollup_period_idx
+    ON accounting_rollup (granularity, period);
+
+INSERT INTO accounting_rollup
+    (granularity, period, resources_id, project_id, user_id, cpu)
+    SELECT granularity.name, date_trunc(granularity.name, accounting.date),
+        resources_id, project_id, user_id, SUM(cpu)
+    FROM accounting CROSS JOIN (VALUES ('day'), ('week'), ('month'))
+        AS granularity (name)
+    WHERE resources_id IS NOT NULL
+    GROUP BY granularity.name, date_trunc(granularity.name, accounting.date),
+        resources_id, project_id, user_id;
+
+COMMIT;
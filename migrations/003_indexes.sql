@@ -0,0 +1,34 @@
+-- Secondary indexes for the most frequent queries: accounting series and
+-- upload, task queue, event log, pending registrations and project lookup
+-- by name. Indexes are built CONCURRENTLY to avoid locking of the tables,
+-- so the script can't be wrapped in a transaction.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_accounting_resources_user_date
+    ON accounting (resources_id, user_id, date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_accounting_project_user_date
+    ON accounting (project_id, user_id, date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_state
+    ON tasks (processed, done, decision);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_tasks_action_open
+    ON tasks (action) WHERE NOT done;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_logs_project_created
+    ON logs (project_id, created);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_logs_register
+    ON logs (register_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_register_status
+    ON register (status);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_register_pending
+    ON register (id)
+    WHERE status IS NULL OR status NOT IN ('created', 'ignored', 'rejected');
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_projects_name
+    ON projects (name);
+
+ANALYZE accounting, tasks, logs, register, projects;
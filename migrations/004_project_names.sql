@@ -0,0 +1,28 @@
+-- Projects are looked up by name. Projects without a name get the name
+-- returned by Project.get_name(): type followed by the id padded with zeros
+-- to three digits. Then the non unique index on the name is replaced by a
+-- unique one. Indexes are built CONCURRENTLY, so the script can't be wrapped
+-- in a transaction.
+
+UPDATE projects
+    SET name = COALESCE(type, 'None') || lpad(id::text,
+        greatest(length(id::text), 3), '0')
+    WHERE name IS NULL OR name = '';
+
+DO $$
+DECLARE
+    duplicates TEXT;
+BEGIN
+    SELECT string_agg(name, ', ') INTO duplicates FROM (
+        SELECT name FROM projects GROUP BY name HAVING COUNT(*) > 1) AS names;
+    IF duplicates IS NOT NULL THEN
+        RAISE EXCEPTION 'Project names are not unique: %', duplicates;
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_projects_name
+    ON projects (name);
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_projects_name;
+
+ANALYZE projects;
@@ -0,0 +1,33 @@
+-- One rollup record per granularity, period, resources and user. Records
+-- with NULL user_id hold the totals, so the key is enforced by two partial
+-- unique indexes. Accounting upload relies on them to upsert the records.
+-- Concurrent uploads could have created duplicates before, so the records
+-- are recreated out of accounting table first, like in 002.
+
+BEGIN;
+
+LOCK TABLE accounting_rollup IN EXCLUSIVE MODE;
+
+DELETE FROM accounting_rollup;
+
+INSERT INTO accounting_rollup
+    (granularity, period, resources_id, project_id, user_id, cpu)
+    SELECT granularity.name, date_trunc(granularity.name, accounting.date),
+        resources_id, MIN(project_id), user_id, SUM(cpu)
+    FROM accounting CROSS JOIN (VALUES ('day'), ('week'), ('month'))
+        AS granularity (name)
+    WHERE resources_id IS NOT NULL
+    GROUP BY granularity.name, date_trunc(granularity.name, accounting.date),
+        resources_id, user_id;
+
+CREATE UNIQUE INDEX accounting_rollup_user_key
+    ON accounting_rollup (granularity, period, resources_id, user_id)
+    WHERE user_id IS NOT NULL;
+
+CREATE UNIQUE INDEX accounting_rollup_total_key
+    ON accounting_rollup (granularity, period, resources_id)
+    WHERE user_id IS NULL;
+
+COMMIT;
+
+ANALYZE accounting_rollup;
@@ -0,0 +1,104 @@
+"""
+Common fixtures of the tests. Run with: python -m pytest tests
+
+The application is created with an SQLite database and SimpleCache in a
+temporary directory. Tables are created for every test which uses the
+database fixture and dropped afterwards
+"""
+import sys
+from datetime import datetime as dt, timezone
+from pathlib import Path
+from re import match
+from sqlalchemy import CheckConstraint
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from base import create_app  # noqa: E402
+from base.database.schema import User, ACLDB, Project, Resources  # noqa: E402
+from base.extensions import cache, db  # noqa: E402
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("instance")
+    options = {
+        "SECRET_KEY": "test",
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///%s" % (directory / "test.db"),
+        "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        "WTF_CSRF_ENABLED": False,
+        "CACHE_TYPE": "SimpleCache",
+        "COLLECTOR_ENABLED": False,
+        "PROJECT_CONFIG": str(directory / "project.cfg"),
+        "EMAIL_CONFIG": str(directory / "mail.cfg"),
+    }
+    config = directory / "test.cfg"
+    config.write_text("".join("%s = %r\n" % x for x in options.items()))
+    app = create_app(str(config))
+    app.config["TESTING"] = True
+    # Some models declare check constraints on columns which don't exist
+    for table in db.metadata.tables.values():
+        table.constraints = valid(table, table.constraints)
+        for column in table.columns:
+            column.constraints = valid(table, column.constraints)
+    return app
+
+
+def valid(table, constraints):
+    return {x for x in constraints if not isinstance(x, CheckConstraint) or
+            match(r"\w+", str(x.sqltext)).group(0) in table.c}
+
+
+@pytest.fixture
+def database(app):
+    with app.test_request_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+        cache.clear()
+
+
+@pytest.fixture
+def admin(database):
+    user = User(login="admin", name="Test", surname="Admin",
+                email="admin@example.com", active=True,
+                acl=ACLDB(is_user=True, is_admin=True))
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def make_project(name, responsible, approve, users=(), cpu=1000):
+    """
+    Project of type A with resources valid in 2024
+    :param name: String. Name of the project
+    :param responsible: Object. User responsible for the project
+    :param approve: Object. User who approved the project
+    :param users: Iterable. Users of the project
+    :param cpu: Integer. Allocated CPU hours
+    :return: Object. Project committed to the database
+    """
+    created = dt(2024, 1, 1, tzinfo=timezone.utc)
+    resources = Resources(approve=approve, valid=True, cpu=cpu, type="a",
+                          created=created,
+                          ttl=dt(2025, 1, 1, tzinfo=timezone.utc))
+    project = Project(name=name, type="a", title=name, active=True,
+                      responsible=responsible, approve=approve,
+                      resources=resources, users=list(users), created=created,
+                      priority=0)
+    db.session.add(project)
+    db.session.commit()
+    return project
+
+
+def make_user(login, **kwargs):
+    user = User(login=login, name=login.capitalize(), surname="Test",
+                email="%s@example.com" % login, active=True,
+                acl=ACLDB(is_user=True, **kwargs))
+    db.session.add(user)
+    db.session.commit()
+    return user
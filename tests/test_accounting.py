@@ -0,0 +1,134 @@
+"""
+Upload of sreport output and the consumption summaries kept up to date by it
+"""
+from datetime import datetime as dt, timedelta
+
+from base.database.schema import (Resources, UserConsumption,
+                                  AccountingRollup, Accounting)
+from base.extensions import db
+from base.pages.admin.magic import (accounting_upload, consumption_rebuild,
+                                    consumption_update, rollup_update,
+                                    rollup_period, rollup_series,
+                                    account_series)
+from conftest import make_project, make_user
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+def summary():
+    """
+    :return: Tuple. Consumption of resources, of users and rollup records
+    """
+    db.session.expire_all()
+    resources = {x.id: x.consumed for x in Resources.query}
+    users = {(x.resources_id, x.user_id): x.cpu for x in UserConsumption.query}
+    rollup = {(x.granularity, x.period, x.resources_id, x.user_id): x.cpu
+              for x in AccountingRollup.query}
+    return resources, users, rollup
+
+
+def setup_projects(admin):
+    u1, u2, u3 = make_user("u1"), make_user("u2"), make_user("u3")
+    a = make_project("a001", u1, admin, [u1, u2])
+    b = make_project("b002", u3, admin, [u3, u2])
+    return a, b, (u1, u2, u3)
+
+
+def test_upload_and_rebuild(admin):
+    a, b, (u1, u2, u3) = setup_projects(admin)
+    result = accounting_upload(["a001||100", "a001|u1|60", "a001|u2|40",
+                                "b002||30", "b002|u3|30", "c003||10",
+                                "a001|nobody|5"], dt(2024, 3, 4))
+    assert result == {"inserted": 5, "updated": 0, "skipped": 2}
+    accounting_upload(["a001||50", "a001|u2|50", "b002||20", "b002|u2|20"],
+                      dt(2024, 3, 11))
+    result = accounting_upload(["a001||120", "a001|u1|80", "a001|u2|40",
+                                "b002||30", "b002|u3|30"], dt(2024, 3, 4))
+    assert result == {"inserted": 0, "updated": 2, "skipped": 3}
+    resources, users, rollup = summary()
+    assert resources == {a.resources_id: 170, b.resources_id: 50}
+    assert users == {(a.resources_id, u1.id): 80,
+                     (a.resources_id, u2.id): 90,
+                     (b.resources_id, u3.id): 30,
+                     (b.resources_id, u2.id): 20}
+    assert rollup[("month", dt(2024, 3, 1), a.resources_id, None)] == 170
+    assert rollup[("week", dt(2024, 3, 4), a.resources_id, u2.id)] == 40
+    assert rollup[("day", dt(2024, 3, 11), b.resources_id, u2.id)] == 20
+    assert Accounting.query.count() == 9
+    consumption_rebuild()
+    assert summary() == (resources, users, rollup)
+
+
+def test_upload_nothing(admin):
+    assert accounting_upload([], dt(2024, 3, 4)) == {
+        "inserted": 0, "updated": 0, "skipped": 0}
+    assert accounting_upload(["garbage"], dt(2024, 3, 4)) == {
+        "inserted": 0, "updated": 0, "skipped": 0}
+
+
+def test_consumption_update(admin):
+    a, b, (u1, u2, u3) = setup_projects(admin)
+    rid = a.resources_id
+    consumption_update({(rid, None): 10, (rid, u1.id): 10})
+    db.session.commit()
+    consumption_update({(rid, None): 5, (rid, u1.id): 3, (rid, u2.id): 2,
+                        (b.resources_id, u3.id): 0})
+    db.session.commit()
+    resources, users, rollup = summary()
+    assert resources[rid] == 15
+    assert users == {(rid, u1.id): 13, (rid, u2.id): 2}
+
+
+def test_rollup_period():
+    date = dt(2024, 3, 6, 15, 30)
+    assert rollup_period(date, "day") == dt(2024, 3, 6)
+    assert rollup_period(date, "week") == dt(2024, 3, 4)
+    assert rollup_period(date, "month") == dt(2024, 3, 1)
+
+
+def test_rollup_upsert(admin):
+    a, b, (u1, u2, u3) = setup_projects(admin)
+    rid = a.resources_id
+    owners = {rid: a.id}
+    rollup_update({(rid, None): 10, (rid, u1.id): 4}, dt(2024, 3, 5), owners)
+    db.session.commit()
+    rollup_update({(rid, None): 5, (rid, u1.id): 1, (rid, u2.id): 0},
+                  dt(2024, 3, 6), owners)
+    db.session.commit()
+    resources, users, rollup = summary()
+    assert len(rollup) == 8
+    assert rollup[("week", dt(2024, 3, 4), rid, None)] == 15
+    assert rollup[("month", dt(2024, 3, 1), rid, u1.id)] == 5
+    assert rollup[("day", dt(2024, 3, 6), rid, u1.id)] == 1
+    assert AccountingRollup.query.filter_by(user_id=u2.id).count() == 0
+    assert {x.project_id for x in AccountingRollup.query} == {a.id}
+
+
+def test_rollup_series(admin):
+    a, b, (u1, u2, u3) = setup_projects(admin)
+    accounting_upload(["a001||10", "a001|u1|10"], dt(2024, 3, 4))
+    accounting_upload(["a001||20", "a001|u1|5", "b002||7"], dt(2024, 3, 6))
+    dates, values = rollup_series("day", dt(2024, 3, 3), dt(2024, 3, 7))
+    assert dates == ["2024-03-0%s 00:00" % x for x in range(3, 8)]
+    assert values == [0, 10, 0, 27, 0]
+    dates, values = rollup_series("week", dt(2024, 3, 1), dt(2024, 3, 12),
+                                  project=a, user=u1)
+    assert dates == ["2024-02-26 00:00", "2024-03-04 00:00",
+                     "2024-03-11 00:00"]
+    assert values == [0, 15, 0]
+
+
+def test_account_series(admin):
+    a, b, (u1, u2, u3) = setup_projects(admin)
+    today = dt.today().replace(hour=0, minute=0, second=0, microsecond=0)
+    accounting_upload(["a001||10", "a001|u1|10"], today - timedelta(days=1))
+    accounting_upload(["a001||20", "a001|u1|5"], today - timedelta(days=3))
+    accounting_upload(["a001||40"], today - timedelta(days=10))
+    dates, values = account_series(5, project=a)
+    assert dates == [(today - timedelta(days=x)).strftime("%Y-%m-%d 00:00")
+                     for x in range(4, -1, -1)]
+    assert values == [0, 20, 0, 10, 0]
+    assert account_series(5, project=a, user=u1)[1] == [0, 5, 0, 10, 0]
+    assert account_series(5, project=b)[1] == [0] * 5
@@ -0,0 +1,107 @@
+"""
+Cached user list, permissions and project names invalidated on commit
+"""
+from base.bootstrap import bootstrap
+from base.database.schema import ACLDB, User
+from base.extensions import cache, db
+from conftest import make_project, make_user
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+def test_permissions_cached(admin):
+    user = make_user("u1", is_responsible=True)
+    assert bootstrap.permissions(user) == ["user", "responsible"]
+    generation, permissions = cache.get("permissions_%s" % user.id)
+    assert generation == bootstrap.sync()
+    assert permissions == ["user", "responsible"]
+
+
+def test_permissions_acl_change(admin):
+    user = make_user("u1")
+    other = make_user("u2")
+    assert bootstrap.permissions(user) == ["user"]
+    assert bootstrap.permissions(other) == ["user"]
+    generation = bootstrap.sync()
+    user.acl.is_committee = True
+    db.session.flush()
+    assert cache.get("permissions_%s" % user.id) is not None
+    db.session.commit()
+    assert cache.get("permissions_%s" % user.id) is None
+    assert cache.get("permissions_%s" % other.id) is not None
+    assert bootstrap.sync() == generation
+    assert bootstrap.permissions(user) == ["user", "committee"]
+
+
+def test_permissions_new_acl(admin):
+    user = make_user("u1")
+    assert bootstrap.permissions(user) == ["user"]
+    user.acl = ACLDB(is_user=True, is_tech=True)
+    db.session.commit()
+    assert bootstrap.permissions(user) == ["user", "tech"]
+
+
+def test_permissions_rollback(admin):
+    user = make_user("u1")
+    assert bootstrap.permissions(user) == ["user"]
+    user.acl.is_admin = True
+    db.session.flush()
+    db.session.rollback()
+    assert cache.get("permissions_%s" % user.id) is not None
+
+
+def test_permissions_bulk_update(admin):
+    user = make_user("u1")
+    assert bootstrap.permissions(user) == ["user"]
+    generation = bootstrap.sync()
+    ACLDB.query.filter_by(id=user.acl_id).update({"is_manager": True})
+    db.session.commit()
+    assert bootstrap.sync() != generation
+    assert bootstrap.permissions(user) == ["user", "manager"]
+
+
+def test_user_list(admin):
+    make_user("u2")
+    assert list(bootstrap.user_list()) == ["admin", "u2"]
+    generation = bootstrap.sync()
+    user = User(login="u1", name="U", surname="One", email="u1@example.com",
+                acl=ACLDB(is_user=True))
+    db.session.add(user)
+    # Not committed yet, the session sees the new user
+    assert "u1" in bootstrap.user_list()
+    db.session.commit()
+    assert bootstrap.sync() != generation
+    assert list(bootstrap.user_list()) == ["admin", "u1", "u2"]
+    user.login = "u3"
+    db.session.commit()
+    assert list(bootstrap.user_list()) == ["admin", "u2", "u3"]
+
+
+def test_identities(admin):
+    user = make_user("u1")
+    index = bootstrap.identities()
+    assert index.find(logins=["u1"]) == {user.id}
+    assert index.find(emails=["admin@example.com"]) == {admin.id}
+    assert index.find(names=[("U1", "Test")]) == {user.id}
+    assert index.find(logins=["nobody"], emails=["x@example.com"]) == set()
+    assert bootstrap.identities() is index
+    user.email = "new@example.com"
+    db.session.commit()
+    assert bootstrap.identities().find(emails=["new@example.com"]) == {
+        user.id}
+
+
+def test_project_names(admin):
+    user = make_user("u1")
+    assert bootstrap.project_names() == []
+    project = make_project("b002", user, admin)
+    make_project("a001", user, admin)
+    assert bootstrap.project_names() == ["a001", "b002"]
+    project.name = "c003"
+    db.session.commit()
+    assert bootstrap.project_names() == ["a001", "c003"]
+    project.title = "Title"
+    db.session.commit()
+    assert cache.get("bootstrap_projects") == ["a001", "c003"]
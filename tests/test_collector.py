@@ -0,0 +1,47 @@
+"""
+Snapshots of the cluster state shared through the cache
+"""
+import pytest
+
+from base.collector import Collector
+from base.extensions import cache
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+@pytest.fixture
+def collector(app):
+    with app.app_context():
+        yield Collector()
+        cache.clear()
+
+
+def test_lease(collector):
+    assert Collector.lease("test", 60)
+    assert not Collector.lease("test", 60)
+    assert Collector.lease("other", 60)
+
+
+def test_due(collector):
+    collector.register("test", lambda: 1, "COLLECTOR_TEST", 60)
+    assert collector.due() == ["test"]
+    # Leased by the first call
+    assert collector.due() == []
+
+
+def test_snapshot(collector):
+    calls = []
+    collector.register("test", lambda: calls.append(1) or len(calls),
+                       "COLLECTOR_TEST", 60)
+    assert collector.snapshot("test")[0] == 1
+    assert collector.snapshot("test") == (1, 0)
+    assert collector.snapshot("test", refresh=True)[0] == 2
+    assert collector.due() == []
+    # Another process sees the snapshot through the cache
+    other = Collector()
+    other.register("test", lambda: 0, "COLLECTOR_TEST", 60)
+    assert other.snapshot("test")[0] == 2
+    with pytest.raises(ValueError):
+        collector.snapshot("unknown")
@@ -0,0 +1,130 @@
+"""
+Parsing of project.cfg and mail.cfg and their reload on modification
+"""
+from datetime import datetime as dt, timezone
+from os import utime
+from flask import Flask
+import pytest
+
+from base.config import (ConfigRegistry, project_parse_cfg, mail_parse_cfg,
+                         MailServer)
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+PROJECT = """
+[A]
+cpu = 50000
+description = Type A
+duration = 1 year
+finish_date = next December 31
+finish_notice = 2 weeks ago
+evaluation_date = next June 30, next December 31
+evaluation_notice = 1 week ago
+extendable = yes
+transform = B, C
+acl = tech, committee
+visa = visa_a.html, visa_b.html
+
+[B]
+cpu = 100000
+"""
+
+MAIL = """
+[DEFAULT]
+USER_LIST = a@example.com
+[SERVER]
+HOST = smtp.example.com
+PORT = 587
+USE_TLS = yes
+USERNAME = robot
+[SIMPLE MESSAGE]
+FROM = robot@example.com
+SIGNATURE = ${DEFAULT:USER_LIST}
+"""
+
+
+def test_project_parse_cfg(tmp_path):
+    path = tmp_path / "project.cfg"
+    path.write_text(PROJECT)
+    result = project_parse_cfg(str(path))
+    assert sorted(result) == ["a", "b"]
+    a = result["a"]
+    assert a["cpu"] == 50000
+    assert a["description"] == "Type A"
+    assert a["extendable"] is True
+    assert a["suspend"] is True
+    assert a["transform"] == ["B", "C"]
+    assert a["acl"] == ["tech", "committee", "admin"]
+    assert a["visa"] == ["visa_a.html", "visa_b.html"]
+    assert a["duration_dt"].tzinfo == timezone.utc
+    assert a["duration_dt"] > dt.now(timezone.utc)
+    assert a["finish_notice_dt"] < a["finish_dt"]
+    assert len(a["evaluation_dt"]) == 2
+    assert len(a["evaluation_notice_dt"]) == 2
+    b = result["b"]
+    assert b["cpu"] == 100000
+    assert b["acl"] == ["admin"]
+    assert b["duration_dt"] is None and b["finish_dt"] is None
+    assert b["transform"] == [] and b["visa"] == []
+
+
+def test_project_parse_cfg_missing():
+    assert project_parse_cfg(None) == {}
+
+
+def test_mail_parse_cfg(tmp_path):
+    path = tmp_path / "mail.cfg"
+    path.write_text(MAIL)
+    cfg, server = mail_parse_cfg(str(path))
+    assert server == MailServer("smtp.example.com", 587, True, False, "robot",
+                                None)
+    assert cfg.get("SIMPLE MESSAGE", "SIGNATURE") == "a@example.com"
+
+
+def test_mail_parse_cfg_missing():
+    cfg, server = mail_parse_cfg(None)
+    assert server == MailServer("localhost", 25, False, False, None, None)
+    assert cfg.sections() == []
+
+
+@pytest.fixture
+def instance(tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    with app.app_context():
+        yield app
+
+
+def test_registry_reload(instance, tmp_path):
+    registry = ConfigRegistry()
+    path = tmp_path / "project.cfg"
+    assert registry.projects() == {}
+    path.write_text(PROJECT)
+    first = registry.projects()
+    assert sorted(first) == ["a", "b"]
+    assert registry.projects() is first
+    assert registry.project("A") is first["a"]
+    assert registry.project("Z") is None
+    path.write_text(PROJECT.replace("cpu = 100000", "cpu = 200000"))
+    utime(str(path), ns=(0, 0))
+    assert registry.project("b")["cpu"] == 200000
+    path.unlink()
+    assert registry.projects() == {}
+
+
+def test_registry_age(instance, tmp_path):
+    registry = ConfigRegistry()
+    (tmp_path / "project.cfg").write_text(PROJECT)
+    first = registry.projects()
+    instance.config["PROJECT_CONFIG_AGE"] = -1
+    assert registry.projects() is not first
+
+
+def test_registry_mail(instance, tmp_path):
+    registry = ConfigRegistry()
+    (tmp_path / "mail.cfg").write_text(MAIL)
+    assert registry.mail_server().host == "smtp.example.com"
+    assert registry.mail().get("SIMPLE MESSAGE", "FROM") == (
+        "robot@example.com")
@@ -0,0 +1,84 @@
+"""
+Event log split into pages with a keyset cursor
+"""
+from datetime import datetime as dt, timedelta, timezone
+from types import SimpleNamespace
+import pytest
+
+from base.classes import LogQuery
+from base.database.schema import LogDB
+from base.extensions import db
+from conftest import make_user
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+def test_cursor_round_trip():
+    created = dt(2024, 3, 5, 10, 20, 30, 123456, tzinfo=timezone.utc)
+    cursor = LogQuery.encode(SimpleNamespace(created=created, id=42))
+    assert "|" not in cursor
+    assert LogQuery.decode(cursor) == (created, 42)
+
+
+def test_cursor_naive_date():
+    created = dt(2024, 3, 5, 10, 20, 30)
+    cursor = LogQuery.encode(SimpleNamespace(created=created, id=7))
+    assert LogQuery.decode(cursor) == (created, 7)
+
+
+@pytest.mark.parametrize("cursor", ["", "garbage", "MjAyNC0wMy0wNQ==",
+                                    "bm90IGEgZGF0ZXwx", "MjAyNC0wMy0wNXx4"])
+def test_cursor_invalid(cursor):
+    with pytest.raises(ValueError):
+        LogQuery.decode(cursor)
+
+
+def test_limit(app):
+    with app.app_context():
+        assert LogQuery.limit() == 100
+        assert LogQuery.limit("10") == 10
+        assert LogQuery.limit("0") == 1
+        assert LogQuery.limit("100000") == 1000
+        with pytest.raises(ValueError):
+            LogQuery.limit("ten")
+
+
+def test_pages(admin):
+    user = make_user("u1")
+    start = dt(2024, 1, 1)
+    # Two records share every creation time, the id breaks the tie
+    for i in range(25):
+        db.session.add(LogDB(event="event %s" % i, author=admin,
+                             user=user if i % 2 else None,
+                             created=start + timedelta(hours=i // 2)))
+    db.session.commit()
+    expected = [x.id for x in LogDB.query.order_by(
+        LogDB.created.desc(), LogDB.id.desc())]
+    seen, cursor = [], None
+    while True:
+        records, cursor = LogQuery().page(cursor, limit=10)
+        seen += [x.id for x in records]
+        if not cursor:
+            break
+    assert seen == expected
+    records, cursor = LogQuery(user=user).page(limit=100)
+    assert len(records) == 12 and cursor is None
+
+
+def test_filter(admin):
+    user = make_user("u1")
+    for day in range(1, 6):
+        db.session.add(LogDB(event="day %s" % day, author=admin, user=user,
+                             created=dt(2024, 1, day, 12)))
+    db.session.commit()
+    query = LogQuery().filter({"start": "2024-01-02", "end": "2024-01-04",
+                               "category": "user", "entity": "u1",
+                               "author": "admin"})
+    records, cursor = query.page()
+    assert [x.event for x in records] == ["day 4", "day 3", "day 2"]
+    with pytest.raises(ValueError):
+        LogQuery().filter({"start": "yesterday"})
+    with pytest.raises(ValueError):
+        LogQuery().category("nothing")
@@ -0,0 +1,89 @@
+"""
+Parsers of the output of remote commands
+"""
+from datetime import datetime as dt
+from types import GeneratorType
+
+from base.parsers import (parse_jobs, parse_nodes, parse_partitions,
+                          parse_space, parse_sreport, Job, NodeState,
+                          Partition, Filesystem, Consumption)
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+def test_parsers_are_generators():
+    for parser in [parse_jobs, parse_nodes, parse_partitions, parse_space,
+                   parse_sreport]:
+        assert isinstance(parser([]), GeneratorType)
+
+
+def test_parsers_accept_iterators():
+    lines = iter(["1|COMPLETED|2024-01-01T00:00:00|a001|job|00:01:00|skylake"])
+    assert len(list(parse_jobs(lines))) == 1
+
+
+def test_parse_jobs():
+    lines = [
+        "123|COMPLETED|2024-01-01T10:00:00|a001|run.sh|01:00:00|skylake\n",
+        "124|RUNNING|2024-01-02T10:00:00|b002|my|job|00:10:00|kepler",
+        "broken|line",
+        ""]
+    jobs = list(parse_jobs(lines))
+    assert jobs[0] == Job("123", "COMPLETED", "2024-01-01T10:00:00", "a001",
+                          "run.sh", "01:00:00", "skylake")
+    assert jobs[1].name == "my"
+    assert len(jobs) == 2
+
+
+def test_parse_nodes():
+    lines = [
+        "REASON                |TIMESTAMP          |NODELIST|STATE",
+        "Not responding |2020-07-25T22:39:23|skylake106|down*",
+        "Maintenance |Unknown|skylake[001-004]|drain",
+        "wrong line"]
+    nodes = list(parse_nodes(lines))
+    assert nodes == [
+        NodeState("Not responding", dt(2020, 7, 25, 22, 39, 23), "skylake106",
+                  "down*"),
+        NodeState("Maintenance", None, "skylake[001-004]", "drain")]
+    assert nodes[1].to_dict()["date"] == "Unknown"
+    assert nodes[0].to_dict()["date"] == "2020-07-25 22:39:23 "
+
+
+def test_parse_partitions():
+    lines = [
+        "PARTITION AVAIL  TIMELIMIT   NODES(A/I/O/T) NODELIST",
+        "skylake*     up 7-00:00:00     10/20/2/32 skylake[001-032]",
+        "kepler       up 2-00:00:00        0/4/0/4 kepler[001-004]"]
+    partitions = list(parse_partitions(lines))
+    assert partitions == [Partition("skylake*", "10", "20", "2", 32),
+                          Partition("kepler", "0", "4", "0", 4)]
+    assert partitions[1].to_dict() == {"name": "kepler", "allocated": "0",
+                                       "idle": "4", "other": "0", "total": 4}
+
+
+def test_parse_space():
+    lines = [
+        "Filesystem      Size  Used Avail Use% Mounted on",
+        "/dev/sda1        50G   20G   30G  40% /",
+        "beegfs_nodev    1.0P  600T  400T  60% /scratch",
+        "incomplete line"]
+    assert list(parse_space(lines)) == [
+        Filesystem("/dev/sda1", "50G", "20G", "30G", "40%", "/"),
+        Filesystem("beegfs_nodev", "1.0P", "600T", "400T", "60%", "/scratch")]
+
+
+def test_parse_sreport():
+    lines = [
+        "--------------------------------------------------------------",
+        "Cluster/Account/User Utilization 2024-01-01T00:00:00 - ...",
+        "a001||1200",
+        "a001|u1|1000",
+        " a001 | u2 | 200 ",
+        "b002||n/a",
+        "b002|u3|300"]
+    assert list(parse_sreport(lines)) == [
+        Consumption("a001", None, 1200), Consumption("a001", "u1", 1000),
+        Consumption("a001", "u2", 200), Consumption("b002", "u3", 300)]
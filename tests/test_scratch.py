@@ -0,0 +1,40 @@
+"""
+Scratch quota collected with a single beegfs-ctl call
+"""
+from base.pages.user.magic import scratch_parse, scratch_info
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+OUTPUT = [
+    "name,id,size,hard,files,hard\n",
+    "root,0,1048576,0,10,0\n",
+    "u1,1001,5368709120,10737418240,1200,500000\n",
+    "u2,1002,1024,10737418240,3,500000\n",
+    "u3,1003,-,10737418240,-,500000\n",
+    "u4,1004,10GiB,10737418240,1,500000\n",
+    "Quota information for storage pool Default (ID: 1):\n",
+    "\n"]
+
+
+def test_scratch_parse():
+    assert list(scratch_parse(OUTPUT)) == [
+        ("root", (0, 1048576, 0, 10, 0)),
+        ("u1", (1001, 5368709120, 10737418240, 1200, 500000)),
+        ("u2", (1002, 1024, 10737418240, 3, 500000))]
+
+
+def test_scratch_parse_sorts_without_conversion():
+    quota = dict(scratch_parse(OUTPUT))
+    assert max(quota, key=lambda x: quota[x][1]) == "u1"
+
+
+def test_scratch_info():
+    quota = dict(scratch_parse(OUTPUT))
+    info = scratch_info("u1", quota["u1"])
+    assert info["usage"] == "50.0%"
+    assert info["used"] == 5368709120
+    assert info["free"] == 5368709120.0
+    assert info["files"] == 1200
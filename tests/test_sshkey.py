@@ -0,0 +1,121 @@
+"""
+Keys of every type and their malformed variants are checked by ssh-keygen -l
+and by key_fingerprints(), both have to accept the same texts and print the
+same lines
+"""
+from base64 import b64decode, b64encode
+from shutil import which
+from struct import pack
+from subprocess import run, DEVNULL, PIPE
+import pytest
+
+from base.sshkey import key_fingerprints
+from base.pages.user.magic import ssh_check
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+pytestmark = pytest.mark.skipif(not which("ssh-keygen"),
+                                reason="ssh-keygen is not installed")
+
+KEYS = [("rsa", "1024"), ("rsa", "2048"), ("dsa", None), ("ecdsa", "256"),
+        ("ecdsa", "384"), ("ecdsa", "521"), ("ed25519", None)]
+
+
+def string(value):
+    if isinstance(value, str):
+        value = value.encode()
+    return pack(">I", len(value)) + value
+
+
+def blob_line(name, blob, comment="user@host"):
+    return "%s %s %s" % (name, b64encode(blob).decode(), comment)
+
+
+def other_type(name):
+    return "ssh-rsa" if name != "ssh-rsa" else "ssh-ed25519"
+
+
+VARIANTS = {
+    "valid": lambda name, data, blob: "%s %s user@host" % (name, data),
+    "no comment": lambda name, data, blob: "%s %s" % (name, data),
+    "options": lambda name, data, blob: 'command="echo a b",no-pty %s %s' % (
+        name, data),
+    "truncated blob": lambda name, data, blob: blob_line(name, blob[:-1]),
+    "truncated base64": lambda name, data, blob: "%s %s" % (name, data[:-4]),
+    "wrong type prefix": lambda name, data, blob: "%s %s" % (
+        other_type(name), data),
+    "wrong type in blob": lambda name, data, blob: blob_line(
+        name, string(other_type(name)) + blob[len(string(name)):]),
+    "bad base64": lambda name, data, blob: "%s %s" % (
+        name, data[:20] + "!" + data[21:]),
+    "missing padding": lambda name, data, blob: "%s %s" % (
+        name, data.rstrip("=")),
+    "trailing junk in blob": lambda name, data, blob: blob_line(
+        name, blob + b"\0\0\0\0"),
+    "trailing junk in base64": lambda name, data, blob: "%s %sAAAA" % (
+        name, data),
+    "junk lines": lambda name, data, blob: "junk\n%s %s c\nmore junk" % (
+        name, data),
+}
+
+
+@pytest.fixture(scope="module")
+def keys(tmp_path_factory):
+    """
+    Public keys generated by ssh-keygen. Types which the installed ssh-keygen
+    can't generate are missing
+    """
+    directory = tmp_path_factory.mktemp("keys")
+    result = {}
+    for kind, bits in KEYS:
+        path = directory / ("%s%s" % (kind, bits or ""))
+        cmd = ["ssh-keygen", "-q", "-t", kind, "-N", "", "-C", "user@host",
+               "-f", str(path)]
+        if bits:
+            cmd += ["-b", bits]
+        if run(cmd, stdout=DEVNULL, stderr=DEVNULL).returncode:
+            continue
+        result[(kind, bits)] = path.with_suffix(".pub").read_text().strip()
+    return result
+
+
+def keygen(text, directory):
+    path = directory / "key.pub"
+    path.write_text(text)
+    result = run(["ssh-keygen", "-l", "-f", str(path)], stdout=PIPE,
+                 stderr=DEVNULL, universal_newlines=True)
+    if result.returncode:
+        return []
+    return result.stdout.splitlines()
+
+
+@pytest.mark.parametrize("variant", sorted(VARIANTS))
+@pytest.mark.parametrize("kind,bits", KEYS)
+def test_key_fingerprints(keys, tmp_path, kind, bits, variant):
+    if (kind, bits) not in keys:
+        pytest.skip("ssh-keygen can't generate %s keys" % kind)
+    name, data = keys[(kind, bits)].split()[:2]
+    text = VARIANTS[variant](name, data, b64decode(data))
+    reference = keygen(text, tmp_path)
+    assert key_fingerprints(text) == reference
+    assert ssh_check(text) == bool(reference)
+    if variant in ("valid", "no comment", "options", "junk lines"):
+        assert reference
+
+
+def test_private_key_refused(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("private")
+    path = directory / "id"
+    run(["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-f", str(path)],
+        check=True, stdout=DEVNULL, stderr=DEVNULL)
+    assert key_fingerprints(path.read_text()) == []
+
+
+@pytest.mark.parametrize("text", ["", "\n\n", "# comment", "ssh-rsa",
+                                  "ssh-rsa AAAA", "not a key at all"])
+def test_not_a_key(text):
+    assert key_fingerprints(text) == []
+    assert not ssh_check(text)
@@ -0,0 +1,58 @@
+"""
+Parsing of the information about admin servers
+"""
+from base.pages.admin.magic import (parse_server_info, parse_uptime,
+                                    parse_memory, parse_swap)
+from conftest import make_user
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+OUTPUT = [
+    "cores:4",
+    "up 3 days, 5 minutes",
+    "Mem:    8000000000 2000000000 1000000000 100000000 5000000000 "
+    "6000000000",
+    "Swap:   4000000000 1000000000 3000000000",
+    "Load:1.00,:0.50,:0.25",
+    "u1",
+    "stranger"]
+
+
+def test_parse_uptime():
+    assert parse_uptime("1.00,:0.50,:0.25") == {
+        "load_1": "1.00", "load_5": "0.50", "load_15": "0.25"}
+    assert parse_uptime("") == {"load_1": 0, "load_5": 0, "load_15": 0}
+
+
+def test_parse_memory():
+    memory = parse_memory(OUTPUT[2])
+    assert memory["usage"] == "25.0%"
+    assert parse_memory("") == {}
+
+
+def test_parse_swap():
+    swap = parse_swap(OUTPUT[3])
+    assert swap["usage"] == "25.0%"
+    assert parse_swap("") == {}
+
+
+def test_parse_server_info(database):
+    make_user("u1")
+    out = parse_server_info("srv", OUTPUT, None)
+    assert out["server"] == "srv"
+    assert out["status"] == "ok"
+    assert out["load"] == "25.0%"
+    assert out["memory"] == "25.0%"
+    assert out["swap"] == "25.0%"
+    assert '<a href="users/u1">u1</a>' in out["html"]
+    assert "<li>stranger</li>" in out["html"]
+    assert "3 days, 5 minutes" in out["html"]
+
+
+def test_parse_server_info_error():
+    out = parse_server_info("srv", [], "Connection refused")
+    assert out == {"server": "srv", "uptime": "", "memory": "", "load": "",
+                   "swap": "", "status": "error"}
@@ -0,0 +1,69 @@
+"""
+Task history returned page by page
+"""
+from base64 import b64encode
+from datetime import datetime as dt, timedelta
+
+from base.database.schema import Tasks
+from base.extensions import db
+from base.pages.admin.magic import task_history
+from conftest import make_user
+
+
+__author__ = "Matvey Sapunov"
+__copyright__ = "Aix Marseille University"
+
+
+def add_tasks(admin, count, login="u1"):
+    start = dt(2024, 1, 1)
+    for i in range(count):
+        db.session.add(Tasks(action="update|user|%s|None|%s" % (login, i),
+                             author=admin, approve=admin, processed=False,
+                             done=False, created=start + timedelta(
+                                 minutes=i // 2)))
+    db.session.commit()
+
+
+def test_task_history(admin):
+    make_user("u1")
+    add_tasks(admin, 15)
+    tasks = task_history()
+    assert len(tasks) == 15
+    expected = [x.id for x in Tasks.query.order_by(Tasks.created.desc(),
+                                                   Tasks.id.desc())]
+    assert [x["id"] for x in tasks] == expected
+    assert [x["id"] for x in task_history(reverse=False)] == expected[::-1]
+
+
+def test_task_history_pages(admin):
+    make_user("u1")
+    add_tasks(admin, 25)
+    every = task_history()
+    pages = [task_history(limit=10, offset=x) for x in (0, 10, 20)]
+    assert list(map(len, pages)) == [10, 10, 5]
+    assert sum(pages, []) == every
+    assert task_history(limit=10, offset=30) == []
+
+
+def test_task_history_endpoint(app, admin):
+    make_user("u1")
+    add_tasks(admin, 12)
+    admin.set_password("secret")
+    auth = b64encode(b"admin:secret").decode()
+    client = app.test_client()
+
+    def history(query=""):
+        return client.post("/api/admin/tasks/history%s" % query,
+                           headers={"Authorization": "Basic %s" % auth},
+                           follow_redirects=True)
+
+    assert len(history().get_json()["data"]) == 12
+    assert len(history("?limit=5&offset=10").get_json()["data"]) == 2
+    app.config["TASK_PAGE"] = 10
+    try:
+        assert len(history().get_json()["data"]) == 10
+    finally:
+        del app.config["TASK_PAGE"]
+    response = history("?limit=ten")
+    assert response.status_code == 500
+    assert b"Limit and offset should be integers" in response.data